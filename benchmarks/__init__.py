@@ -0,0 +1,7 @@
+"""绘图和重绘热路径的无界面基准测试
+
+    python -m benchmarks                     # 运行全部屏幕尺寸和工具
+    python -m benchmarks --sizes 1080p 5k    # 只运行部分屏幕尺寸
+    python -m benchmarks --save-baseline     # 把结果保存为基准
+    python -m benchmarks --compare           # 与保存的基准比较，出现回退时返回非零状态码
+"""
@@ -0,0 +1,463 @@
+"""在一个屏幕尺寸下测量各绘图工具的事件处理和重绘耗时
+
+由 run.py 在子进程中调用，调用前 environment.configure() 已经设置好 offscreen 平台。
+鼠标事件直接发送给绘图层，不经过真实的时间间隔：每到一个显示帧就立即刷新输入缓冲区
+并处理重绘请求，结果只取决于代码本身的开销，与机器的负载和定时器精度无关。
+"""
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PyQt6.QtCore import Qt, QPointF, QEvent
+from PyQt6.QtGui import QImage, QInputDevice, QMouseEvent, QPointingDevice, QTabletEvent
+from PyQt6.QtWidgets import QApplication
+
+from .environment import peak_rss_mb
+
+FRAME_RATE = 60
+
+
+def percentiles(samples):
+    """返回微秒为单位的统计值"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e6, 1)
+        
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1e6, 1),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1e6, 1),
+    }
+
+
+def send_mouse(widget, kind, point):
+    event_type = {
+        "press": QEvent.Type.MouseButtonPress,
+        "move": QEvent.Type.MouseMove,
+        "release": QEvent.Type.MouseButtonRelease,
+    }[kind]
+    buttons = Qt.MouseButton.NoButton if kind == "release" else Qt.MouseButton.LeftButton
+    position = QPointF(point[0], point[1])
+    event = QMouseEvent(event_type, position, position, Qt.MouseButton.LeftButton,
+                        buttons, Qt.KeyboardModifier.NoModifier)
+    start = time.perf_counter()
+    QApplication.sendEvent(widget, event)
+    return time.perf_counter() - start
+
+
+_stylus = None
+
+
+def send_tablet(widget, kind, point):
+    """数位板事件，压力随位置起伏，模拟按压轻重变化的手写"""
+    global _stylus
+    if _stylus is None:
+        _stylus = QPointingDevice("benchmark stylus", 1, QInputDevice.DeviceType.Stylus,
+                                  QPointingDevice.PointerType.Pen,
+                                  QInputDevice.Capability.Position | QInputDevice.Capability.Pressure, 1, 3)
+    event_type = {
+        "press": QEvent.Type.TabletPress,
+        "move": QEvent.Type.TabletMove,
+        "release": QEvent.Type.TabletRelease,
+    }[kind]
+    buttons = Qt.MouseButton.NoButton if kind == "release" else Qt.MouseButton.LeftButton
+    position = QPointF(point[0], point[1])
+    pressure = 0.5 + 0.5 * math.sin((point[0] + point[1]) * 0.02)
+    event = QTabletEvent(event_type, _stylus, position, position, pressure, 0, 0, 0.0, 0.0, 0.0,
+                         Qt.KeyboardModifier.NoModifier, Qt.MouseButton.LeftButton, buttons)
+    start = time.perf_counter()
+    QApplication.sendEvent(widget, event)
+    return time.perf_counter() - start
+
+
+def freehand_path(rng, width, height, points):
+    """一条平滑的手写轨迹（李萨如曲线加少量抖动），覆盖屏幕中部"""
+    cx, cy = width * rng.uniform(0.3, 0.7), height * rng.uniform(0.3, 0.7)
+    rx, ry = width * 0.25, height * 0.25
+    a, b = rng.choice([(1, 2), (3, 2), (2, 3)])
+    phase = rng.uniform(0, math.pi)
+    path = []
+    for i in range(points):
+        t = i / max(1, points - 1) * 2 * math.pi
+        x = cx + rx * math.sin(a * t + phase) + rng.uniform(-1, 1)
+        y = cy + ry * math.sin(b * t) + rng.uniform(-1, 1)
+        path.append((min(width - 1, max(0, x)), min(height - 1, max(0, y))))
+    return path
+
+
+def drag_path(rng, width, height, points):
+    """拖动图形时的轨迹：从起点拉到终点"""
+    x0, y0 = rng.uniform(0.1, 0.4) * width, rng.uniform(0.1, 0.4) * height
+    x1, y1 = rng.uniform(0.6, 0.9) * width, rng.uniform(0.6, 0.9) * height
+    return [(x0 + (x1 - x0) * i / max(1, points - 1), y0 + (y1 - y0) * i / max(1, points - 1))
+            for i in range(points)]
+
+
+class DrawingBenchmark:
+    """驱动 ScreenPenApp 的主屏绘图层，记录每类事件的耗时"""
+    
+    def __init__(self, app, input_rate=120, stroke_seconds=1.5, seed=1):
+        self.app = app
+        self.overlay = app.overlay
+        self.input_rate = input_rate
+        self.stroke_seconds = stroke_seconds
+        self.seed = seed
+        self.events_per_frame = max(1, round(input_rate / FRAME_RATE))
+        
+        self.width = self.overlay.width()
+        self.height = self.overlay.height()
+        self.samples = {}
+        self.recording = True  # 准备阶段的笔迹不计入统计
+        self.send_event = send_mouse
+        
+        # 包一层 paintEvent，只统计绘图层自身的重绘耗时
+        overlay = self.overlay
+        paint_event = type(overlay).paintEvent
+        
+        def timed_paint_event(event):
+            start = time.perf_counter()
+            paint_event(overlay, event)
+            self.record("paint", time.perf_counter() - start)
+            self.paint_pixels += overlay.last_paint_pixels
+            
+        overlay.paintEvent = timed_paint_event
+        self.paint_pixels = 0
+        
+    def record(self, name, seconds):
+        if self.recording:
+            self.samples.setdefault(name, []).append(seconds)
+            
+    def tool_name(self, class_name):
+        for name, tool in self.app.tools.items():
+            if tool.__name__ == class_name:
+                return name
+        raise KeyError(class_name)
+        
+    def end_frame(self):
+        """一个显示帧结束：刷新输入缓冲区，再处理合并后的重绘请求"""
+        start = time.perf_counter()
+        self.overlay.stroke_accumulator.flush()
+        self.record("flush", time.perf_counter() - start)
+        QApplication.processEvents()
+        
+    def draw(self, path):
+        overlay = self.overlay
+        self.record("press", self.send_event(overlay, "press", path[0]))
+        for i, point in enumerate(path[1:-1], 1):
+            self.record("move", self.send_event(overlay, "move", point))
+            if i % self.events_per_frame == 0:
+                self.end_frame()
+        self.record("release", self.send_event(overlay, "release", path[-1]))
+        QApplication.processEvents()
+        
+    def prepare(self, class_name):
+        self.app.clear_canvas()
+        QApplication.processEvents()
+        if class_name in ("Eraser", "ObjectEraser"):
+            # 橡皮擦需要擦掉已有的墨迹
+            self.recording = False
+            self.app.current_tool = self.tool_name("FreeDraw")
+            rng = random.Random(self.seed + 1)
+            for _ in range(5):
+                self.draw(freehand_path(rng, self.width, self.height, 120))
+            self.recording = True
+        self.app.current_tool = self.tool_name(class_name)
+        
+    def run_tool(self, class_name, strokes):
+        """用一种工具连续画 strokes 笔，返回耗时统计"""
+        rng = random.Random(self.seed)
+        points = max(2, int(self.input_rate * self.stroke_seconds))
+        make_path = freehand_path if class_name in ("FreeDraw", "Eraser", "ObjectEraser") else drag_path
+        paths = [make_path(rng, self.width, self.height, points) for _ in range(strokes)]
+        
+        # 计时：不开启 tracemalloc
+        self.prepare(class_name)
+        self.samples = {}
+        self.paint_pixels = 0
+        started = time.perf_counter()
+        for path in paths:
+            self.draw(path)
+        elapsed = time.perf_counter() - started
+        result = {name: percentiles(samples) for name, samples in self.samples.items()}
+        paints = len(self.samples.get("paint", []))
+        result["paint_pixels_mean"] = round(self.paint_pixels / paints) if paints else 0
+        result["events"] = len(self.samples.get("move", []))
+        result["total_ms"] = round(elapsed * 1000, 2)
+        
+        # 第二遍统计 Python 对象分配（tracemalloc 会拖慢计时，所以分开运行）
+        self.prepare(class_name)
+        tracemalloc.start()
+        for path in paths:
+            self.draw(path)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["alloc_net_kb"] = round(current / 1024, 1)
+        result["alloc_peak_kb"] = round(peak / 1024, 1)
+        
+        result["canvas_mb"] = round(self.overlay.canvas.nbytes() / (1024 * 1024), 2)
+        return result
+        
+    def run_tablet(self, strokes, input_rate):
+        """数位板：高频的带压力输入，画笔按变宽轮廓绘制，每帧一次填充"""
+        saved = self.send_event, self.input_rate, self.events_per_frame
+        self.send_event = send_tablet
+        self.input_rate = input_rate
+        self.events_per_frame = max(1, round(input_rate / FRAME_RATE))
+        try:
+            return self.run_tool("FreeDraw", strokes)
+        finally:
+            self.send_event, self.input_rate, self.events_per_frame = saved
+        
+    def run_memory(self, strokes):
+        """大量短笔迹：检查画布和历史记录的内存是否受控"""
+        rng = random.Random(self.seed)
+        self.app.clear_canvas()
+        self.app.current_tool = self.tool_name("FreeDraw")
+        self.recording = False
+        started = time.perf_counter()
+        for _ in range(strokes):
+            x, y = rng.uniform(0, self.width - 40), rng.uniform(0, self.height - 40)
+            self.draw([(x + i * 4, y + (i % 3) * 4) for i in range(8)])
+        elapsed = time.perf_counter() - started
+        self.recording = True
+        
+        # 对象橡皮的命中测试：在满屏的笔迹中测试一帧的路径段
+        scene = self.overlay.scene
+        hit_tests = []
+        for _ in range(1000):
+            x, y = rng.uniform(0, self.width - 40), rng.uniform(0, self.height - 40)
+            path = np.array([(x + i * 3, y + i * 2) for i in range(8)], dtype=np.float32)
+            start = time.perf_counter()
+            scene.hit_test(path, self.app.pen_width / 2)
+            hit_tests.append(time.perf_counter() - start)
+        return {
+            "strokes": strokes,
+            "per_stroke_us": round(elapsed / strokes * 1e6, 1),
+            "hit_test": percentiles(hit_tests),
+            "canvas_mb": round(self.overlay.canvas.nbytes() / (1024 * 1024), 2),
+            "history_mb": round(self.app.history.nbytes / (1024 * 1024), 2),
+            "history_budget_mb": round(self.app.history.budget_bytes / (1024 * 1024), 2),
+            "rss_peak_mb": round(peak_rss_mb(), 1),
+        }
+
+
+    def run_pages(self, pages):
+        """白板分页：每页画几笔，再测量翻到相邻页（已预取）和跳到远处页（需要解压）的耗时"""
+        rng = random.Random(self.seed)
+        app = self.app
+        store = app.pages
+        app.current_tool = self.tool_name("FreeDraw")
+        self.recording = False
+        for index in range(pages):
+            if index:
+                app.new_page()
+            for _ in range(5):
+                self.draw(freehand_path(rng, self.width, self.height, 120))
+        self.recording = True
+        
+        def switch(index):
+            # 等上一次翻页提交的压缩和预取完成，只统计 GUI 线程上的切换耗时
+            QApplication.processEvents()
+            store.pool.waitForDone()
+            QApplication.processEvents()
+            start = time.perf_counter()
+            app.show_page(index)
+            return time.perf_counter() - start
+            
+        nearby = [switch(index) for index in range(pages - 2, -1, -1)]
+        distant = [switch(index) for index in [pages - 1, 0] * 5]
+        QApplication.processEvents()
+        store.pool.waitForDone()
+        QApplication.processEvents()
+        return {
+            "pages": pages,
+            "switch_nearby": percentiles(nearby),
+            "switch_distant": percentiles(distant),
+            "packed_kb": round(store.packed_bytes / 1024, 1),
+            "inactive_mb": round(store.nbytes() / (1024 * 1024), 2),
+        }
+        
+    def run_magnifier(self, seconds):
+        """放大镜：鼠标移动时每帧的截图、缩放和重绘耗时，以及鼠标不动时的截图次数和 CPU 占用"""
+        app = self.app
+        magnifier = app.magnifier
+        overlay = self.overlay
+        app.quick_change_tool("放大镜")
+        QApplication.processEvents()
+        
+        def hover(x, y):
+            position = QPointF(x, y)
+            event = QMouseEvent(QEvent.Type.MouseMove, position, overlay.mapToGlobal(position),
+                                Qt.MouseButton.NoButton, Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier)
+            QApplication.sendEvent(overlay, event)
+            
+        # 每个显示帧移动一次鼠标，立即执行这一帧并处理重绘
+        frames = []
+        rng = random.Random(self.seed)
+        for x, y in freehand_path(rng, self.width, self.height, FRAME_RATE * 2):
+            hover(x, y)
+            start = time.perf_counter()
+            magnifier.tick()
+            QApplication.processEvents()
+            frames.append(time.perf_counter() - start)
+            
+        captures, renders, paints = magnifier.captures, magnifier.renders, overlay.paint_count
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            QApplication.processEvents()
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        result = {
+            "frame": percentiles(frames),
+            "lens_pixels": magnifier.lens.width() * magnifier.lens.height(),
+            "still_seconds": round(elapsed, 2),
+            "still_cpu_percent": round(cpu / elapsed * 100, 2),
+            "still_captures": magnifier.captures - captures,
+            "still_renders": magnifier.renders - renders,
+            "still_paints": overlay.paint_count - paints,
+        }
+        app.quick_change_tool("画笔")
+        QApplication.processEvents()
+        return result
+        
+    def run_spotlight(self, moves):
+        """聚光灯：每次鼠标移动的重绘耗时和重绘面积，与每次移动都整屏重绘的做法对比"""
+        app = self.app
+        spotlight = app.spotlight
+        overlay = self.overlay
+        spotlight.set_active(True)
+        QApplication.processEvents()  # 打开时的一次整屏重绘不计入
+        
+        rng = random.Random(self.seed)
+        path = [overlay.mapToGlobal(QPointF(x, y)).toPoint()
+                for x, y in freehand_path(rng, self.width, self.height, moves)]
+        partial, pixels = [], []
+        for position in path:
+            start = time.perf_counter()
+            spotlight.move_to(position)
+            QApplication.processEvents()
+            partial.append(time.perf_counter() - start)
+            pixels.append(overlay.last_paint_pixels)
+            
+        full = []
+        for position in path:
+            start = time.perf_counter()
+            spotlight.move_to(position)
+            overlay.update()
+            QApplication.processEvents()
+            full.append(time.perf_counter() - start)
+            
+        spotlight.set_active(False)
+        QApplication.processEvents()
+        return {
+            "move": percentiles(partial),
+            "full_repaint": percentiles(full),
+            "paint_pixels": round(sum(pixels) / len(pixels)),
+            "screen_pixels": self.width * self.height,
+        }
+        
+    def run_idle(self, seconds):
+        """穿透模式下空闲：画几笔后退出绘图模式，统计一段时间内的重绘和进程 CPU 时间
+        
+        合成器的负载无法在 offscreen 平台上直接测量，用窗口中不透明度不为 0 的像素数估计：
+        这些像素每一帧都要由合成器与下面的窗口混合。
+        """
+        rng = random.Random(self.seed)
+        self.app.clear_canvas()
+        self.app.current_tool = self.tool_name("FreeDraw")
+        self.recording = False
+        for _ in range(3):
+            self.draw(freehand_path(rng, self.width, self.height, 60))
+        self.recording = True
+        
+        overlay = self.overlay
+        self.app.toggle_drawing_mode(False)
+        QApplication.processEvents()  # 切换模式本身的一次重绘不计入空闲
+        paints = overlay.paint_count
+        pixels = overlay.total_paint_pixels
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            QApplication.processEvents()
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        result = {
+            "seconds": round(elapsed, 2),
+            "cpu_percent": round(cpu / elapsed * 100, 2),
+            "paints": overlay.paint_count - paints,
+            "paint_pixels": overlay.total_paint_pixels - pixels,
+            "window_opacity": round(self.app.windowOpacity(), 3),
+            "visible_pixels": visible_pixels(overlay),
+        }
+        self.app.toggle_drawing_mode(True)
+        QApplication.processEvents()
+        return result
+
+
+def visible_pixels(widget):
+    """渲染一次窗口内容，统计 alpha 不为 0 的像素"""
+    image = widget.grab().toImage().convertToFormat(QImage.Format.Format_ARGB32)
+    buffer = image.constBits()
+    buffer.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(image.height(), image.bytesPerLine() // 4, 4)
+    return int(np.count_nonzero(pixels[:, :image.width(), 3]))
+
+
+TOOLS = ["FreeDraw", "Line", "Rectangle", "Ellipse", "Eraser", "ObjectEraser"]
+
+
+def run(size_name, strokes=10, memory_strokes=10000, input_rate=120, tools=None, idle_seconds=2.0,
+        tablet_rate=240, pages=10, magnifier_seconds=2.0, spotlight_moves=240):
+    """在当前进程中运行一种屏幕尺寸的全部场景，返回结果字典"""
+    from screen_pen.app import ScreenPenApp
+    
+    qt_app = QApplication.instance() or QApplication(sys.argv)
+    started = time.perf_counter()
+    window = ScreenPenApp()
+    window.show()
+    window.toggle_drawing_mode(True)
+    QApplication.processEvents()
+    startup_ms = (time.perf_counter() - started) * 1000
+    
+    benchmark = DrawingBenchmark(window, input_rate=input_rate)
+    results = {
+        "screen": {
+            "width": benchmark.width,
+            "height": benchmark.height,
+            "device_pixel_ratio": window.overlay.canvas.device_pixel_ratio,
+        },
+        "input_rate": input_rate,
+        "window_ms": round(startup_ms, 2),
+        "tools": {},
+    }
+    for class_name in tools or TOOLS:
+        results["tools"][class_name] = benchmark.run_tool(class_name, strokes)
+    if tablet_rate:
+        results["tools"]["Tablet"] = benchmark.run_tablet(strokes, tablet_rate)
+    if memory_strokes:
+        results["memory"] = benchmark.run_memory(memory_strokes)
+    if pages > 1:
+        results["pages"] = benchmark.run_pages(pages)
+    if magnifier_seconds:
+        results["magnifier"] = benchmark.run_magnifier(magnifier_seconds)
+    if spotlight_moves:
+        results["spotlight"] = benchmark.run_spotlight(spotlight_moves)
+    if idle_seconds:
+        results["idle"] = benchmark.run_idle(idle_seconds)
+    results["rss_peak_mb"] = round(peak_rss_mb(), 1)
+    
+    window.close_app()
+    qt_app.processEvents()
+    return results
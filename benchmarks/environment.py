@@ -0,0 +1,48 @@
+"""基准测试的运行环境：Qt offscreen 平台、合成截图后端和模拟的屏幕尺寸
+
+必须在创建 QApplication 之前调用 configure()，因此每种屏幕尺寸在单独的子进程中运行。
+"""
+import json
+import os
+import resource
+import sys
+import tempfile
+
+# 名称 -> (逻辑宽度, 逻辑高度, devicePixelRatio)
+# 4K 和 5K 按 macOS Retina 的常见设置：逻辑分辨率的一半，缩放比例为 2
+SCREEN_SIZES = {
+    "1080p": (1920, 1080, 1.0),
+    "4k": (1920, 1080, 2.0),
+    "5k": (2560, 1440, 2.0),
+}
+
+
+def configure(size_name, work_dir=None):
+    """设置环境变量，让 ScreenPenApp 在没有显示器的机器上运行"""
+    width, height, dpr = SCREEN_SIZES[size_name]
+    work_dir = work_dir or tempfile.mkdtemp(prefix="screen-pen-bench-")
+    
+    config_path = os.path.join(work_dir, f"screen-{size_name}.json")
+    with open(config_path, "w") as f:
+        json.dump({
+            "synchronousWindowSystemEvents": False,
+            "windowFrameMargins": False,
+            "screens": [{
+                "name": size_name, "x": 0, "y": 0,
+                "width": width, "height": height,
+                "logicalDpi": 96, "logicalBaseDpi": 96, "dpr": dpr,
+            }],
+        }, f)
+        
+    os.environ["QT_QPA_PLATFORM"] = f"offscreen:configfile={config_path}"
+    os.environ["SCREEN_PEN_CAPTURE_BACKEND"] = "synthetic"
+    os.environ["SCREEN_PEN_JOURNAL_DIR"] = os.path.join(work_dir, "sessions")
+    return work_dir
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB），macOS 的单位是字节，Linux 是 KB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
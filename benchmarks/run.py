@@ -0,0 +1,210 @@
+"""基准测试入口：为每种屏幕尺寸启动一个子进程，汇总结果并与基准比较"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from .environment import SCREEN_SIZES, configure
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+# 参与回退比较的指标（都是越小越好），以及低于多少的变化视为噪声
+COMPARED_METRICS = {
+    "p50": 20.0,            # 微秒
+    "p99": 50.0,            # 微秒
+    "alloc_peak_kb": 64.0,
+    "canvas_mb": 1.0,
+    "history_mb": 1.0,
+    "per_stroke_us": 20.0,
+    "rss_peak_mb": 8.0,
+}
+
+
+def run_worker(size_name, output_path, options):
+    """子进程：配置 offscreen 屏幕后运行一种尺寸的全部场景"""
+    work_dir = configure(size_name)
+    from .drawing import run
+    results = run(size_name, strokes=options.strokes, memory_strokes=options.memory_strokes,
+                  input_rate=options.input_rate, tools=options.tools, idle_seconds=options.idle_seconds,
+                  tablet_rate=options.tablet_rate, pages=options.pages,
+                  magnifier_seconds=options.magnifier_seconds, spotlight_moves=options.spotlight_moves)
+    results["work_dir"] = work_dir
+    with open(output_path, "w") as f:
+        json.dump(results, f, ensure_ascii=False)
+
+
+def run_size(size_name, options):
+    """在新进程中运行一种屏幕尺寸，屏幕配置只能在创建 QApplication 之前设置"""
+    fd, output_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    command = [sys.executable, "-m", "benchmarks.run", "--worker", size_name, "--worker-output", output_path,
+               "--strokes", str(options.strokes), "--memory-strokes", str(options.memory_strokes),
+               "--input-rate", str(options.input_rate), "--idle-seconds", str(options.idle_seconds),
+               "--tablet-rate", str(options.tablet_rate), "--pages", str(options.pages),
+               "--magnifier-seconds", str(options.magnifier_seconds), "--spotlight-moves", str(options.spotlight_moves)]
+    if options.tools:
+        command += ["--tools"] + options.tools
+    try:
+        completed = subprocess.run(command, cwd=os.path.dirname(BENCHMARK_DIR),
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if completed.returncode != 0:
+            print(completed.stdout)
+            raise RuntimeError(f"{size_name} 基准测试失败（返回码 {completed.returncode}）")
+        with open(output_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(output_path)
+
+
+def flatten(results):
+    """把嵌套结果展开成 {"5k/FreeDraw/move/p99": 数值}，便于比较"""
+    flat = {}
+    
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}/{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix] = value
+            
+    walk("", results.get("sizes", {}))
+    return flat
+
+
+def compare(results, baseline, threshold):
+    """返回回退的指标列表：(名称, 基准值, 当前值, 变化比例)"""
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+    for name, value in sorted(current.items()):
+        metric = name.rsplit("/", 1)[-1]
+        if metric not in COMPARED_METRICS or name not in previous:
+            continue
+        old = previous[name]
+        if value - old <= COMPARED_METRICS[metric]:
+            continue
+        change = (value - old) / old if old else float("inf")
+        if change > threshold:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def print_summary(results):
+    for size_name, size_results in results["sizes"].items():
+        screen = size_results["screen"]
+        print(f"\n== {size_name}: {screen['width']}x{screen['height']} @{screen['device_pixel_ratio']}x，"
+              f"峰值内存 {size_results['rss_peak_mb']} MB ==")
+        print(f"{'工具':<10}{'move p50/p99 (us)':>22}{'flush p99':>12}{'paint p50/p99 (us)':>22}"
+              f"{'release p99':>14}{'分配峰值 KB':>14}")
+        for tool, stats in size_results["tools"].items():
+            move, paint = stats.get("move", {}), stats.get("paint", {})
+            print(f"{tool:<10}{move.get('p50', 0):>11}/{move.get('p99', 0):<10}"
+                  f"{stats.get('flush', {}).get('p99', 0):>12}"
+                  f"{paint.get('p50', 0):>11}/{paint.get('p99', 0):<10}"
+                  f"{stats.get('release', {}).get('p99', 0):>14}{stats['alloc_peak_kb']:>14}")
+        memory = size_results.get("memory")
+        if memory:
+            print(f"{memory['strokes']} 笔短笔迹：每笔 {memory['per_stroke_us']} us，画布 {memory['canvas_mb']} MB，"
+                  f"历史 {memory['history_mb']}/{memory['history_budget_mb']} MB，"
+                  f"对象橡皮命中测试 p50/p99 {memory['hit_test']['p50']}/{memory['hit_test']['p99']} us")
+        pages = size_results.get("pages")
+        if pages:
+            print(f"{pages['pages']} 页白板：翻到相邻页 p50/p99 {pages['switch_nearby']['p50']}/"
+                  f"{pages['switch_nearby']['p99']} us，跳到远处页 p50/p99 {pages['switch_distant']['p50']}/"
+                  f"{pages['switch_distant']['p99']} us，非活动页占用 {pages['inactive_mb']} MB"
+                  f"（压缩数据 {pages['packed_kb']} KB）")
+        magnifier = size_results.get("magnifier")
+        if magnifier:
+            print(f"放大镜：每帧 p50/p99 {magnifier['frame']['p50']}/{magnifier['frame']['p99']} us，"
+                  f"鼠标不动 {magnifier['still_seconds']} s 截图 {magnifier['still_captures']} 次、"
+                  f"重新缩放 {magnifier['still_renders']} 次，CPU {magnifier['still_cpu_percent']}%")
+        spotlight = size_results.get("spotlight")
+        if spotlight:
+            print(f"聚光灯：每次移动 p50/p99 {spotlight['move']['p50']}/{spotlight['move']['p99']} us，"
+                  f"重绘 {spotlight['paint_pixels']}/{spotlight['screen_pixels']} 像素"
+                  f"（整屏重绘 p50/p99 {spotlight['full_repaint']['p50']}/{spotlight['full_repaint']['p99']} us）")
+        idle = size_results.get("idle")
+        if idle:
+            print(f"穿透模式空闲 {idle['seconds']} s：CPU {idle['cpu_percent']}%，重绘 {idle['paints']} 次，"
+                  f"窗口不透明度 {idle['window_opacity']}，可见像素 {idle['visible_pixels']}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="screen-pen 绘图热路径基准测试")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SCREEN_SIZES), default=list(SCREEN_SIZES),
+                        help="屏幕尺寸")
+    parser.add_argument("--tools", nargs="+", help="只测试部分工具（drawing_tools 中的类名）")
+    parser.add_argument("--strokes", type=int, default=10, help="每种工具画多少笔")
+    parser.add_argument("--memory-strokes", type=int, default=10000, help="内存场景的笔数，0 表示跳过")
+    parser.add_argument("--input-rate", type=int, default=120, help="模拟的鼠标事件频率（Hz）")
+    parser.add_argument("--tablet-rate", type=int, default=240, help="模拟的数位板事件频率（Hz），0 表示跳过")
+    parser.add_argument("--pages", type=int, default=10, help="分页场景的页数，0 或 1 表示跳过")
+    parser.add_argument("--magnifier-seconds", type=float, default=2.0, help="放大镜场景中鼠标不动的时长，0 表示跳过")
+    parser.add_argument("--spotlight-moves", type=int, default=240, help="聚光灯场景的鼠标移动次数，0 表示跳过")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="穿透模式空闲场景的时长，0 表示跳过")
+    parser.add_argument("--output", help="结果文件，默认写入 benchmarks/results/")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基准文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基准")
+    parser.add_argument("--compare", action="store_true", help="与基准比较，出现回退时返回 1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的变慢比例")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    if options.worker:
+        run_worker(options.worker, options.worker_output, options)
+        return 0
+        
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "sizes": {},
+    }
+    for size_name in options.sizes:
+        print(f"运行 {size_name} ...")
+        results["sizes"][size_name] = run_size(size_name, options)
+    print_summary(results)
+    
+    output = options.output or os.path.join(DEFAULT_RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存至: {output}")
+    
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基准已保存至: {options.baseline}")
+        
+    if options.compare:
+        if not os.path.exists(options.baseline):
+            print(f"找不到基准文件: {options.baseline}，请先运行 --save-baseline")
+            return 1
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.threshold)
+        if not regressions:
+            print(f"与基准相比没有超过 {options.threshold:.0%} 的回退")
+            return 0
+        print(f"\n{len(regressions)} 项指标比基准慢了 {options.threshold:.0%} 以上：")
+        for name, old, value, change in regressions:
+            print(f"  {name}: {old} -> {value} (+{change:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,26 +4,53 @@
 import sys
 import os
 import time
-import subprocess
-from PyQt6.QtWidgets import QApplication, QMessageBox
-from PyQt6.QtCore import QTimer, Qt
-from screen_pen.app import ScreenPenApp
+
+STARTED_AT = time.perf_counter()
+
+
+class StartupProfiler:
+    """--profile-startup 时记录每个启动阶段的耗时"""
+    
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = STARTED_AT
+        self.phases = []
+        
+    def mark(self, name, detail=""):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000, detail))
+        self.last = now
+        
+    def mark_import(self, name, modules_before):
+        self.mark(f"导入 {name}", f"新加载 {len(sys.modules) - modules_before} 个模块")
+        
+    def report(self):
+        if not self.enabled:
+            return
+        print("启动耗时:")
+        for name, elapsed_ms, detail in self.phases:
+            print(f"  {name:<20}{elapsed_ms:8.1f} ms  {detail}")
+        print(f"  {'合计':<20}{(self.last - STARTED_AT) * 1000:8.1f} ms")
+
 
 def check_screen_recording_permission():
-    """检查屏幕录制权限"""
+    """检查屏幕录制权限：查询系统接口或截取 1x1 像素，已授权的结果会被缓存"""
+    from screen_pen.screen_capture import check_permission
     try:
-        # 尝试截图，如果没有权限会抛出异常
-        from screen_pen.screen_capture import capture_screen
-        test_image = capture_screen()
-        if test_image is not None:
-            return True
+        return check_permission()
     except Exception as e:
         print(f"权限检查错误: {e}")
         return False
-    return False
+
+def preload_modules():
+    """窗口显示之后再导入绘图时才用到的 NumPy，第一笔不需要等待导入"""
+    import numpy
 
 def run_permission_setup():
     """运行权限设置向导"""
+    import subprocess
     script_dir = os.path.dirname(os.path.abspath(__file__))
     setup_script = os.path.join(script_dir, "setup_permissions.py")
     
@@ -33,21 +60,34 @@ def run_permission_setup():
     else:
         print("找不到权限设置脚本")
 
-if __name__ == "__main__":
+def main():
+    profiler = StartupProfiler("--profile-startup" in sys.argv)
+    if profiler.enabled:
+        sys.argv.remove("--profile-startup")
+        
+    # 模块在需要时才导入，--profile-startup 可以看到每一步的耗时
+    modules_before = len(sys.modules)
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+    from PyQt6.QtCore import QTimer, Qt
+    profiler.mark_import("PyQt6", modules_before)
+    
     # 使用新版本的高 DPI 支持方式
     # PyQt6 中已废弃 AA_EnableHighDpiScaling，改用 QApplication.setHighDpiScaleFactorRoundingPolicy
     if hasattr(Qt, 'HighDpiScaleFactorRoundingPolicy'):  # 检查属性是否存在
         QApplication.setHighDpiScaleFactorRoundingPolicy(
             Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
-    
+            
     # AA_UseHighDpiPixmaps 仍然存在，但为了安全也加入检查
     if hasattr(Qt.ApplicationAttribute, 'AA_UseHighDpiPixmaps'):
         QApplication.setAttribute(Qt.ApplicationAttribute.AA_UseHighDpiPixmaps, True)
-    
+        
     app = QApplication(sys.argv)
+    profiler.mark("创建 QApplication")
     
     # 检查屏幕录制权限
-    if not check_screen_recording_permission():
+    granted = check_screen_recording_permission()
+    profiler.mark("检查权限", "已授权" if granted else "未授权")
+    if not granted:
         result = QMessageBox.question(
             None,
             "需要设置权限",
@@ -57,27 +97,28 @@ if __name__ == "__main__":
         
         if result == QMessageBox.StandardButton.Yes:
             run_permission_setup()
-            sys.exit(0)  # 退出当前进程，权限设置完成后会重新启动应用
-    
+            return 0  # 退出当前进程，权限设置完成后会重新启动应用
+            
     # 创建屏幕教鞭应用
+    modules_before = len(sys.modules)
+    from screen_pen.app import ScreenPenApp
+    profiler.mark_import("screen_pen.app", modules_before)
     screen_pen = ScreenPenApp()
+    profiler.mark("创建窗口")
     screen_pen.show()
+    profiler.mark("显示窗口")
     
-    # 使用定时器确保窗口显示在最前端和正确设置不透明度
-    def ensure_visible():
+    # 窗口第一次显示之后（事件循环开始时）只调整一次：置顶
+    def finish_startup():
         screen_pen.raise_()
         screen_pen.activateWindow()
-        # 确保初始状态为非绘图模式
-        if not screen_pen.drawing_mode_active:
-            screen_pen.setWindowOpacity(0.01)
-        QApplication.processEvents()
-    
-    # 设置定时器，延迟100毫秒后确保窗口可见
-    QTimer.singleShot(100, ensure_visible)
-    
-    # 再次确认设置正确
-    QTimer.singleShot(500, lambda: screen_pen.ensure_mouse_transparency())
-    QTimer.singleShot(1000, lambda: screen_pen.ensure_mouse_transparency())
-    QTimer.singleShot(2000, lambda: screen_pen.ensure_mouse_transparency())
+        profiler.mark("首次事件循环")
+        profiler.report()
+        QTimer.singleShot(0, preload_modules)
+        
+    QTimer.singleShot(0, finish_startup)
     
-    sys.exit(app.exec())
+    return app.exec()
+
+if __name__ == "__main__":
+    sys.exit(main())
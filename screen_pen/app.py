@@ -1,14 +1,27 @@
 import os
+import struct
 import sys
+import time
 from PyQt6.QtWidgets import (QMainWindow, QApplication, QWidget, QPushButton, 
                             QVBoxLayout, QHBoxLayout, QColorDialog, QSlider, 
                             QLabel, QComboBox, QMenu, QFileDialog, QMessageBox,
-                            QToolButton, QFrame, QSizePolicy, QStatusBar)
+                            QToolButton, QFrame, QSizePolicy, QStatusBar, QInputDialog,
+                            QDoubleSpinBox)
 from PyQt6.QtCore import Qt, QPoint, QRect, QSize, QEvent
 from PyQt6.QtGui import (QPainter, QPen, QColor, QPixmap, QIcon, QAction, 
                         QKeySequence, QShortcut, QCursor, QImage, QBrush)
-from .drawing_tools import FreeDraw, Line, Rectangle, Ellipse, Eraser
-from .screen_capture import capture_screen
+from .drawing_tools import FreeDraw, Line, Rectangle, Ellipse, Eraser, ObjectEraser, LaserPointer
+from .history import History
+from .instrumentation import metrics, MetricsHud
+from .journal import JournalWriter, JournalPlayer, load_journal, DEFAULT_JOURNAL_DIR
+from .laser import DEFAULT_FADE_SECONDS
+from .magnifier import Magnifier
+from .renderer import DEFAULT_TOLERANCE, session_layers, simplify_items, vector_filters, vector_format, write_file
+from .spotlight import Spotlight, CIRCLE, RECTANGLE
+from .overlay import ScreenOverlay, set_click_through
+from .pages import PageStore
+from .screen_capture import capture_screen, can_exclude_own_windows, get_backend
+from .screenshot_writer import ScreenshotWriter, file_filters, format_for_filter
 
 class ControlPanel(QWidget):
     def __init__(self, parent=None):
@@ -55,7 +68,7 @@ class ControlPanel(QWidget):
         self.layout.addWidget(self.tool_label)
         
         self.tool_combo = QComboBox()
-        self.tool_combo.addItems(["画笔", "直线", "矩形", "椭圆", "橡皮"])
+        self.tool_combo.addItems(["画笔", "直线", "矩形", "椭圆", "橡皮", "对象橡皮", "教鞭", "放大镜"])
         self.tool_combo.setFixedHeight(22)  # 稍微减小高度
         self.tool_combo.setFocusPolicy(Qt.FocusPolicy.StrongFocus)  # 确保能够接收焦点
         self.layout.addWidget(self.tool_combo)
@@ -105,6 +118,36 @@ class ControlPanel(QWidget):
         
         self.layout.addLayout(width_layout)
         
+        # 教鞭笔迹的淡出时间
+        self.fade_label = QLabel("淡出:")
+        self.fade_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.fade_label.setMaximumHeight(15)
+        self.layout.addWidget(self.fade_label)
+        
+        self.fade_spin = QDoubleSpinBox()
+        self.fade_spin.setRange(0.2, 10.0)
+        self.fade_spin.setSingleStep(0.5)
+        self.fade_spin.setDecimals(1)
+        self.fade_spin.setSuffix("s")
+        self.fade_spin.setValue(DEFAULT_FADE_SECONDS)
+        self.fade_spin.setFixedHeight(20)
+        self.fade_spin.setToolTip("教鞭笔迹松开后多少秒内淡出")
+        self.layout.addWidget(self.fade_spin)
+        
+        # 添加分隔线
+        self.add_separator()
+        
+        # === 分页 ===
+        self.page_label = QLabel("页:")
+        self.page_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.page_label.setMaximumHeight(15)
+        self.layout.addWidget(self.page_label)
+        
+        self.page_value = QLabel("1/1")
+        self.page_value.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.page_value.setToolTip("N 新建页，PageDown 下一页，PageUp 上一页")
+        self.layout.addWidget(self.page_value)
+        
         # 添加分隔线
         self.add_separator()
         
@@ -113,14 +156,33 @@ class ControlPanel(QWidget):
         btn_layout = QVBoxLayout()
         btn_layout.setSpacing(2)
         
+        self.record_btn = QPushButton("录制")
+        self.record_btn.setCheckable(True)  # 再次点击停止录制
+        self.record_btn.setStyleSheet("""
+            QPushButton:checked {
+                background-color: #d9534f;
+                color: white;
+            }
+        """)
         self.clear_btn = QPushButton("清屏")
         self.quit_btn = QPushButton("退出")
         
+        self.metrics_btn = QPushButton("监控")
+        self.metrics_btn.setCheckable(True)  # 显示延迟和帧率
+        self.metrics_btn.setToolTip("性能监控：显示输入延迟和帧率，Ctrl+Shift+M 导出数据")
+        
+        self.spotlight_btn = QPushButton("聚光灯")
+        self.spotlight_btn.setCheckable(True)
+        self.spotlight_btn.setToolTip("只照亮鼠标周围，H 开关，Shift+H 切换圆形/矩形")
+        
         # 设置按钮最小高度和宽度
-        for btn in [self.clear_btn, self.quit_btn]:
+        for btn in [self.record_btn, self.spotlight_btn, self.metrics_btn, self.clear_btn, self.quit_btn]:
             btn.setMinimumHeight(25)  # 略微减小按钮高度
             btn.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         
+        btn_layout.addWidget(self.record_btn)
+        btn_layout.addWidget(self.spotlight_btn)
+        btn_layout.addWidget(self.metrics_btn)
         btn_layout.addWidget(self.clear_btn)
         btn_layout.addWidget(self.quit_btn)
         
@@ -176,6 +238,9 @@ class ControlPanel(QWidget):
     def update_width_label(self, value):
         self.width_value.setText(str(value))
         
+    def set_page(self, index, count):
+        self.page_value.setText(f"{index + 1}/{count}")
+        
     def toggle_draw_mode(self, is_active):
         """切换绘图模式时更新按钮文字"""
         if is_active:
@@ -189,9 +254,9 @@ class ControlPanel(QWidget):
         screen = QApplication.primaryScreen()
         screen_geometry = screen.geometry()
         
-        # 计算窗口位置，使其位于屏幕右侧中部
-        x = screen_geometry.width() - self.width() - 20  # 距离右边缘20像素
-        y = (screen_geometry.height() - self.height()) // 2
+        # 计算窗口位置，使其位于主屏幕右侧中部（多屏时主屏幕不一定从原点开始）
+        x = screen_geometry.x() + screen_geometry.width() - self.width() - 20  # 距离右边缘20像素
+        y = screen_geometry.y() + (screen_geometry.height() - self.height()) // 2
         
         self.move(x, y)
         
@@ -210,21 +275,51 @@ class ScreenPenApp(QMainWindow):
         self.current_tool = "画笔"
         self.pen_color = QColor(255, 0, 0)  # 红色
         self.pen_width = 6  # 修改默认线宽为6
-        self.drawing = False
-        self.last_point = QPoint()
-        self.current_shape = None
         
-        # 初始化绘图工具
+        # 绘图工具：每次按下鼠标用对应的类创建一个新的工具对象
         self.tools = {
-            "画笔": FreeDraw(),
-            "直线": Line(),
-            "矩形": Rectangle(),
-            "椭圆": Ellipse(),
-            "橡皮": Eraser(),
+            "画笔": FreeDraw,
+            "直线": Line,
+            "矩形": Rectangle,
+            "椭圆": Ellipse,
+            "橡皮": Eraser,
+            "对象橡皮": ObjectEraser,
+            "教鞭": LaserPointer,
         }
+        # 教鞭笔迹松开后的淡出时间（秒）
+        self.laser_fade_seconds = DEFAULT_FADE_SECONDS
+        
+        # 放大镜不是绘图工具，选中后在鼠标旁边显示放大的屏幕内容
+        self.magnifier = Magnifier(self, parent=self)
+        
+        # 聚光灯：除鼠标周围以外的屏幕变暗，穿透模式下同样有效
+        self.spotlight = Spotlight(self, parent=self)
+        
+        # 撤销/重做：每步只保存被改动的瓦片，所有屏幕共用一条历史
+        self.history = History()
         
-        # 创建画布
-        self.canvas = QPixmap()
+        # 白板分页：不活动的页在后台压缩，超出内存上限时写入临时文件
+        self.pages = PageStore(parent=self)
+        
+        # 笔迹日志：场景的每次变化都追加写入会话文件，之后可以加载或重放
+        self.journal = None
+        self.player = None
+        self.open_journal()
+        # 不经过 close_app 退出（Cmd+Q、注销、QApplication.quit）时也要写完日志
+        QApplication.instance().aboutToQuit.connect(self.close_journal)
+        self.history.add_listener(self.on_scene_changed)
+        
+        # 截图在后台线程中编码保存，不阻塞绘图
+        self.screenshot_writer = ScreenshotWriter(parent=self)
+        self.screenshot_writer.saved.connect(self.on_screenshot_saved)
+        
+        # 录屏：按目标帧率截图并合成墨迹
+        self.recorder = None
+        # 已经停止截图、编码线程还在收尾的录制
+        self.finishing_recorders = []
+        self.recording_fps = 15
+        # 矢量导出时自由笔迹的简化容差，在导出对话框中修改
+        self.export_tolerance = DEFAULT_TOLERANCE
         
     def setup_ui(self):
         # 获取屏幕尺寸
@@ -234,7 +329,7 @@ class ScreenPenApp(QMainWindow):
         self.screen_height = screen_geometry.height()
         
         # 设置窗口
-        self.setGeometry(0, 0, self.screen_width, self.screen_height)
+        self.setGeometry(screen_geometry)
         
         # 修改窗口属性 - 使用合适的窗口类型来支持鼠标事件穿透
         self.setWindowFlags(
@@ -247,14 +342,18 @@ class ScreenPenApp(QMainWindow):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground, True)
         
-        # 在初始化时不要设置鼠标事件穿透属性，而是直接将窗口隐藏
-        # 这样更彻底地让鼠标事件传递到其他应用程序
-        self.setWindowOpacity(0.01)  # 几乎透明但不完全隐藏，以保持窗口活跃
+        # 默认是鼠标穿透模式：窗口不接收鼠标事件，已有的标注仍然可见
         self.drawing_mode_active = False
+        set_click_through(self, True)
         
-        # 初始化画布
-        self.canvas = QPixmap(self.screen_width, self.screen_height)
-        self.canvas.fill(Qt.GlobalColor.transparent)
+        # 主窗口覆盖主屏幕，其余每个屏幕各有一个独立的绘图层窗口
+        self.overlay = ScreenOverlay(self, screen, parent=self)
+        self.setCentralWidget(self.overlay)
+        self.screen_overlays = {}
+        QApplication.instance().screenAdded.connect(self.sync_screens)
+        QApplication.instance().screenRemoved.connect(self.sync_screens)
+        QApplication.instance().primaryScreenChanged.connect(self.sync_screens)
+        self.sync_screens()
         
         # 创建控制面板并停靠在右侧
         self.control_panel = ControlPanel()
@@ -270,72 +369,182 @@ class ScreenPenApp(QMainWindow):
         self.control_panel.tool_combo.currentTextChanged.connect(self.change_tool)
         self.control_panel.color_btn.clicked.connect(self.change_color)  # 确保此信号连接被正确设置
         self.control_panel.width_slider.valueChanged.connect(self.change_width)
+        self.control_panel.fade_spin.valueChanged.connect(self.change_laser_fade)
         self.control_panel.clear_btn.clicked.connect(self.clear_canvas)
         self.control_panel.quit_btn.clicked.connect(self.close_app)
         self.control_panel.draw_mode_btn.clicked.connect(self.toggle_drawing_mode)
-        
+        self.control_panel.record_btn.clicked.connect(self.toggle_recording)
+        self.control_panel.spotlight_btn.toggled.connect(self.toggle_spotlight)
+        self.control_panel.metrics_btn.clicked.connect(self.toggle_metrics)
+        
+        # 性能监控：环境变量 SCREEN_PEN_METRICS=1 时启动即打开
+        self.metrics_hud = None
+        self.control_panel.metrics_btn.setChecked(metrics.enabled)
+        
+    @property
+    def overlays(self):
+        """所有屏幕的绘图层，主屏幕在前"""
+        return [self.overlay] + list(self.screen_overlays.values())
+    
+    def overlay_windows(self):
+        """所有绘图层的顶层窗口"""
+        return [self] + list(self.screen_overlays.values())
+    
+    def sync_screens(self, *args):
+        """屏幕增加、移除或主屏幕改变时，保证每个屏幕都有且只有一个绘图层"""
+        primary = QApplication.primaryScreen()
+        if self.overlay.screen_ref is not primary:
+            self.setGeometry(primary.geometry())
+            self.overlay.set_screen(primary)
+            
+        screens = [screen for screen in QApplication.screens() if screen is not primary]
+        for screen in list(self.screen_overlays):
+            if screen not in screens:
+                overlay = self.screen_overlays.pop(screen)
+                self.pages.forget(overlay)
+                self.magnifier.forget(overlay)
+                self.spotlight.forget(overlay)
+                overlay.detach()
+                overlay.close()
+                overlay.deleteLater()
+                
+        for screen in screens:
+            if screen not in self.screen_overlays:
+                overlay = ScreenOverlay(self, screen)
+                set_click_through(overlay, not self.drawing_mode_active)
+                overlay.setMouseTracking(self.magnifier.active)
+                self.screen_overlays[screen] = overlay
+        self.update_overlay_visibility()
+        
+    def update_overlay_visibility(self):
+        """副屏绘图层只在绘图模式或有墨迹时显示，空闲的空白屏幕不占用窗口缓冲区"""
+        if not self.isVisible():
+            return
+        for overlay in self.screen_overlays.values():
+            visible = self.drawing_mode_active or overlay.has_ink() or self.spotlight.active
+            if visible and not overlay.isVisible():
+                overlay.show()
+            elif not visible and overlay.isVisible():
+                overlay.hide()
+                
+    def apply_click_through(self):
+        """按当前模式设置所有绘图层窗口的鼠标穿透"""
+        for window in self.overlay_windows():
+            set_click_through(window, not self.drawing_mode_active)
+    
     def toggle_drawing_mode(self, checked):
-        """切换绘图模式 - 使用窗口不透明度而不是鼠标事件穿透属性"""
+        """切换绘图模式：穿透模式下窗口不接收鼠标事件，标注保持可见"""
         self.drawing_mode_active = checked
         
         # 更新按钮文字
         self.control_panel.toggle_draw_mode(checked)
         
         if checked:
-            # 绘图模式：窗口正常显示，可以绘图
-            self.setWindowOpacity(1.0)
+            # 绘图模式：窗口接收鼠标事件，可以绘图
             print("已切换到绘图模式")
             self.status_bar.showMessage("绘图模式：可以在屏幕上绘图")
         else:
-            # 非绘图模式：窗口几乎不可见，鼠标事件会穿透到其他应用
-            self.setWindowOpacity(0.01)  # 非常低的透明度，实质上是隐藏窗口
+            # 非绘图模式：鼠标事件由窗口系统直接交给其他应用
             print("已切换到鼠标穿透模式")
             self.status_bar.showMessage("鼠标穿透模式：可操作其他应用")
-            self.drawing = False  # 确保绘图状态被重置
-        
-        # 强制刷新
-        self.repaint()
-        QApplication.processEvents()
-    
-    def ensure_mouse_transparency(self):
-        """确保在非绘图模式下窗口几乎不可见"""
-        if not self.drawing_mode_active:
-            self.setWindowOpacity(0.01)
-            self.repaint()
-            QApplication.processEvents()
-            print("已重新确认鼠标穿透模式")
+            for overlay in self.overlays:
+                overlay.cancel_drawing()  # 确保绘图状态被重置
+        self.apply_click_through()
+        self.update_overlay_visibility()
+        self.update_magnifier()
+        
+        # 绘图模式才有接收鼠标的背景层，整个窗口重绘一次
+        for overlay in self.overlays:
+            overlay.update()
     
     def setup_shortcuts(self):
+        # 快捷键在任意屏幕的绘图层上都有效
+        context = Qt.ShortcutContext.ApplicationShortcut
+        
         # ESC键退出
-        self.quit_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Escape), self)
+        self.quit_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Escape), self, context=context)
         self.quit_shortcut.activated.connect(self.close_app)
         
         # C键清除
-        self.clear_shortcut = QShortcut(QKeySequence(Qt.Key.Key_C), self)
+        self.clear_shortcut = QShortcut(QKeySequence(Qt.Key.Key_C), self, context=context)
         self.clear_shortcut.activated.connect(self.clear_canvas)
         
         # 保留截图快捷键，即使我们移除了按钮
-        self.capture_shortcut = QShortcut(QKeySequence(Qt.Key.Key_S), self)
+        self.capture_shortcut = QShortcut(QKeySequence(Qt.Key.Key_S), self, context=context)
         self.capture_shortcut.activated.connect(self.capture_screen)
         
+        # Shift+S 截图时保留标注
+        self.capture_annotated_shortcut = QShortcut(QKeySequence("Shift+S"), self, context=context)
+        self.capture_annotated_shortcut.activated.connect(self.capture_screen_with_annotations)
+        
+        # Ctrl+Shift+S 把标注导出为 SVG/PDF 矢量文件
+        self.export_vector_shortcut = QShortcut(QKeySequence("Ctrl+Shift+S"), self, context=context)
+        self.export_vector_shortcut.activated.connect(self.export_vector)
+        
         # 数字键选择工具
-        self.pen_shortcut = QShortcut(QKeySequence(Qt.Key.Key_1), self)
+        self.pen_shortcut = QShortcut(QKeySequence(Qt.Key.Key_1), self, context=context)
         self.pen_shortcut.activated.connect(lambda: self.quick_change_tool("画笔"))
         
-        self.line_shortcut = QShortcut(QKeySequence(Qt.Key.Key_2), self)
+        self.line_shortcut = QShortcut(QKeySequence(Qt.Key.Key_2), self, context=context)
         self.line_shortcut.activated.connect(lambda: self.quick_change_tool("直线"))
         
-        self.rect_shortcut = QShortcut(QKeySequence(Qt.Key.Key_3), self)
+        self.rect_shortcut = QShortcut(QKeySequence(Qt.Key.Key_3), self, context=context)
         self.rect_shortcut.activated.connect(lambda: self.quick_change_tool("矩形"))
         
-        self.ellipse_shortcut = QShortcut(QKeySequence(Qt.Key.Key_4), self)
+        self.ellipse_shortcut = QShortcut(QKeySequence(Qt.Key.Key_4), self, context=context)
         self.ellipse_shortcut.activated.connect(lambda: self.quick_change_tool("椭圆"))
         
-        self.eraser_shortcut = QShortcut(QKeySequence(Qt.Key.Key_5), self)
+        self.eraser_shortcut = QShortcut(QKeySequence(Qt.Key.Key_5), self, context=context)
         self.eraser_shortcut.activated.connect(lambda: self.quick_change_tool("橡皮"))
         
+        # E 选择对象橡皮，整条删除碰到的笔迹
+        self.object_eraser_shortcut = QShortcut(QKeySequence(Qt.Key.Key_E), self, context=context)
+        self.object_eraser_shortcut.activated.connect(lambda: self.quick_change_tool("对象橡皮"))
+        
+        # L 选择教鞭，笔迹松开后自动淡出
+        self.laser_shortcut = QShortcut(QKeySequence(Qt.Key.Key_L), self, context=context)
+        self.laser_shortcut.activated.connect(lambda: self.quick_change_tool("教鞭"))
+        
+        self.magnifier_shortcut = QShortcut(QKeySequence(Qt.Key.Key_6), self, context=context)
+        self.magnifier_shortcut.activated.connect(lambda: self.quick_change_tool("放大镜"))
+        
+        # H 开关聚光灯，Shift+H 切换形状
+        self.spotlight_shortcut = QShortcut(QKeySequence(Qt.Key.Key_H), self, context=context)
+        self.spotlight_shortcut.activated.connect(self.toggle_spotlight_shortcut)
+        
+        self.spotlight_shape_shortcut = QShortcut(QKeySequence("Shift+H"), self, context=context)
+        self.spotlight_shape_shortcut.activated.connect(self.toggle_spotlight_shape)
+        
+        # 分页：N 新建页，PageDown/PageUp 翻页（翻页笔也发送这两个键）
+        self.new_page_shortcut = QShortcut(QKeySequence(Qt.Key.Key_N), self, context=context)
+        self.new_page_shortcut.activated.connect(self.new_page)
+        
+        self.next_page_shortcut = QShortcut(QKeySequence(Qt.Key.Key_PageDown), self, context=context)
+        self.next_page_shortcut.activated.connect(self.next_page)
+        
+        self.previous_page_shortcut = QShortcut(QKeySequence(Qt.Key.Key_PageUp), self, context=context)
+        self.previous_page_shortcut.activated.connect(self.previous_page)
+        
+        # 撤销/重做
+        self.undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self, context=context)
+        self.undo_shortcut.activated.connect(self.undo)
+        
+        self.redo_shortcut = QShortcut(QKeySequence("Ctrl+Shift+Z"), self, context=context)
+        self.redo_shortcut.activated.connect(self.redo)
+        
+        # 加载/重放保存的会话
+        self.open_session_shortcut = QShortcut(QKeySequence("Ctrl+O"), self, context=context)
+        self.open_session_shortcut.activated.connect(self.open_session)
+        
+        self.replay_session_shortcut = QShortcut(QKeySequence("Ctrl+Shift+O"), self, context=context)
+        self.replay_session_shortcut.activated.connect(self.replay_session)
+        
+        # 导出性能监控数据
+        self.dump_metrics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+M"), self, context=context)
+        self.dump_metrics_shortcut.activated.connect(self.dump_metrics)
+        
         # 添加空格键作为切换绘图模式的快捷键
-        self.toggle_drawing_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Space), self)
+        self.toggle_drawing_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Space), self, context=context)
         self.toggle_drawing_shortcut.activated.connect(self.toggle_draw_shortcut)
         
     def toggle_draw_shortcut(self):
@@ -344,12 +553,33 @@ class ScreenPenApp(QMainWindow):
         self.control_panel.draw_mode_btn.setChecked(new_state)
         self.toggle_drawing_mode(new_state)
     
+    def toggle_spotlight_shortcut(self):
+        self.control_panel.spotlight_btn.toggle()
+        
+    def toggle_spotlight(self, checked):
+        self.spotlight.set_active(checked)
+        self.update_overlay_visibility()
+        
+    def toggle_spotlight_shape(self):
+        self.spotlight.set_shape(RECTANGLE if self.spotlight.shape == CIRCLE else CIRCLE)
+    
     def quick_change_tool(self, tool_name):
         self.current_tool = tool_name
         self.control_panel.tool_combo.setCurrentText(tool_name)
+        self.update_magnifier()
         
     def change_tool(self, tool_name):
         self.current_tool = tool_name
+        self.update_magnifier()
+        
+    def update_magnifier(self):
+        """绘图模式下选中放大镜时打开；绘图层只在这时跟踪没有按键的鼠标移动"""
+        active = self.drawing_mode_active and self.current_tool == "放大镜"
+        if active == self.magnifier.active:
+            return
+        for overlay in self.overlays:
+            overlay.setMouseTracking(active)
+        self.magnifier.set_active(active)
         
     def change_color(self):
         try:
@@ -363,126 +593,409 @@ class ScreenPenApp(QMainWindow):
     def change_width(self, width):
         self.pen_width = width
         
+    def change_laser_fade(self, seconds):
+        """只影响之后松开的教鞭笔迹"""
+        self.laser_fade_seconds = seconds
+        
     def clear_canvas(self):
-        self.canvas.fill(Qt.GlobalColor.transparent)
-        self.update()
+        # 绘制途中清屏会替换掉这一笔正在记录的历史步骤
+        if self.is_drawing():
+            return
+        self.stop_replay()
+        # 所有屏幕的清屏记录为一步，可以一次撤销
+        self.history.begin()
+        removed = []
+        for overlay in self.overlays:
+            removed.extend((overlay, item) for item in overlay.clear_canvas())
+        self.history.commit(removed=removed)
+        self.update_overlay_visibility()
+        
+    def new_page(self):
+        """在最后新建一页并切换过去"""
+        if self.is_drawing():
+            return
+        self.stop_replay()
+        self.show_page(self.pages.new_page())
+        
+    def next_page(self):
+        if self.is_drawing() or self.pages.current + 1 >= len(self.pages):
+            return
+        self.stop_replay()
+        self.show_page(self.pages.current + 1)
+        
+    def previous_page(self):
+        if self.is_drawing() or self.pages.current == 0:
+            return
+        self.stop_replay()
+        self.show_page(self.pages.current - 1)
+        
+    def show_page(self, index, create=False):
+        """切换到第 index 页，create 为 True 时补齐不存在的页
+        
+        撤销记录只针对当前页，翻页后从头开始。
+        """
+        while create and index >= len(self.pages):
+            self.pages.new_page()
+        if index == self.pages.current or not 0 <= index < len(self.pages):
+            return
+        started = time.perf_counter()
+        self.pages.switch(self.overlays, index)
+        self.history.clear()
+        if self.journal is not None:
+            self.journal.record_page(index)
+        self.update_overlay_visibility()
+        self.control_panel.set_page(index, len(self.pages))
+        # 翻页频繁，只在状态栏显示，不打印
+        self.status_bar.showMessage(
+            f"第 {index + 1}/{len(self.pages)} 页（切换 {(time.perf_counter() - started) * 1000:.1f} ms）")
+        
+    def add_items(self, overlay, items):
+        """把对象加入某个屏幕的场景，作为一步可撤销的操作"""
+        self.history.begin()
+        overlay.add_items(items)
+        self.history.commit(added=[(overlay, item) for item in items])
+        self.update_overlay_visibility()
+        
+    def remove_items(self, overlay, items):
+        """从某个屏幕的场景中删除对象，作为一步可撤销的操作"""
+        self.history.begin()
+        overlay.remove_items(items)
+        self.history.commit(removed=[(overlay, item) for item in items])
+        self.update_overlay_visibility()
+        
+    def is_drawing(self):
+        return any(overlay.drawing for overlay in self.overlays)
+        
+    def undo(self):
+        if self.is_drawing() or self.is_replaying():
+            return
+        for overlay, rect in self.history.undo().items():
+            overlay.update(rect)
+        self.update_overlay_visibility()
+        
+    def redo(self):
+        if self.is_drawing() or self.is_replaying():
+            return
+        for overlay, rect in self.history.redo().items():
+            overlay.update(rect)
+        self.update_overlay_visibility()
+        
+    def screen_index(self, overlay):
+        """绘图层在日志中的屏幕编号，主屏幕为 0"""
+        overlays = self.overlays
+        return overlays.index(overlay) if overlay in overlays else 0
+        
+    def overlay_for_screen(self, index):
+        """按屏幕编号找到绘图层，屏幕已经不存在时画到主屏幕上"""
+        overlays = self.overlays
+        return overlays[index] if index < len(overlays) else self.overlay
+        
+    def open_journal(self):
+        directory = os.environ.get("SCREEN_PEN_JOURNAL_DIR", DEFAULT_JOURNAL_DIR)
+        path = os.path.join(directory, f"session-{time.strftime('%Y%m%d-%H%M%S')}.spj")
+        try:
+            self.journal = JournalWriter(path)
+            # 同名文件已存在时 JournalWriter 会加上序号
+            print(f"笔迹日志: {self.journal.path}")
+        except OSError as e:
+            print(f"无法创建笔迹日志: {e}")
+            
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            
+    def on_scene_changed(self, added, removed):
+        """历史记录中的每一步（包括撤销和重做）都写入笔迹日志"""
+        if self.journal is None:
+            return
+        if removed:
+            self.journal.record_removed([item for _, item in removed])
+        for overlay, item in added:
+            self.journal.record_added(self.screen_index(overlay), item)
+            
+    def choose_session(self, title):
+        file_path, _ = QFileDialog.getOpenFileName(self, title, DEFAULT_JOURNAL_DIR, "笔迹日志 (*.spj)")
+        return file_path
+        
+    def open_session(self, file_path=None):
+        """加载会话：直接得到最终场景，一次性栅格化，作为一步可撤销的操作"""
+        if self.is_drawing():
+            return
+        file_path = file_path or self.choose_session("加载会话")
+        if not file_path:
+            return
+        self.stop_replay()
+        
+        started = time.perf_counter()
+        try:
+            journal = load_journal(file_path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"加载会话失败: {e}")
+            self.status_bar.showMessage(f"加载会话失败: {e}")
+            return
+        parsed = time.perf_counter()
+        
+        # 日志中的第 n 页加载到当前页之后的第 n 页；只有一页时加载到当前页，可以一步撤销
+        first_page = self.pages.current
+        pages = {}
+        for (page, screen), records in session_layers(journal).items():
+            grouped = pages.setdefault(page, {})
+            grouped.setdefault(self.overlay_for_screen(screen), []).extend(record.create_item() for record in records)
+        for page, grouped in sorted(pages.items()):
+            self.show_page(first_page + page, create=True)
+            self.history.begin()
+            for overlay, items in grouped.items():
+                overlay.add_items(items)
+            self.history.commit(added=[(overlay, item) for overlay, items in grouped.items() for item in items])
+        self.show_page(first_page)
+        self.update_overlay_visibility()
+        
+        count = sum(len(items) for grouped in pages.values() for items in grouped.values())
+        message = (f"已加载 {count} 个对象、{journal.point_count} 个点（{journal.page_count} 页）："
+                   f"解析 {(parsed - started) * 1000:.1f} ms，重建 {(time.perf_counter() - parsed) * 1000:.1f} ms")
+        print(message)
+        self.status_bar.showMessage(message)
+        
+    def replay_session(self, file_path=None, speed=None):
+        """清屏后按原来的节奏重放会话，speed 为播放倍速"""
+        if self.is_drawing():
+            return
+        file_path = file_path or self.choose_session("重放会话")
+        if not file_path:
+            return
+        if speed is None:
+            speed, ok = QInputDialog.getDouble(self, "重放会话", "播放倍速:", 1.0, 0.1, 100.0, 1)
+            if not ok:
+                return
+        try:
+            journal = load_journal(file_path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"加载会话失败: {e}")
+            self.status_bar.showMessage(f"加载会话失败: {e}")
+            return
+        
+        self.clear_canvas()
+        self.player = JournalPlayer(self, journal, speed, parent=self)
+        self.player.finished.connect(self.on_replay_finished)
+        self.status_bar.showMessage(f"正在以 {speed:g} 倍速重放会话")
+        self.player.start()
+        
+    def is_replaying(self):
+        return self.player is not None and self.player.is_playing()
+    
+    def stop_replay(self):
+        if self.is_replaying():
+            self.player.stop()
+            
+    def on_replay_finished(self):
+        self.player = None
+        self.status_bar.showMessage("会话重放完成")
+        
+    def grab_screen_without_overlay(self, screen=None):
+        """截取不包含绘图层和控制面板的屏幕"""
+        # 后端可以直接排除本程序窗口时不需要隐藏窗口，也就不会闪烁
+        if can_exclude_own_windows():
+            return capture_screen(screen, exclude_own_windows=True)
         
-    def capture_screen(self):
         # 暂时隐藏绘图窗口和控制面板
         self.hide()
+        for overlay in self.screen_overlays.values():
+            overlay.hide()
         self.control_panel.hide()
         
         # 等待一下确保窗口完全隐藏
         QApplication.processEvents()
         
         # 截取屏幕
-        screen_image = capture_screen()
+        screen_image = capture_screen(screen)
         
         # 显示窗口
         self.show()
         self.control_panel.show()
+        self.update_overlay_visibility()
+        return screen_image
+        
+    def capture_screen(self, with_annotations=False):
+        """截取主屏幕并保存，with_annotations 为 True 时把墨迹合成到截图上"""
+        # 上一张截图还在保存时忽略新的请求，避免整屏图像在内存中堆积
+        if self.screenshot_writer.is_busy():
+            self.status_bar.showMessage("截图正在保存，请稍候")
+            print("截图正在保存，忽略本次截图")
+            return
         
-        # 保存截图
+        overlay = self.overlay
+        # 先取墨迹瓦片的共享副本，合成在后台线程中进行，期间继续绘图不受影响
+        overlay_tiles = overlay.canvas.snapshot() if with_annotations else None
+        screen_image = self.grab_screen_without_overlay(overlay.screen_ref)
+        
+        # 保存截图：合成、编码和写文件都在后台线程中进行
         if screen_image:
-            file_path, _ = QFileDialog.getSaveFileName(self, "保存截图", 
+            file_path, selected_filter = QFileDialog.getSaveFileName(self, "保存截图", 
                                                     os.path.expanduser("~/Desktop/screenshot.png"),
-                                                    "PNG 图片 (*.png)")
+                                                    file_filters())
             if file_path:
-                screen_image.save(file_path)
-                QMessageBox.information(self, "保存成功", f"截图已保存至: {file_path}")
-        
-    def close_app(self):
-        self.control_panel.close()
-        self.close()
-        QApplication.quit()
-        
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        
-        # 确保整个区域都能接收鼠标事件，即使是透明的部分
-        # 添加半透明背景以便于用户知道窗口已激活
-        painter.fillRect(self.rect(), QColor(0, 0, 0, 1))  # 几乎全透明，但不是完全透明
-        
-        # 绘制当前画布
-        painter.drawPixmap(0, 0, self.canvas)
-        
-        # 如果正在绘制，绘制临时形状
-        if self.drawing and self.current_shape:
-            if self.current_tool == "橡皮":
-                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
-                painter.setPen(QPen(Qt.GlobalColor.transparent, self.pen_width, Qt.PenStyle.SolidLine))
-            else:
-                painter.setPen(QPen(self.pen_color, self.pen_width, Qt.PenStyle.SolidLine))
+                self.screenshot_writer.submit(screen_image, file_path, format_for_filter(selected_filter),
+                                              overlay_tiles=overlay_tiles,
+                                              device_pixel_ratio=overlay.canvas.device_pixel_ratio)
                 
-            self.current_shape.draw(painter)
+    def capture_screen_with_annotations(self):
+        self.capture_screen(with_annotations=True)
+                
+    def export_vector(self):
+        """把主屏幕当前页的标注导出为 SVG 或 PDF，画面大小与截图相同，可以叠加在截图上"""
+        if self.is_drawing():
+            return
+        overlay = self.overlay
+        items = sorted(overlay.scene.items.values(), key=lambda item: item.sequence)
+        if not items:
+            self.status_bar.showMessage("没有可以导出的标注")
+            return
+        file_path, selected_filter = QFileDialog.getSaveFileName(self, "导出矢量标注",
+                                                                 os.path.expanduser("~/Desktop/annotations.svg"),
+                                                                 vector_filters())
+        if not file_path:
+            return
+        tolerance, ok = QInputDialog.getDouble(self, "导出矢量标注", "笔迹简化容差（像素，0 表示不简化）:",
+                                               self.export_tolerance, 0.0, 20.0, 1)
+        if not ok:
+            return
+        self.export_tolerance = tolerance
+        image_format, file_path = vector_format(file_path, selected_filter)
         
-    def mousePressEvent(self, event):
-        if not self.drawing_mode_active:
-            # 如果不是绘图模式，不处理鼠标事件
-            event.ignore()
+        start = time.perf_counter()
+        simplified = simplify_items(items, tolerance)
+        try:
+            # 已经简化过，写文件时不再简化
+            write_file(simplified, overlay.rect(), file_path, image_format, title=os.path.basename(file_path),
+                       tolerance=0)
+        except Exception as e:
+            QMessageBox.warning(self, "导出失败", f"矢量标注导出失败: {e}")
             return
+        before = sum(len(item.shape.points()) for item in items)
+        after = sum(len(item.shape.points()) for item in simplified)
+        print(f"矢量标注已导出至: {file_path}（{len(items)} 个对象，点数 {before} -> {after}，"
+              f"耗时 {(time.perf_counter() - start) * 1000:.0f} ms）")
+        self.status_bar.showMessage(f"矢量标注已导出至: {file_path}")
+        
+    def on_screenshot_saved(self, file_path, ok, message, elapsed_ms):
+        if ok:
+            print(f"截图已保存至: {file_path}（编码耗时 {elapsed_ms:.0f} ms）")
+            QMessageBox.information(self, "保存成功", f"截图已保存至: {file_path}")
+        else:
+            QMessageBox.warning(self, "保存失败", f"截图保存失败: {message}")
+        
+    def toggle_recording(self, checked):
+        if checked:
+            self.start_recording()
+        else:
+            self.stop_recording()
             
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.drawing = True
-            self.last_point = event.pos()
-            
-            # 根据当前工具初始化形状
-            self.current_shape = self.tools[self.current_tool]
-            self.current_shape.start(event.pos())
+    def start_recording(self):
+        """开始录制主屏幕，有 ffmpeg 时输出 MP4，否则输出图片序列"""
+        # 录屏模块用到 subprocess 等，只在第一次录制时导入，不拖慢启动
+        from .recorder import Recorder, FFmpegEncoder, ImageSequenceEncoder
+        backend = get_backend()
+        overlay = self.overlay
+        screen = overlay.screen_ref
+        exclude_own_windows = backend.can_exclude_own_windows
+        
+        base_path = os.path.expanduser(f"~/Desktop/screen-pen-{time.strftime('%Y%m%d-%H%M%S')}")
+        if FFmpegEncoder.available():
+            encoder = FFmpegEncoder(base_path + ".mp4")
+        else:
+            encoder = ImageSequenceEncoder(base_path)
             
-    def mouseMoveEvent(self, event):
-        if not self.drawing_mode_active:
-            # 如果不是绘图模式，不处理鼠标事件
-            event.ignore()
+        # 后端不能排除本程序的窗口时，截到的画面里已经有绘图层上的墨迹，再合成一次墨迹会叠两层
+        annotation_source = None
+        if exclude_own_windows:
+            annotation_source = lambda: (overlay.canvas.snapshot(), overlay.canvas.device_pixel_ratio)
+        self.recorder = Recorder(
+            lambda: backend.capture(screen, exclude_own_windows),
+            encoder,
+            fps=self.recording_fps,
+            annotation_source=annotation_source,
+            frames_are_transient=backend.frames_are_transient,
+            parent=self,
+        )
+        # finished 由编码线程发出，排队回到 GUI 线程处理
+        self.recorder.finished.connect(self.on_recording_finished, Qt.ConnectionType.QueuedConnection)
+        self.recorder.start()
+        self.control_panel.record_btn.setChecked(True)
+        print(f"开始录制: {base_path}")
+        self.status_bar.showMessage("正在录制")
+        
+    def stop_recording(self):
+        """停止截图；剩下的帧在后台编码完成后由 on_recording_finished 报告结果，界面不用等待"""
+        if self.recorder is None:
             return
+        recorder, self.recorder = self.recorder, None
+        recorder.stop()
+        self.finishing_recorders.append(recorder)
+        self.control_panel.record_btn.setChecked(False)
+        self.status_bar.showMessage("正在保存录像…")
+        
+    def on_recording_finished(self, stats):
+        recorder = self.sender()
+        if recorder is self.recorder:
+            # 编码器打开失败，录制自行停止
+            self.recorder = None
+            self.control_panel.record_btn.setChecked(False)
+        if recorder in self.finishing_recorders:
+            self.finishing_recorders.remove(recorder)
+        if recorder is not None:
+            recorder.deleteLater()
+        if stats["error"] and not stats["encoded"]:
+            message = f"录制失败: {stats['error']}"
+        else:
+            message = (f"录制结束：实际 {stats['achieved_fps']} fps，丢帧 {stats['dropped']}，"
+                       f"编码延迟 {stats['encode_latency_mean_ms']} ms")
+            if stats["error"]:
+                message += f"，出错: {stats['error']}"
+        print(message)
+        self.status_bar.showMessage(message)
+        
+    def toggle_metrics(self, checked):
+        """打开或关闭性能监控，打开时从零开始统计"""
+        metrics.set_enabled(checked)
+        self.control_panel.metrics_btn.setChecked(checked)
+        if checked:
+            metrics.reset()
+            if self.metrics_hud is None:
+                self.metrics_hud = MetricsHud()
+            self.metrics_hud.show()
+        elif self.metrics_hud is not None:
+            self.metrics_hud.hide()
             
-        if event.buttons() & Qt.MouseButton.LeftButton and self.drawing:
-            tool = self.tools[self.current_tool]
-            
-            if self.current_tool == "画笔" or self.current_tool == "橡皮":
-                painter = QPainter(self.canvas)
-                
-                if self.current_tool == "橡皮":
-                    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
-                    painter.setPen(QPen(Qt.GlobalColor.transparent, self.pen_width, Qt.PenStyle.SolidLine))
-                else:
-                    painter.setPen(QPen(self.pen_color, self.pen_width, Qt.PenStyle.SolidLine))
-                    
-                tool.update(self.last_point, event.pos())
-                tool.draw(painter)
-                painter.end()
-                
-                self.last_point = event.pos()
-            else:
-                # 对于其他形状，更新当前点并重绘
-                tool.update(self.last_point, event.pos())
-                
-            self.update()
-            
-    def mouseReleaseEvent(self, event):
-        if not self.drawing_mode_active:
-            # 如果不是绘图模式，不处理鼠标事件
-            event.ignore()
+    def dump_metrics(self):
+        """把直方图导出为 JSON 文件"""
+        path = os.path.expanduser(f"~/Desktop/screen-pen-metrics-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        try:
+            metrics.dump(path)
+        except OSError as e:
+            print(f"导出性能数据失败: {e}")
+            self.status_bar.showMessage(f"导出性能数据失败: {e}")
             return
-            
-        if event.button() == Qt.MouseButton.LeftButton and self.drawing:
-            if self.current_tool not in ["画笔", "橡皮"]:
-                painter = QPainter(self.canvas)
-                
-                if self.current_tool == "橡皮":
-                    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
-                    painter.setPen(QPen(Qt.GlobalColor.transparent, self.pen_width, Qt.PenStyle.SolidLine))
-                else:
-                    painter.setPen(QPen(self.pen_color, self.pen_width, Qt.PenStyle.SolidLine))
-                    
-                self.current_shape.update(self.last_point, event.pos())
-                self.current_shape.draw(painter)
-                painter.end()
-                
-            self.drawing = False
-            self.current_shape = None
-            self.update()
-    
+        print(f"性能数据已导出至: {path}")
+        self.status_bar.showMessage(f"性能数据已导出至: {path}")
+        
+    def close_app(self):
+        self.stop_recording()
+        # 退出前等录像写完，否则文件不完整
+        for recorder in self.finishing_recorders:
+            recorder.wait()
+        self.magnifier.set_active(False)
+        self.spotlight.set_active(False)
+        if self.metrics_hud is not None:
+            self.metrics_hud.close()
+        self.stop_replay()
+        self.close_journal()
+        # 等待正在保存的截图写完
+        self.screenshot_writer.wait_for_done()
+        self.pages.close()
+        self.control_panel.close()
+        self.close()
+        QApplication.quit()
+        
     def eventFilter(self, obj, event):
         if obj == self.control_panel and event.type() in [QEvent.Type.MouseButtonPress, 
                                                          QEvent.Type.MouseButtonRelease,
@@ -492,11 +1005,8 @@ class ScreenPenApp(QMainWindow):
         return super().eventFilter(obj, event)
     
     def showEvent(self, event):
-        """窗口显示时确保正确的透明度设置"""
+        """窗口显示时显示需要的副屏绘图层，启动时要求开启性能监控的话打开监控面板"""
         super().showEvent(event)
-        # 根据当前模式设置透明度
-        if not self.drawing_mode_active:
-            self.setWindowOpacity(0.01)
-        else:
-            self.setWindowOpacity(1.0)
-        QApplication.processEvents()
+        self.update_overlay_visibility()
+        if metrics.enabled and self.metrics_hud is None:
+            self.toggle_metrics(True)
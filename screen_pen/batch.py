@@ -0,0 +1,147 @@
+"""批量渲染会话文件：python -m screen_pen.batch 会话文件或目录... -o 输出目录
+
+每个会话文件是一个独立的任务，分给进程池中的工作进程。每个工作进程只创建一次 offscreen 的 QGuiApplication，
+之后只做解析和绘制，不需要显示器。进程池使用 spawn 启动方式，各平台行为一致，也不会继承父进程的 Qt 状态。
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .renderer import DEFAULT_TOLERANCE, FORMATS
+
+SESSION_EXTENSION = ".spj"
+
+# 工作进程中的 QGuiApplication，进程结束前一直保留
+_qt_app = None
+
+
+def init_worker():
+    """工作进程启动时创建 QGuiApplication，没有指定平台时使用 offscreen"""
+    global _qt_app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtGui import QGuiApplication
+    _qt_app = QGuiApplication.instance() or QGuiApplication(["screen-pen-batch"])
+
+
+def find_sessions(paths, output_dir):
+    """展开目录，返回 [(会话文件, 不带扩展名的输出路径)]，目录中的相对路径在输出目录中保留"""
+    sessions = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sessions.append((path, os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(SESSION_EXTENSION):
+                    session = os.path.join(root, name)
+                    relative = os.path.splitext(os.path.relpath(session, path))[0]
+                    sessions.append((session, os.path.join(output_dir, relative)))
+    return sessions
+
+
+def render_task(task):
+    """在工作进程中渲染一个会话，返回 (会话文件, 写入的文件列表, 耗时, 错误信息)"""
+    from PyQt6.QtGui import QColor
+    from .renderer import render_session
+    session, output_base, options = task
+    options = dict(options)
+    if options["background"] is not None:
+        options["background"] = QColor(options["background"])
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output_base) or ".", exist_ok=True)
+        written, error = render_session(session, output_base, **options), ""
+    except Exception as e:
+        written, error = [], str(e)
+    return session, written, time.perf_counter() - start, error
+
+
+def parse_size(text):
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"画面大小应为 宽x高，例如 1920x1080: {text}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"画面大小必须为正数: {text}")
+    return width, height
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m screen_pen.batch",
+                                     description="把会话文件（.spj）的最终标注渲染为图片或矢量文件")
+    parser.add_argument("paths", nargs="+", help="会话文件或包含会话文件的目录（递归查找）")
+    parser.add_argument("-o", "--output", default=".", help="输出目录，目录中的子目录结构会被保留")
+    parser.add_argument("-f", "--formats", nargs="+", choices=sorted(FORMATS), default=["png"], help="输出格式")
+    parser.add_argument("--scale", type=float, default=1.0, help="分辨率倍数，2 相当于 Retina 屏幕")
+    parser.add_argument("--size", type=parse_size, help="固定的画面大小（逻辑像素），例如 1920x1080；默认按内容决定")
+    parser.add_argument("--crop", action="store_true", help="裁剪到标注所在的区域")
+    parser.add_argument("--background", help="背景颜色，例如 white 或 #202020；默认透明")
+    parser.add_argument("--antialias", action="store_true", help="栅格输出使用抗锯齿（屏幕上的笔迹没有抗锯齿）")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="矢量输出中自由笔迹的简化容差（逻辑像素），0 表示不简化")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    sessions = find_sessions(options.paths, options.output)
+    if not sessions:
+        print("没有找到会话文件")
+        return 1
+    if options.background is not None:
+        from PyQt6.QtGui import QColor
+        if not QColor(options.background).isValid():
+            print(f"无效的背景颜色: {options.background}")
+            return 1
+            
+    render_options = {
+        "formats": options.formats,
+        "scale": options.scale,
+        "size": options.size,
+        "crop": options.crop,
+        "background": options.background,
+        "antialias": options.antialias,
+        "tolerance": options.tolerance,
+    }
+    tasks = [(session, output_base, render_options) for session, output_base in sessions]
+    jobs = max(1, min(options.jobs, len(tasks)))
+    
+    started = time.perf_counter()
+    if jobs == 1:
+        init_worker()
+        results = summarize(map(render_task, tasks))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(jobs, mp_context=context, initializer=init_worker) as executor:
+            # 每次交给工作进程一批会话，减少进程间通信；批不能太大，否则最后几个进程空等
+            chunksize = max(1, len(tasks) // (jobs * 8))
+            results = summarize(executor.map(render_task, tasks, chunksize=chunksize))
+    rendered, files, failed, busy = results
+    elapsed = time.perf_counter() - started
+    print(f"已渲染 {rendered} 个会话、{files} 个文件，失败 {failed} 个，用时 {elapsed:.2f} s"
+          f"（{jobs} 个进程，渲染耗时合计 {busy:.2f} s）")
+    return 1 if failed else 0
+
+
+def summarize(results):
+    """逐个报告失败的会话，返回 (成功数, 文件数, 失败数, 渲染耗时合计)"""
+    rendered = files = failed = 0
+    busy = 0.0
+    for session, written, elapsed, error in results:
+        busy += elapsed
+        if error:
+            failed += 1
+            print(f"渲染失败 {session}: {error}")
+        else:
+            rendered += 1
+            files += len(written)
+    return rendered, files, failed, busy
+
+
+if __name__ == "__main__":
+    sys.exit(main())
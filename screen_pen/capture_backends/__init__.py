@@ -0,0 +1,40 @@
+"""截图后端
+
+后端按需导入：只有真正用到时才加载 Quartz、Xlib 等平台库。
+可以通过环境变量 SCREEN_PEN_CAPTURE_BACKEND 指定后端名称。
+"""
+import importlib
+import os
+import sys
+
+from .base import CaptureBackend, CaptureStats
+
+# 后端名称 -> (模块名, 类名)
+BACKENDS = {
+    "quartz": ("quartz", "QuartzBackend"),
+    "x11": ("x11", "X11Backend"),
+    "qt": ("qt", "QtBackend"),
+    "synthetic": ("synthetic", "SyntheticBackend"),
+}
+
+
+def default_backend_name():
+    """根据环境变量和当前平台选择后端"""
+    name = os.environ.get("SCREEN_PEN_CAPTURE_BACKEND")
+    if name:
+        return name
+    if sys.platform == "darwin":
+        return "quartz"
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        return "x11"
+    return "qt"
+
+
+def create_backend(name=None, **kwargs):
+    """创建指定名称的后端实例"""
+    name = name or default_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的截图后端: {name}")
+    module_name, class_name = BACKENDS[name]
+    module = importlib.import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)(**kwargs)
@@ -0,0 +1,133 @@
+import time
+
+from PyQt6.QtCore import QPoint, QRect, QSize
+from PyQt6.QtGui import QCursor, QGuiApplication
+
+from ..instrumentation import metrics
+
+
+class CaptureStats:
+    """记录每次截图的耗时（毫秒），用于比较不同后端"""
+    
+    def __init__(self):
+        self.reset()
+        
+    def reset(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        
+    def record(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.last_ms = elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.min_ms = elapsed_ms if self.min_ms is None else min(self.min_ms, elapsed_ms)
+        
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+    
+    def summary(self):
+        return {
+            "count": self.count,
+            "last_ms": round(self.last_ms, 3),
+            "mean_ms": round(self.mean_ms, 3),
+            "min_ms": round(self.min_ms or 0.0, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+def device_rect(rect, device_pixel_ratio):
+    """把逻辑坐标矩形换算成物理像素矩形"""
+    return QRect(round(rect.x() * device_pixel_ratio), round(rect.y() * device_pixel_ratio),
+                 round(rect.width() * device_pixel_ratio), round(rect.height() * device_pixel_ratio))
+
+
+class CaptureBackend:
+    """截图后端接口
+    
+    子类实现 grab(screen)，返回直接包装后端像素缓冲区的 QImage（不做额外复制）。
+    frames_are_transient 为 True 的后端会复用缓冲区，返回的图像只在下一次截图前有效，
+    需要长期保存时调用方应自行 copy()。
+    
+    子类可以覆盖 grab_region(rect, screen) 只读取需要的区域；
+    默认实现截取全屏后裁剪，没有任何节省。
+    
+    can_exclude_own_windows 为 True 的后端实现 grab_excluding_own_windows(screen)，
+    截图时排除本程序的窗口，调用方不必先隐藏绘图层。
+    """
+    
+    name = "base"
+    frames_are_transient = False
+    can_exclude_own_windows = False
+    
+    def __init__(self):
+        self.stats = CaptureStats()
+        self.region_stats = CaptureStats()
+        
+    def grab(self, screen=None):
+        raise NotImplementedError
+    
+    def grab_region(self, rect, screen):
+        """截取屏幕内的区域，rect 是相对 screen 左上角的逻辑坐标"""
+        image = self.grab(screen).copy(device_rect(rect, screen.devicePixelRatio()))
+        image.setDevicePixelRatio(screen.devicePixelRatio())
+        return image
+    
+    def grab_excluding_own_windows(self, screen=None):
+        raise NotImplementedError(f"{self.name} 后端不支持排除本程序窗口")
+    
+    def has_permission(self):
+        """用 1x1 像素的区域截图探测是否有截屏权限，比截全屏便宜得多"""
+        screen = QGuiApplication.primaryScreen()
+        try:
+            return self.capture_region(QRect(screen.geometry().topLeft(), QSize(1, 1)), screen) is not None
+        except Exception as e:
+            print(f"权限检查错误: {e}")
+            return False
+        
+    def capture(self, screen=None, exclude_own_windows=False):
+        """截取整个屏幕（screen 为 None 时截取主屏幕），并记录耗时"""
+        start = time.perf_counter()
+        if exclude_own_windows:
+            image = self.grab_excluding_own_windows(screen)
+        else:
+            image = self.grab(screen)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats.record(elapsed_ms)
+        if metrics.enabled:
+            metrics.capture_finished(elapsed_ms)
+        return image
+    
+    def capture_region(self, rect, screen=None):
+        """截取全局逻辑坐标 rect 内的区域
+        
+        screen 为 None 时使用 rect 中心所在的屏幕；超出该屏幕的部分会被裁掉。
+        返回的图像是物理像素分辨率，并设置了对应的 devicePixelRatio。
+        """
+        screen = screen or QGuiApplication.screenAt(rect.center()) or QGuiApplication.primaryScreen()
+        geometry = screen.geometry()
+        local = rect.translated(-geometry.topLeft()).intersected(QRect(QPoint(0, 0), geometry.size()))
+        if local.isEmpty():
+            return None
+        
+        start = time.perf_counter()
+        image = self.grab_region(local, screen)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.region_stats.record(elapsed_ms)
+        if metrics.enabled:
+            metrics.capture_finished(elapsed_ms)
+        return image
+    
+    def capture_cursor_region(self, size=64):
+        """截取以鼠标为中心、边长为 size 的正方形区域，供取色器和放大镜使用"""
+        center = QCursor.pos()
+        rect = QRect(center.x() - size // 2, center.y() - size // 2, size, size)
+        return self.capture_region(rect)
+    
+    def close(self):
+        """释放后端持有的系统资源"""
+        pass
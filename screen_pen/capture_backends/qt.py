@@ -0,0 +1,19 @@
+from PyQt6.QtWidgets import QApplication
+
+from .base import CaptureBackend
+
+
+class QtBackend(CaptureBackend):
+    """使用 QScreen.grabWindow 的通用后端，在没有专用后端的平台上使用
+    
+    这条路径会经过 QPixmap 转换，有额外复制，只作为兜底。只能在 GUI 线程调用。
+    """
+    
+    name = "qt"
+    
+    def grab(self, screen=None):
+        screen = screen or QApplication.primaryScreen()
+        return screen.grabWindow(0).toImage()
+    
+    def grab_region(self, rect, screen):
+        return screen.grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height()).toImage()
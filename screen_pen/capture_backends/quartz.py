@@ -0,0 +1,115 @@
+import os
+
+from PyQt6.QtGui import QImage
+from Quartz import (CGWindowListCopyWindowInfo, CGWindowListCreateImage, kCGWindowListOptionOnScreenOnly,
+                    kCGWindowListOptionOnScreenBelowWindow, kCGNullWindowID, kCGWindowImageDefault,
+                    kCGWindowNumber, kCGWindowOwnerPID,
+                    CGDisplayCreateImage, CGDisplayCreateImageForRect, CGRectMake, CGMainDisplayID, CGGetActiveDisplayList, CGDisplayBounds,
+                    CGImageGetWidth, CGImageGetHeight, CGImageGetBytesPerRow, CGImageGetBitsPerPixel,
+                    CGImageGetBitsPerComponent, CGImageGetBitmapInfo, CGImageGetDataProvider,
+                    CGDataProviderCopyData, kCGBitmapAlphaInfoMask, kCGBitmapByteOrderMask,
+                    kCGBitmapByteOrder32Little, kCGImageAlphaNoneSkipFirst, kCGImageAlphaPremultipliedFirst,
+                    kCGImageAlphaFirst)
+
+from .base import CaptureBackend
+
+
+def qimage_format(image_ref):
+    """根据 CGImage 的像素布局选择对应的 QImage 格式，无法直接对应时返回 None
+    
+    macOS 屏幕图像通常是 32 位小端 BGRA，与 Qt 在小端机器上的 (A)RGB32 内存布局相同，
+    所以不需要 rgbSwapped() 再复制一遍。
+    """
+    if CGImageGetBitsPerPixel(image_ref) != 32 or CGImageGetBitsPerComponent(image_ref) != 8:
+        return None
+    info = CGImageGetBitmapInfo(image_ref)
+    if info & kCGBitmapByteOrderMask != kCGBitmapByteOrder32Little:
+        return None
+    alpha = info & kCGBitmapAlphaInfoMask
+    if alpha == kCGImageAlphaNoneSkipFirst:
+        return QImage.Format.Format_RGB32
+    if alpha == kCGImageAlphaPremultipliedFirst:
+        return QImage.Format.Format_ARGB32_Premultiplied
+    if alpha == kCGImageAlphaFirst:
+        return QImage.Format.Format_ARGB32
+    return None
+
+
+class QuartzBackend(CaptureBackend):
+    """macOS Quartz 截图后端"""
+    
+    name = "quartz"
+    can_exclude_own_windows = True
+    
+    def display_for(self, screen):
+        """找到与 QScreen 位置相同的 CGDirectDisplayID"""
+        if screen is None:
+            return CGMainDisplayID()
+        geometry = screen.geometry()
+        error, display_ids, count = CGGetActiveDisplayList(32, None, None)
+        if error == 0:
+            for display_id in display_ids[:count]:
+                bounds = CGDisplayBounds(display_id)
+                if int(bounds.origin.x) == geometry.x() and int(bounds.origin.y) == geometry.y():
+                    return display_id
+        return CGMainDisplayID()
+    
+    def has_permission(self):
+        """macOS 10.15 以上直接查询权限状态，不需要截图"""
+        try:
+            from Quartz import CGPreflightScreenCaptureAccess
+        except ImportError:
+            return super().has_permission()
+        return bool(CGPreflightScreenCaptureAccess())
+    
+    def grab(self, screen=None):
+        image_ref = CGDisplayCreateImage(self.display_for(screen))
+        if image_ref is None:
+            raise RuntimeError("CGDisplayCreateImage 返回空图像，可能缺少屏幕录制权限")
+        return self.wrap_image(image_ref)
+    
+    def grab_excluding_own_windows(self, screen=None):
+        """截取本程序所有窗口下方的内容，不需要隐藏绘图层"""
+        # 窗口列表按从前到后排列，找到本进程最靠后的窗口
+        pid = os.getpid()
+        lowest_window = None
+        for window in CGWindowListCopyWindowInfo(kCGWindowListOptionOnScreenOnly, kCGNullWindowID):
+            if window[kCGWindowOwnerPID] == pid:
+                lowest_window = window[kCGWindowNumber]
+        if lowest_window is None:
+            return self.grab(screen)
+        
+        bounds = CGDisplayBounds(self.display_for(screen))
+        image_ref = CGWindowListCreateImage(bounds, kCGWindowListOptionOnScreenBelowWindow,
+                                            lowest_window, kCGWindowImageDefault)
+        if image_ref is None:
+            raise RuntimeError("CGWindowListCreateImage 返回空图像，可能缺少屏幕录制权限")
+        return self.wrap_image(image_ref)
+    
+    def grab_region(self, rect, screen):
+        # 只让 WindowServer 复制需要的区域，rect 使用显示器坐标（点）
+        display_rect = CGRectMake(rect.x(), rect.y(), rect.width(), rect.height())
+        image_ref = CGDisplayCreateImageForRect(self.display_for(screen), display_rect)
+        if image_ref is None:
+            raise RuntimeError("CGDisplayCreateImageForRect 返回空图像，可能缺少屏幕录制权限")
+        image = self.wrap_image(image_ref)
+        image.setDevicePixelRatio(screen.devicePixelRatio())
+        return image
+    
+    def wrap_image(self, image_ref):
+        """把 CGImage 的像素数据包装成 QImage，格式匹配时不做额外复制"""
+        width = CGImageGetWidth(image_ref)
+        height = CGImageGetHeight(image_ref)
+        bytes_per_row = CGImageGetBytesPerRow(image_ref)
+        
+        # CGDataProviderCopyData 是公开 API 中获取像素的唯一途径，这是唯一的一次复制
+        pixel_data = CGDataProviderCopyData(CGImageGetDataProvider(image_ref))
+        
+        image_format = qimage_format(image_ref)
+        if image_format is None:
+            # 少见的像素布局，退回到原来的转换方式
+            image = QImage(pixel_data, width, height, bytes_per_row, QImage.Format.Format_ARGB32)
+            return image.rgbSwapped()
+        
+        # QImage 直接引用 pixel_data 的内存，PyQt 会保持对 pixel_data 的引用
+        return QImage(pixel_data, width, height, bytes_per_row, image_format)
@@ -0,0 +1,52 @@
+import os
+
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QImage, QPainter, QColor, QLinearGradient
+
+from .base import CaptureBackend
+
+
+class SyntheticBackend(CaptureBackend):
+    """合成/文件图像后端，用于无显示器的测试和基准
+    
+    image_path（或环境变量 SCREEN_PEN_SYNTHETIC_IMAGE）指定时返回该图片，
+    否则返回一张渐变背景图。每次截图只改写左上角的一个小色块，
+    让连续帧内容不同，同时保持截图开销可以忽略不计。
+    """
+    
+    name = "synthetic"
+    frames_are_transient = True
+    
+    def __init__(self, width=1920, height=1080, image_path=None):
+        super().__init__()
+        image_path = image_path or os.environ.get("SCREEN_PEN_SYNTHETIC_IMAGE")
+        if image_path:
+            image = QImage(image_path)
+            if image.isNull():
+                raise RuntimeError(f"无法读取图片: {image_path}")
+            self.image = image.convertToFormat(QImage.Format.Format_RGB32)
+        else:
+            self.image = self.create_pattern(width, height)
+        self.frame_number = 0
+        
+    def create_pattern(self, width, height):
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        painter = QPainter(image)
+        gradient = QLinearGradient(0, 0, width, height)
+        gradient.setColorAt(0.0, QColor(40, 60, 90))
+        gradient.setColorAt(1.0, QColor(200, 210, 230))
+        painter.fillRect(image.rect(), gradient)
+        painter.end()
+        return image
+    
+    def grab(self, screen=None):
+        self.frame_number += 1
+        painter = QPainter(self.image)
+        hue = (self.frame_number * 7) % 360
+        painter.fillRect(QRect(0, 0, 16, 16), QColor.fromHsv(hue, 255, 255))
+        painter.end()
+        return self.image
+    
+    def grab_region(self, rect, screen):
+        # 合成图像按物理像素 1:1 对应逻辑坐标
+        return self.image.copy(rect)
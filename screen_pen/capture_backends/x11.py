@@ -0,0 +1,200 @@
+import ctypes
+import ctypes.util
+
+from PyQt6 import sip
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QImage
+
+from .base import CaptureBackend, device_rect
+
+ZPixmap = 2
+AllPlanes = 0xFFFFFFFF
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class XImage(ctypes.Structure):
+    # 只声明需要读取的字段，结构体由 Xlib 分配
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+def load_library(name):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise RuntimeError(f"找不到 lib{name}")
+    return ctypes.CDLL(path)
+
+
+class X11Backend(CaptureBackend):
+    """Linux X11 截图后端，优先使用 MIT-SHM 共享内存
+    
+    X 服务器把像素直接写入共享内存段，QImage 直接包装这段内存，不做任何复制。
+    共享内存段按截图尺寸复用（全屏和小区域各自一段），因此返回的图像只在下一次
+    同尺寸截图前有效。没有 MIT-SHM 扩展时退回到 XGetImage（会复制一次）。
+    """
+    
+    name = "x11"
+    frames_are_transient = True
+    
+    def __init__(self, display_name=None):
+        super().__init__()
+        self.xlib = load_library("X11")
+        self.xext = load_library("Xext")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.declare_functions()
+        
+        self.display = self.xlib.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise RuntimeError("无法连接到 X 服务器")
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        screen_number = self.xlib.XDefaultScreen(self.display)
+        self.visual = self.xlib.XDefaultVisual(self.display, screen_number)
+        self.depth = self.xlib.XDefaultDepth(self.display, screen_number)
+        self.use_shm = bool(self.xext.XShmQueryExtension(self.display))
+        
+        # (宽, 高) -> (XImage 指针, XShmSegmentInfo)，最多保留 max_segments 段
+        self.segments = {}
+        self.max_segments = 2
+        
+    def declare_functions(self):
+        xlib, xext, libc = self.xlib, self.xext, self.libc
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xlib.XGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                   ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]
+        xlib.XGetImage.restype = ctypes.POINTER(XImage)
+        
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo),
+                                         ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        
+    def grab(self, screen=None):
+        screen = screen or QApplication.primaryScreen()
+        rect = device_rect(screen.geometry(), screen.devicePixelRatio())
+        return self.grab_rect(rect.x(), rect.y(), rect.width(), rect.height())
+    
+    def grab_region(self, rect, screen):
+        # X 根窗口使用物理像素坐标
+        dpr = screen.devicePixelRatio()
+        region = device_rect(rect.translated(screen.geometry().topLeft()), dpr)
+        image = self.grab_rect(region.x(), region.y(), region.width(), region.height())
+        image.setDevicePixelRatio(dpr)
+        return image
+    
+    def grab_rect(self, x, y, width, height):
+        if self.use_shm:
+            return self.grab_shm(x, y, width, height)
+        return self.grab_copy(x, y, width, height)
+    
+    def grab_shm(self, x, y, width, height):
+        segment = self.segments.get((width, height))
+        if segment is None:
+            if len(self.segments) >= self.max_segments:
+                self.release_segment(next(iter(self.segments)))
+            segment = self.create_segment(width, height)
+        image, info = segment
+        if not self.xext.XShmGetImage(self.display, self.root, image, x, y, AllPlanes):
+            raise RuntimeError("XShmGetImage 失败")
+        return self.wrap(image.contents)
+    
+    def create_segment(self, width, height):
+        info = XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, ZPixmap,
+                                          None, ctypes.byref(info), width, height)
+        if not image:
+            raise RuntimeError("XShmCreateImage 失败")
+        size = image.contents.bytes_per_line * image.contents.height
+        info.shmid = self.libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if info.shmid < 0:
+            self.xlib.XFree(image)
+            raise OSError(ctypes.get_errno(), "shmget 失败")
+        info.shmaddr = self.libc.shmat(info.shmid, None, 0)
+        image.contents.data = info.shmaddr
+        info.readOnly = 0
+        self.xext.XShmAttach(self.display, ctypes.byref(info))
+        self.xlib.XSync(self.display, 0)
+        # 两端都已连接后标记删除，进程退出时内核会自动回收
+        self.libc.shmctl(info.shmid, IPC_RMID, None)
+        
+        self.segments[(width, height)] = (image, info)
+        return image, info
+        
+    def release_segment(self, size):
+        image, info = self.segments.pop(size)
+        self.xext.XShmDetach(self.display, ctypes.byref(info))
+        self.xlib.XSync(self.display, 0)
+        self.libc.shmdt(info.shmaddr)
+        self.xlib.XFree(image)
+        
+    def grab_copy(self, x, y, width, height):
+        image = self.xlib.XGetImage(self.display, self.root, x, y, width, height, AllPlanes, ZPixmap)
+        if not image:
+            raise RuntimeError("XGetImage 失败")
+        try:
+            # XGetImage 的缓冲区由 Xlib 管理，这里必须复制一份
+            return self.wrap(image.contents).copy()
+        finally:
+            self.xlib.XFree(image.contents.data)
+            self.xlib.XFree(image)
+            
+    def wrap(self, ximage):
+        """用 X 图像的内存直接构造 QImage"""
+        if ximage.bits_per_pixel != 32:
+            raise RuntimeError(f"不支持的像素格式: {ximage.bits_per_pixel} bpp")
+        image_format = QImage.Format.Format_ARGB32 if ximage.depth == 32 else QImage.Format.Format_RGB32
+        return QImage(sip.voidptr(ximage.data), ximage.width, ximage.height,
+                      ximage.bytes_per_line, image_format)
+    
+    def close(self):
+        for size in list(self.segments):
+            self.release_segment(size)
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
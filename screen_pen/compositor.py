@@ -0,0 +1,22 @@
+from PyQt6.QtGui import QImage, QPainter
+
+
+def composite_tiles(background, tiles, device_pixel_ratio=1.0):
+    """把墨迹瓦片按原始分辨率叠加到截图上，返回新的图像
+    
+    tiles 是 [(逻辑坐标左上角, 瓦片 QImage)]，只包含已分配的瓦片，
+    所以合成开销与墨迹数量有关，而与屏幕大小无关。可以在工作线程中调用。
+    """
+    if background.format() in (QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32_Premultiplied):
+        # 隐式共享，开始绘制时才复制一次像素
+        image = QImage(background)
+    else:
+        image = background.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(device_pixel_ratio)
+    
+    if tiles:
+        painter = QPainter(image)
+        for position, tile in tiles:
+            painter.drawImage(position, tile)
+        painter.end()
+    return image
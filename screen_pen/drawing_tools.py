@@ -1,45 +1,188 @@
-from PyQt6.QtCore import QPoint, QRect, QLine
-from PyQt6.QtGui import QPainter
+from array import array
+
+from PyQt6.QtCore import Qt, QPoint, QRect, QRectF
+from PyQt6.QtGui import QPainter, QPen
+
+from .stroke import Stroke, ShapeRecord, inflate_rect
+
+# 椭圆命中测试时轮廓折线的段数
+ELLIPSE_SEGMENTS = 64
+# 数位板压力为 0 时的线宽占设置线宽的比例
+MIN_PRESSURE_WIDTH = 0.2
+
 
 class DrawingTool:
+    """一次拖动中的交互状态
+    
+    每次按下鼠标都创建一个新的工具对象，松开后 finish() 返回不可变的几何记录，
+    工具对象随即丢弃，不同笔迹之间不共享任何状态。
+    """
+    
+    __slots__ = ("start_point", "end_point", "previous_start", "previous_end")
+    
     def __init__(self):
         self.start_point = QPoint()
         self.end_point = QPoint()
+        # 上一次绘制时的端点，用于计算预览图形的脏区域
+        self.previous_start = QPoint()
+        self.previous_end = QPoint()
         
-    def start(self, point):
+    def start(self, point, t=0.0, width=None):
         self.start_point = point
         self.end_point = point
+        self.previous_start = point
+        self.previous_end = point
         
     def update(self, start_point, end_point):
+        self.previous_start = self.start_point
+        self.previous_end = self.end_point
         self.start_point = start_point
         self.end_point = end_point
         
     def draw(self, painter):
+        self.draw_shape(painter, self.start_point, self.end_point)
+        
+    @staticmethod
+    def draw_shape(painter, start_point, end_point):
         pass
+        
+    @staticmethod
+    def outline(x0, y0, x1, y1):
+        import numpy as np
+        return np.array([[x0, y0], [x1, y1]], dtype=np.float64)
+        
+    def finish(self):
+        """返回完成后的几何记录"""
+        start, end = self.start_point, self.end_point
+        return ShapeRecord(type(self), start.x(), start.y(), end.x(), end.y())
+        
+    def bounding_rect(self, pen_width):
+        """返回当前图形覆盖的区域，按线宽向外扩展"""
+        return inflate_rect(QRect(self.start_point, self.end_point).normalized(), pen_width)
+        
+    def damage_rect(self, pen_width):
+        """返回本次更新需要重绘的区域：同时覆盖旧图形和新图形"""
+        previous = inflate_rect(QRect(self.previous_start, self.previous_end).normalized(), pen_width)
+        return previous.united(self.bounding_rect(pen_width))
 
 
 class FreeDraw(DrawingTool):
+    """自由笔迹：点追加到 Stroke 的数组中，每批只绘制新增的一段"""
+    
+    __slots__ = ("stroke", "drawn", "segment_rect")
+    
+    def __init__(self):
+        super().__init__()
+        self.stroke = Stroke(type(self))
+        # 已经画到画布上的点数，下一段折线从最后一个已画的点开始，保证笔迹连续
+        self.drawn = 0
+        self.segment_rect = QRect()  # 新线段的包围盒，一批点只计算一次
+        
+    def start(self, point, t=0.0, width=None):
+        """width 不为 None 时（数位板）笔迹为每个点保存线宽"""
+        if width is not None:
+            self.stroke.widths = array("f")
+        self.stroke.append(point.x(), point.y(), t, width)
+        self.segment_rect = QRectF(point.x(), point.y(), 0, 0).toAlignedRect()
+        
+    def extend(self, samples):
+        """接续上一次的终点追加一批 (x, y, t) 或 (x, y, t, 线宽) 采样点"""
+        stroke = self.stroke
+        self.drawn = len(stroke) - 1
+        # 一批通常只有几个点，直接在 Python 中求包围盒比调用 NumPy 更快
+        xs = [stroke.xy[-2]] + [sample[0] for sample in samples]
+        ys = [stroke.xy[-1]] + [sample[1] for sample in samples]
+        stroke.extend(samples)
+        left, top = min(xs), min(ys)
+        self.segment_rect = QRectF(left, top, max(xs) - left, max(ys) - top).toAlignedRect()
+        
     def draw(self, painter):
-        painter.drawLine(self.start_point, self.end_point)
+        self.stroke.draw(painter, self.drawn)
+        
+    def finish(self):
+        return self.stroke
+        
+    def bounding_rect(self, pen_width):
+        return inflate_rect(self.segment_rect, pen_width)
+        
+    def damage_rect(self, pen_width):
+        # 自由绘制的旧线段已经写入画布，只需重绘新线段
+        return self.bounding_rect(pen_width)
 
 
 class Line(DrawingTool):
-    def draw(self, painter):
-        painter.drawLine(self.start_point, self.end_point)
+    __slots__ = ()
+    
+    @staticmethod
+    def draw_shape(painter, start_point, end_point):
+        painter.drawLine(start_point, end_point)
 
 
 class Rectangle(DrawingTool):
-    def draw(self, painter):
-        rect = QRect(self.start_point, self.end_point).normalized()
+    __slots__ = ()
+    
+    @staticmethod
+    def draw_shape(painter, start_point, end_point):
+        rect = QRect(start_point, end_point).normalized()
         painter.drawRect(rect)
+        
+    @staticmethod
+    def outline(x0, y0, x1, y1):
+        import numpy as np
+        return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]], dtype=np.float64)
 
 
 class Ellipse(DrawingTool):
-    def draw(self, painter):
-        rect = QRect(self.start_point, self.end_point).normalized()
+    __slots__ = ()
+    
+    @staticmethod
+    def draw_shape(painter, start_point, end_point):
+        rect = QRect(start_point, end_point).normalized()
         painter.drawEllipse(rect)
+        
+    @staticmethod
+    def outline(x0, y0, x1, y1):
+        import numpy as np
+        angles = np.linspace(0.0, 2 * np.pi, ELLIPSE_SEGMENTS + 1)
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        rx, ry = abs(x1 - x0) / 2, abs(y1 - y0) / 2
+        return np.column_stack((cx + rx * np.cos(angles), cy + ry * np.sin(angles)))
 
 
 class Eraser(FreeDraw):
     # 橡皮擦实际上就是使用透明色的画笔
-    pass
+    __slots__ = ()
+
+
+class LaserPointer(FreeDraw):
+    """教鞭：笔迹不写入画布，绘图层每次重绘时画出整条笔迹，松开后交给 LaserLayer 淡出"""
+    
+    __slots__ = ()
+    
+    def draw(self, painter):
+        self.stroke.draw(painter)
+
+
+class ObjectEraser(FreeDraw):
+    """对象橡皮：只记录拖动路径，删除路径碰到的整条笔迹，自身不画到画布上"""
+    
+    __slots__ = ()
+    
+    def draw(self, painter):
+        pass
+
+
+def pressure_width(pen_width, pressure):
+    """数位板压力 (0~1) 对应的线宽，最大为设置的线宽"""
+    pressure = min(1.0, max(0.0, pressure))
+    return pen_width * (MIN_PRESSURE_WIDTH + (1.0 - MIN_PRESSURE_WIDTH) * pressure)
+
+
+def apply_pen(painter, color, width, eraser=False):
+    """按工具类型设置画笔：橡皮擦使用清除模式，其余工具正常叠加"""
+    if eraser:
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
+        painter.setPen(QPen(Qt.GlobalColor.transparent, width, Qt.PenStyle.SolidLine))
+    else:
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+        painter.setPen(QPen(color, width, Qt.PenStyle.SolidLine))
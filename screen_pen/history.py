@@ -0,0 +1,192 @@
+from collections import deque
+
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QImage
+
+# 默认历史记录内存上限（MB）
+DEFAULT_BUDGET_MB = 256
+
+
+class HistoryStep:
+    """一步操作：只保存被触及瓦片的像素，以及增删的场景对象
+    
+    tiles 中保存的是“另一侧”的像素：撤销前保存操作前的像素，
+    撤销后换成操作后的像素供重做使用，因此每步只占一份瓦片内存。
+    QImage 是隐式共享的，保存时并不复制像素，直到画布第一次改写该瓦片才真正复制。
+    未分配的瓦片保存为 None。
+    
+    owner 是拥有 canvas 和 scene 的绘图层（每个屏幕一个），一步操作可以涉及多个绘图层。
+    """
+    
+    def __init__(self):
+        self.tiles = {}
+        self.added = []
+        self.removed = []
+        self.nbytes = 0
+        
+    def is_empty(self):
+        return not (self.tiles or self.added or self.removed)
+        
+    def save_tile(self, owner, key):
+        if (owner, key) in self.tiles:
+            return
+        image = owner.canvas.tile(key)
+        if image is not None:
+            image = QImage(image)
+            self.nbytes += image.sizeInBytes()
+        self.tiles[(owner, key)] = image
+        
+    def swap_tiles(self):
+        """把保存的瓦片写回画布，同时保存画布上当前的瓦片，返回各绘图层的改动区域"""
+        changed = {}
+        nbytes = 0
+        for (owner, key), image in self.tiles.items():
+            current = owner.canvas.tile(key)
+            owner.canvas.set_tile(key, image)
+            self.tiles[(owner, key)] = current
+            if current is not None:
+                nbytes += current.sizeInBytes()
+            changed[owner] = changed.get(owner, QRect()).united(owner.canvas.tile_rect(key))
+        self.nbytes = nbytes
+        return changed
+    
+    def forget(self, owner):
+        """丢弃与某个绘图层有关的记录"""
+        for owner_key in [owner_key for owner_key in self.tiles if owner_key[0] is owner]:
+            image = self.tiles.pop(owner_key)
+            if image is not None:
+                self.nbytes -= image.sizeInBytes()
+        self.added = [(o, item) for o, item in self.added if o is not owner]
+        self.removed = [(o, item) for o, item in self.removed if o is not owner]
+
+
+class History:
+    """基于瓦片快照的撤销/重做记录，总内存受预算限制"""
+    
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.current = None
+        self.nbytes = 0
+        # 场景变化的监听者：listener(added, removed)，参数是 (绘图层, 场景对象) 列表
+        self.listeners = []
+        
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+        
+    def notify(self, added, removed):
+        for listener in self.listeners:
+            listener(added, removed)
+        
+    def set_budget(self, budget_mb):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.enforce_budget()
+        
+    def begin(self):
+        """开始记录一步操作"""
+        self.current = HistoryStep()
+        
+    def touch(self, owner, rect):
+        """写时复制：在第一次改动某个瓦片之前保存它的原始像素"""
+        if self.current is None:
+            return
+        for key in owner.canvas.keys_in(rect):
+            self.current.save_tile(owner, key)
+            
+    def touch_allocated(self, owner):
+        """保存绘图层上所有已分配的瓦片（清屏前调用）"""
+        if self.current is None:
+            return
+        for key in list(owner.canvas.tiles):
+            self.current.save_tile(owner, key)
+            
+    def commit(self, added=(), removed=()):
+        """结束当前操作并放入撤销栈，新的操作会清空重做栈
+        
+        added 和 removed 是 (绘图层, 场景对象) 列表。
+        """
+        step = self.current
+        self.current = None
+        if step is None:
+            return
+        step.added = list(added)
+        step.removed = list(removed)
+        if step.is_empty():
+            return
+        
+        self.nbytes -= sum(redo.nbytes for redo in self.redo_steps)
+        self.redo_steps = []
+        self.undo_steps.append(step)
+        self.nbytes += step.nbytes
+        self.enforce_budget()
+        self.notify(step.added, step.removed)
+        
+    def enforce_budget(self):
+        """超出预算时丢弃最旧的历史，至少保留最近一步"""
+        while self.nbytes > self.budget_bytes and self.redo_steps:
+            self.nbytes -= self.redo_steps.pop(0).nbytes
+        while self.nbytes > self.budget_bytes and len(self.undo_steps) > 1:
+            self.nbytes -= self.undo_steps.popleft().nbytes
+            
+    def forget(self, owner):
+        """绘图层被销毁或重建时丢弃它的历史"""
+        if self.current is not None:
+            self.current.forget(owner)
+        for steps in (self.undo_steps, self.redo_steps):
+            kept = []
+            for step in steps:
+                self.nbytes -= step.nbytes
+                step.forget(owner)
+                if not step.is_empty():
+                    self.nbytes += step.nbytes
+                    kept.append(step)
+            steps.clear()
+            steps.extend(kept)
+            
+    def clear(self):
+        """丢弃全部撤销和重做记录（例如翻页之后）"""
+        self.undo_steps.clear()
+        self.redo_steps = []
+        self.current = None
+        self.nbytes = 0
+        
+    def can_undo(self):
+        return bool(self.undo_steps)
+    
+    def can_redo(self):
+        return bool(self.redo_steps)
+    
+    def undo(self):
+        """撤销一步，返回 {绘图层: 需要重绘的区域}"""
+        if not self.undo_steps:
+            return {}
+        step = self.undo_steps.pop()
+        for owner, item in step.added:
+            owner.scene.remove(item)
+        for owner, item in step.removed:
+            owner.scene.restore(item)
+        changed = self.swap(step)
+        self.redo_steps.append(step)
+        self.notify(step.removed, step.added)
+        return changed
+    
+    def redo(self):
+        """重做一步，返回 {绘图层: 需要重绘的区域}"""
+        if not self.redo_steps:
+            return {}
+        step = self.redo_steps.pop()
+        for owner, item in step.removed:
+            owner.scene.remove(item)
+        for owner, item in step.added:
+            owner.scene.restore(item)
+        changed = self.swap(step)
+        self.undo_steps.append(step)
+        self.notify(step.added, step.removed)
+        return changed
+    
+    def swap(self, step):
+        self.nbytes -= step.nbytes
+        changed = step.swap_tiles()
+        self.nbytes += step.nbytes
+        return changed
@@ -0,0 +1,206 @@
+"""可选的性能监控：输入到绘制的延迟、重绘耗时、重绘面积和截图耗时
+
+默认关闭，设置环境变量 SCREEN_PEN_METRICS=1 或在工具面板上打开。
+关闭时热路径上只有一次 `metrics.enabled` 判断。
+所有数据保存在固定大小的直方图中，长时间运行内存也不会增长。
+"""
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QLabel, QApplication
+
+
+class Histogram:
+    """对数分桶的直方图，分位数按桶的上界估算"""
+    
+    def __init__(self, name, unit, low, high, buckets=64):
+        self.name = name
+        self.unit = unit
+        ratio = (high / low) ** (1.0 / (buckets - 1))
+        self.bounds = [low * ratio ** i for i in range(buckets)]
+        self.counts = [0] * (buckets + 1)  # 最后一个桶保存超过上限的值
+        self.reset()
+        
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        
+    def record(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+            
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                upper = self.bounds[index] if index < len(self.bounds) else self.maximum
+                return min(upper, self.maximum)
+        return self.maximum
+        
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+        
+    def to_dict(self):
+        return {
+            "unit": self.unit,
+            "count": self.count,
+            "mean": round(self.mean(), 3),
+            "min": round(self.minimum, 3) if self.count else 0.0,
+            "max": round(self.maximum, 3),
+            "p50": round(self.percentile(0.50), 3),
+            "p90": round(self.percentile(0.90), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "buckets": [
+                {"le": round(bound, 4), "count": count}
+                for bound, count in zip(self.bounds + [math.inf], self.counts) if count
+            ],
+        }
+
+
+class Instrumentation:
+    """收集各项指标
+    
+    输入事件先进入 pending；它的点被画到画布上（或图形预览需要重绘）之后移到 drawn；
+    下一次 paintEvent 结束时，drawn 中每个事件的等待时间就是输入到屏幕的延迟。
+    """
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {
+            "input_to_paint_ms": Histogram("input_to_paint_ms", "ms", 0.05, 1000),
+            "paint_ms": Histogram("paint_ms", "ms", 0.01, 1000),
+            "paint_pixels": Histogram("paint_pixels", "px", 1, 64 * 1024 * 1024),
+            "capture_ms": Histogram("capture_ms", "ms", 0.05, 5000),
+        }
+        self.pending_inputs = []
+        self.drawn_inputs = []
+        self.frame_times = deque(maxlen=240)
+        self.started_at = time.perf_counter()
+        
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.pending_inputs = []
+        self.drawn_inputs = []
+        
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.frame_times.clear()
+        self.started_at = time.perf_counter()
+        
+    def input_received(self):
+        self.pending_inputs.append(time.perf_counter())
+        
+    def inputs_drawn(self):
+        """缓冲区中的输入已经画到画布上，等待下一次重绘显示"""
+        if self.pending_inputs:
+            self.drawn_inputs.extend(self.pending_inputs)
+            self.pending_inputs = []
+            
+    def paint_finished(self, started, pixels):
+        now = time.perf_counter()
+        self.histograms["paint_ms"].record((now - started) * 1000)
+        self.histograms["paint_pixels"].record(max(1, pixels))
+        self.frame_times.append(now)
+        if self.drawn_inputs:
+            latency = self.histograms["input_to_paint_ms"]
+            for received in self.drawn_inputs:
+                latency.record((now - received) * 1000)
+            self.drawn_inputs = []
+            
+    def capture_finished(self, elapsed_ms):
+        self.histograms["capture_ms"].record(elapsed_ms)
+        
+    def fps(self, window=1.0):
+        """最近 window 秒内的重绘帧率"""
+        now = time.perf_counter()
+        frames = [t for t in self.frame_times if now - t <= window]
+        if len(frames) < 2:
+            return 0.0
+        return (len(frames) - 1) / (frames[-1] - frames[0]) if frames[-1] > frames[0] else 0.0
+        
+    def summary(self):
+        latency = self.histograms["input_to_paint_ms"]
+        paint = self.histograms["paint_ms"]
+        return (f"输入→屏幕 p50 {latency.percentile(0.5):.1f} ms  p99 {latency.percentile(0.99):.1f} ms\n"
+                f"重绘 p50 {paint.percentile(0.5):.2f} ms  p99 {paint.percentile(0.99):.2f} ms  "
+                f"{self.fps():.0f} fps")
+                
+    def to_dict(self):
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_s": round(time.perf_counter() - self.started_at, 3),
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+        
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+# 全局实例：绘图层、截图后端共用
+metrics = Instrumentation(enabled=os.environ.get("SCREEN_PEN_METRICS", "") not in ("", "0"))
+
+
+class MetricsHud(QLabel):
+    """显示延迟和帧率的小窗口
+    
+    使用独立的顶层窗口，而不是画在绘图层上，刷新 HUD 不会产生绘图层的重绘，不影响统计结果。
+    """
+    
+    def __init__(self, instrumentation=None, interval_ms=500):
+        super().__init__()
+        self.instrumentation = instrumentation or metrics
+        self.setWindowFlags(
+            Qt.WindowType.FramelessWindowHint |
+            Qt.WindowType.WindowStaysOnTopHint |
+            Qt.WindowType.Tool |
+            Qt.WindowType.WindowTransparentForInput
+        )
+        self.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
+        self.setStyleSheet("""
+            QLabel {
+                background-color: rgba(0, 0, 0, 170);
+                color: #7CFC00;
+                font-family: Menlo, monospace;
+                font-size: 11px;
+                padding: 4px;
+            }
+        """)
+        # 只在显示时刷新
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.refresh)
+        
+    def refresh(self):
+        self.setText(self.instrumentation.summary())
+        self.adjustSize()
+        
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+        # 放在主屏幕左上角
+        geometry = QApplication.primaryScreen().availableGeometry()
+        self.move(geometry.x() + 10, geometry.y() + 10)
+        
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
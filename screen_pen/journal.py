@@ -0,0 +1,461 @@
+"""笔迹日志：把场景的每一次变化追加到一个紧凑的二进制文件中
+
+文件格式（小端）：
+    文件头  "SPJ1" | 版本 u16 | 保留 u16 | 会话开始时间 f64（Unix 时间）
+    记录头  类型 u8 | 时间 f64（相对会话开始的秒数）| 负载长度 u32
+    ADD     日志 id u32 | 屏幕 u8 | 工具 u8 | 颜色 ARGB u32 | 线宽 u16 | 点数 n u32
+            | 坐标 int16[2n]（x, y 交错）| 每个点相对笔迹开始的时间 float32[n]
+            | 可选：每个点的线宽 float32[n]（数位板笔迹）
+    REMOVE / RESTORE
+            个数 n u32 | 日志 id u32[n]
+    PAGE    页码 u32（从 0 开始），之后的记录属于这一页
+
+线宽放在记录末尾，旧版本读取时按负载长度跳过，因此不需要改变版本号。
+撤销和重做被记录为 REMOVE / RESTORE，因此按顺序重放日志可以得到与原会话完全相同的场景。
+最后一条记录如果因为程序崩溃只写了一半，加载时会被忽略。
+"""
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+from PyQt6.QtGui import QColor
+
+from .drawing_tools import FreeDraw, Line, Rectangle, Ellipse, Eraser, apply_pen
+from .scene import SceneItem
+from .stroke import Stroke, ShapeRecord
+
+MAGIC = b"SPJ1"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHd")
+RECORD_HEADER = struct.Struct("<BdI")
+ADD_HEADER = struct.Struct("<IBBIHI")
+COUNT = struct.Struct("<I")
+PAGE_NUMBER = struct.Struct("<I")
+
+ADD = 1
+REMOVE = 2
+RESTORE = 3
+PAGE = 4
+
+# 工具编号写入文件，只能追加，不能改变已有编号
+SHAPE_TYPES = [FreeDraw, Line, Rectangle, Ellipse, Eraser]
+
+DEFAULT_JOURNAL_DIR = os.path.expanduser("~/.screen_pen/sessions")
+
+
+class StrokeRecord:
+    """日志中的一条笔迹，坐标和时间保存在紧凑数组中"""
+    
+    __slots__ = ("journal_id", "time", "screen", "tool", "argb", "width", "xy", "times", "widths", "page")
+    
+    def __init__(self, journal_id, time, screen, tool, argb, width, xy, times, widths=None, page=0):
+        self.journal_id = journal_id
+        self.time = time
+        self.screen = screen
+        self.tool = tool
+        self.argb = argb
+        self.width = width
+        self.xy = xy          # array('h')，x, y 交错
+        self.times = times    # array('f')，相对笔迹开始的秒数
+        self.widths = widths  # array('f')，数位板笔迹每个点的线宽，没有时为 None
+        self.page = page
+        
+    @property
+    def duration(self):
+        return self.times[-1] if self.times else 0.0
+        
+    @property
+    def is_freehand(self):
+        return issubclass(SHAPE_TYPES[self.tool], FreeDraw)
+        
+    def create_shape(self, first=0, last=None):
+        """由数组直接创建几何记录；自由笔迹可以只取 [first, last) 之间的点"""
+        import numpy as np
+        shape_type = SHAPE_TYPES[self.tool]
+        if self.is_freehand:
+            xy = np.frombuffer(self.xy, dtype=np.int16)
+            times = np.frombuffer(self.times, dtype=np.float32)
+            widths = None if self.widths is None else np.frombuffer(self.widths, dtype=np.float32)[first:last]
+            end = None if last is None else last * 2
+            return Stroke.from_arrays(shape_type, xy[first * 2:end], times[first:last], widths)
+        return ShapeRecord(shape_type, self.xy[0], self.xy[1], self.xy[-2], self.xy[-1])
+        
+    def create_item(self):
+        """创建新的场景对象，它在当前会话的日志中会得到新的 id"""
+        shape = self.create_shape()
+        times = shape.times if self.is_freehand else self.times
+        return SceneItem(shape, QColor.fromRgba(self.argb), self.width,
+                         eraser=SHAPE_TYPES[self.tool] is Eraser, times=times)
+
+
+def encode_stroke(journal_id, timestamp, screen, item):
+    """把场景对象编码为一条 ADD 记录，坐标整体取整并截断到 int16"""
+    import numpy as np
+    points = item.shape.points()
+    xy = np.clip(np.rint(points), -32768, 32767).astype("<i2")
+    count = len(points)
+    
+    times = item.times if isinstance(item.times, array) else array("f", item.times or [])
+    # 时间戳缺失或数量不一致时补齐，保证每个点都有时间
+    if len(times) != count:
+        times = times[:count]
+        times.extend([times[-1] if times else 0.0] * (count - len(times)))
+        
+    payload = ADD_HEADER.pack(journal_id, screen, SHAPE_TYPES.index(item.shape.tool),
+                              item.color.rgba(), item.width, count)
+    payload += xy.tobytes() + times.tobytes()
+    widths = getattr(item.shape, "widths", None)
+    if widths is not None:
+        payload += widths.tobytes()
+    return RECORD_HEADER.pack(ADD, timestamp, len(payload)) + payload
+
+
+def encode_ids(record_type, timestamp, journal_ids):
+    payload = COUNT.pack(len(journal_ids)) + array("I", journal_ids).tobytes()
+    return RECORD_HEADER.pack(record_type, timestamp, len(payload)) + payload
+
+
+def encode_page(timestamp, page):
+    return RECORD_HEADER.pack(PAGE, timestamp, PAGE_NUMBER.size) + PAGE_NUMBER.pack(page)
+
+
+class JournalWriter:
+    """会话日志的增量写入器
+    
+    GUI 线程只负责把变化编码成字节串放进队列；后台线程写入文件，每条记录都立即交给操作系统，
+    程序没有经过 close() 就退出时记录也不会丢；只有 fsync 最多每 fsync_interval 秒一次。
+    没有写入任何记录的会话在 close() 时删除，不留下空文件。
+    """
+    
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.session_start = time.perf_counter()
+        self.next_id = 0
+        self.records_written = 0
+        self.fsync_count = 0
+        self.error = None
+        self.queue = queue.Queue()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = self.create_file(path)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, time.time()))
+        self.file.flush()
+        self.worker = threading.Thread(target=self.write_records, name="screen-pen-journal", daemon=True)
+        self.worker.start()
+        
+    def create_file(self, path):
+        """创建新的日志文件，同名文件已存在时加上序号，不覆盖之前的会话"""
+        base, extension = os.path.splitext(path)
+        number = 0
+        while True:
+            try:
+                return open(path, "xb")
+            except FileExistsError:
+                number += 1
+                path = f"{base}-{number}{extension}"
+                self.path = path
+                
+    def now(self):
+        return time.perf_counter() - self.session_start
+        
+    def record_added(self, screen, item):
+        """记录新加入场景的对象；之前记录过的对象（重做、撤销清屏）只记录其 id"""
+        if item.journal_id is not None:
+            self.queue.put(encode_ids(RESTORE, self.now(), [item.journal_id]))
+            return
+        self.next_id += 1
+        item.journal_id = self.next_id
+        # 笔迹从按下鼠标开始计时，重放时才能还原绘制过程
+        if item.started_at is not None:
+            timestamp = item.started_at - self.session_start
+        else:
+            timestamp = self.now()
+        self.queue.put(encode_stroke(item.journal_id, max(0.0, timestamp), screen, item))
+        
+    def record_removed(self, items):
+        journal_ids = [item.journal_id for item in items if item.journal_id is not None]
+        if journal_ids:
+            self.queue.put(encode_ids(REMOVE, self.now(), journal_ids))
+            
+    def record_page(self, page):
+        """记录翻页，之后的记录都属于这一页"""
+        self.queue.put(encode_page(self.now(), page))
+        
+    def write_records(self):
+        last_sync = time.perf_counter()
+        dirty = False
+        while True:
+            try:
+                data = self.queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                data = b""
+            if data is None:
+                break
+            try:
+                if data:
+                    self.file.write(data)
+                    self.file.flush()
+                    self.records_written += 1
+                    dirty = True
+                if dirty and time.perf_counter() - last_sync >= self.fsync_interval:
+                    self.sync()
+                    last_sync = time.perf_counter()
+                    dirty = False
+            except OSError as e:
+                self.error = str(e)
+                print(f"写入笔迹日志失败: {e}")
+                
+        try:
+            self.sync()
+        except OSError as e:
+            print(f"写入笔迹日志失败: {e}")
+            
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.fsync_count += 1
+        
+    def close(self):
+        """写完队列中的记录后关闭文件，没有任何记录时删除文件"""
+        if self.worker is None:
+            return
+        self.queue.put(None)
+        self.worker.join()
+        self.worker = None
+        self.file.close()
+        if self.records_written == 0 and self.error is None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"删除空的笔迹日志失败: {e}")
+
+
+class Journal:
+    """加载后的日志：按顺序排列的操作，以及由此得到的最终场景"""
+    
+    def __init__(self, path, session_time, operations):
+        self.path = path
+        self.session_time = session_time
+        self.operations = operations  # [(类型, 时间, StrokeRecord、id 列表或页码)]
+        
+    def __len__(self):
+        return len(self.operations)
+        
+    @property
+    def point_count(self):
+        return sum(len(data.times) for record_type, _, data in self.operations if record_type == ADD)
+        
+    @property
+    def page_count(self):
+        return 1 + max((data for record_type, _, data in self.operations if record_type == PAGE), default=0)
+        
+    def final_strokes(self):
+        """依次应用所有操作，返回最后仍然存在的笔迹（按绘制顺序）"""
+        strokes = {}
+        alive = {}
+        for record_type, _, data in self.operations:
+            if record_type == ADD:
+                strokes[data.journal_id] = data
+                alive[data.journal_id] = True
+            elif record_type == REMOVE:
+                for journal_id in data:
+                    alive.pop(journal_id, None)
+            elif record_type == RESTORE:
+                for journal_id in data:
+                    if journal_id in strokes:
+                        alive[journal_id] = True
+        # 恢复的对象保持原来的绘制顺序
+        return [strokes[journal_id] for journal_id in sorted(alive)]
+
+
+def load_journal(path):
+    """通过内存映射读取日志文件，坐标和时间直接按块复制到数组中"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < FILE_HEADER.size:
+            raise ValueError(f"{path} 不是笔迹日志")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, _, session_time = FILE_HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version > VERSION:
+                raise ValueError(f"{path} 不是笔迹日志或版本过新")
+                
+            operations = []
+            page = 0
+            offset = FILE_HEADER.size
+            while offset + RECORD_HEADER.size <= size:
+                record_type, timestamp, length = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                end = start + length
+                if end > size:
+                    break  # 未写完的最后一条记录
+                    
+                if record_type == ADD:
+                    journal_id, screen, tool, argb, width, count = ADD_HEADER.unpack_from(data, start)
+                    cursor = start + ADD_HEADER.size
+                    xy = array("h")
+                    xy.frombytes(data[cursor:cursor + count * 4])
+                    cursor += count * 4
+                    times = array("f")
+                    times.frombytes(data[cursor:cursor + count * 4])
+                    cursor += count * 4
+                    widths = None
+                    if end - cursor >= count * 4:
+                        widths = array("f")
+                        widths.frombytes(data[cursor:cursor + count * 4])
+                    if count and tool < len(SHAPE_TYPES):
+                        operations.append((ADD, timestamp, StrokeRecord(
+                            journal_id, timestamp, screen, tool, argb, width, xy, times, widths, page)))
+                elif record_type in (REMOVE, RESTORE):
+                    count, = COUNT.unpack_from(data, start)
+                    journal_ids = array("I")
+                    journal_ids.frombytes(data[start + COUNT.size:start + COUNT.size + count * 4])
+                    operations.append((record_type, timestamp, list(journal_ids)))
+                elif record_type == PAGE:
+                    page, = PAGE_NUMBER.unpack_from(data, start)
+                    operations.append((PAGE, timestamp, page))
+                # 未知类型的记录按长度跳过
+                offset = end
+                
+    return Journal(path, session_time, operations)
+
+
+class JournalPlayer(QObject):
+    """按日志中的时间重放会话，speed 为播放倍速
+    
+    自由笔迹按点的时间逐段画出，其他图形在完成时出现；删除和恢复在对应的时间执行。
+    日志中的第 n 页重放到开始重放时所在页之后的第 n 页，不存在时新建。
+    重放产生的每一步都会进入撤销历史，和手动绘制一样。
+    """
+    
+    finished = pyqtSignal()
+    
+    def __init__(self, app, journal, speed=1.0, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.operations = sorted(journal.operations, key=lambda operation: operation[1])
+        self.speed = max(speed, 0.01)
+        self.index = 0
+        self.delay = 0.0       # 前一条笔迹还没画完时，后续操作顺延的时间
+        self.items = {}        # 日志 id -> (绘图层, 场景对象)
+        self.active = None     # 正在绘制的笔迹：(记录, 绘图层, 开始时间, 已画的点数)
+        self.started_at = None
+        self.first_page = app.pages.current
+        
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.advance)
+        
+    def is_playing(self):
+        return self.timer.isActive()
+        
+    def start(self):
+        if self.operations:
+            self.started_at = time.perf_counter()
+            # 从日志的第一条操作开始计时
+            self.delay = -self.operations[0][1]
+            self.timer.start(16)
+            self.advance()
+        else:
+            self.finished.emit()
+            
+    def stop(self):
+        """停止重放，正在绘制的笔迹直接画完"""
+        if self.active is not None:
+            self.draw_stroke(float("inf"))
+        self.timer.stop()
+        self.finished.emit()
+        
+    def position(self):
+        return (time.perf_counter() - self.started_at) * self.speed
+        
+    def advance(self):
+        now = self.position()
+        if self.active is not None and not self.draw_stroke(now):
+            return
+        while self.index < len(self.operations):
+            record_type, timestamp, data = self.operations[self.index]
+            if timestamp + self.delay > now:
+                return
+            self.index += 1
+            if record_type == ADD:
+                self.begin_stroke(data, timestamp + self.delay)
+                if not self.draw_stroke(now):
+                    return
+            elif record_type == PAGE:
+                self.app.show_page(self.first_page + data, create=True)
+            else:
+                self.apply_ids(record_type, data)
+        if self.active is None:
+            self.timer.stop()
+            self.finished.emit()
+            
+    def begin_stroke(self, record, started):
+        overlay = self.app.overlay_for_screen(record.screen)
+        self.active = (record, overlay, started, 1)
+        self.app.history.begin()
+        
+    def draw_stroke(self, now):
+        """画出当前笔迹中时间已到的部分，画完后返回 True"""
+        record, overlay, started, drawn = self.active
+        count = len(record.times)
+        elapsed = now - started
+        if elapsed < record.duration:
+            if record.is_freehand:
+                available = max(1, bisect_right(record.times, elapsed))
+                if available > drawn:
+                    # 与手动绘制相同：接续上一段的终点画一条折线
+                    self.draw_segment(record, overlay, record.create_shape(drawn - 1, available))
+                    self.active = (record, overlay, started, available)
+            return False
+            
+        if not record.is_freehand:
+            self.draw_segment(record, overlay, record.create_shape())
+        elif drawn < count or count == 1:
+            self.draw_segment(record, overlay, record.create_shape(drawn - 1))
+        self.finish_stroke()
+        # 下一条操作最早在这条笔迹画完之后开始
+        end = started + record.duration
+        if self.index < len(self.operations):
+            next_time = self.operations[self.index][1] + self.delay
+            if next_time < end:
+                self.delay += end - next_time
+        return True
+        
+    def draw_segment(self, record, overlay, shape):
+        eraser = SHAPE_TYPES[record.tool] is Eraser
+        rect = shape.bounding_rect(record.width)
+        self.app.history.touch(overlay, rect)
+        color = QColor.fromRgba(record.argb)
+        for painter in overlay.canvas.painters(rect, allocate=not eraser):
+            apply_pen(painter, color, record.width, eraser)
+            shape.draw(painter)
+        overlay.update(rect)
+        
+    def finish_stroke(self):
+        record, overlay, _, _ = self.active
+        self.active = None
+        item = overlay.scene.add(record.create_item())
+        self.items[record.journal_id] = (overlay, item)
+        self.app.history.commit(added=[(overlay, item)])
+        self.app.update_overlay_visibility()
+        
+    def apply_ids(self, record_type, journal_ids):
+        grouped = {}
+        for journal_id in journal_ids:
+            if journal_id in self.items:
+                overlay, item = self.items[journal_id]
+                grouped.setdefault(overlay, []).append(item)
+        for overlay, items in grouped.items():
+            if record_type == REMOVE:
+                self.app.remove_items(overlay, items)
+            else:
+                self.app.add_items(overlay, items)
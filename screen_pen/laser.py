@@ -0,0 +1,118 @@
+"""教鞭模式：笔迹在松开后停留片刻，然后逐渐淡出
+
+教鞭笔迹不写入画布、场景和历史记录，由绘图层在 paintEvent 中叠加绘制。
+笔迹按开始淡出的时间放进固定宽度的时间桶：动画的每一帧只处理已经开始淡出的桶，
+还在停留的桶不会被访问，淡出完毕的笔迹随桶一起丢弃。
+没有笔迹需要淡出时定时器完全停止，空闲的绘图层不占用 CPU。
+"""
+import time
+
+from PyQt6.QtCore import QObject, QTimer
+
+from .drawing_tools import apply_pen
+
+# 松开后保持不透明的时间和默认的淡出时间（秒）
+HOLD_SECONDS = 0.5
+DEFAULT_FADE_SECONDS = 1.5
+# 时间桶的宽度（秒）
+BUCKET_SECONDS = 0.1
+# 淡出动画的帧间隔（毫秒）
+FRAME_INTERVAL_MS = 16
+
+
+class LaserStroke:
+    """一条正在停留或淡出的教鞭笔迹"""
+    
+    __slots__ = ("stroke", "color", "width", "rect", "fade_start", "fade_end")
+    
+    def __init__(self, stroke, color, width, fade_start, fade_seconds):
+        self.stroke = stroke
+        self.color = color
+        self.width = width
+        self.rect = stroke.bounding_rect(width)
+        self.fade_start = fade_start
+        self.fade_end = fade_start + fade_seconds
+        
+    def opacity(self, now):
+        if now <= self.fade_start:
+            return 1.0
+        return max(0.0, (self.fade_end - now) / (self.fade_end - self.fade_start))
+
+
+class LaserLayer(QObject):
+    """一个绘图层上的教鞭笔迹
+    
+    update_callback(rect) 请求重绘一块区域，通常就是绘图层的 update。
+    """
+    
+    def __init__(self, update_callback, parent=None):
+        super().__init__(parent)
+        self.update_callback = update_callback
+        # 桶编号 -> 笔迹列表；笔迹按松开的顺序加入，开始淡出的时间单调递增，字典保持时间顺序
+        self.buckets = {}
+        
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        
+    def is_empty(self):
+        return not self.buckets
+        
+    def add(self, stroke, color, width, fade_seconds=DEFAULT_FADE_SECONDS):
+        now = time.perf_counter()
+        item = LaserStroke(stroke, color, width, now + HOLD_SECONDS, max(0.05, fade_seconds))
+        self.buckets.setdefault(int(item.fade_start / BUCKET_SECONDS), []).append(item)
+        self.update_callback(item.rect)
+        self.schedule(now)
+        
+    def clear(self):
+        for bucket in self.buckets.values():
+            for item in bucket:
+                self.update_callback(item.rect)
+        self.buckets = {}
+        self.timer.stop()
+        
+    def tick(self):
+        """动画的一帧：只重绘已经开始淡出的笔迹，淡出完毕的笔迹被丢弃"""
+        now = time.perf_counter()
+        for key in list(self.buckets):
+            if key * BUCKET_SECONDS > now:
+                break  # 之后的桶都还在停留
+            alive = []
+            for item in self.buckets[key]:
+                if item.fade_start <= now:
+                    self.update_callback(item.rect)
+                if item.fade_end > now:
+                    alive.append(item)
+            if alive:
+                self.buckets[key] = alive
+            else:
+                del self.buckets[key]
+        self.schedule(now)
+        
+    def schedule(self, now):
+        """有笔迹在淡出时按帧间隔刷新；都还在停留时等到最早的淡出时间；没有笔迹时停止"""
+        if not self.buckets:
+            self.timer.stop()
+            return
+        first = min(item.fade_start for item in next(iter(self.buckets.values())))
+        if first > now:
+            self.timer.start(max(1, int((first - now) * 1000)))
+        elif not self.timer.isActive():
+            self.timer.start(FRAME_INTERVAL_MS)
+            
+    def paint(self, painter, rect):
+        """绘制与 rect 相交的教鞭笔迹，不透明度随淡出进度降低"""
+        now = time.perf_counter()
+        painter.save()
+        for bucket in self.buckets.values():
+            for item in bucket:
+                if not item.rect.intersects(rect):
+                    continue
+                opacity = item.opacity(now)
+                if opacity <= 0.0:
+                    continue
+                painter.setOpacity(opacity)
+                apply_pen(painter, item.color, item.width)
+                item.stroke.draw(painter)
+        painter.restore()
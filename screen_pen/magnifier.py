@@ -0,0 +1,207 @@
+"""放大镜：在鼠标旁边显示放大后的屏幕内容
+
+每一帧只截取鼠标周围的一小块源区域，按倍率画进预先分配的镜片图像，放大用的变换只在尺寸或倍率改变时重新计算。
+镜片显示在源区域的旁边而不是盖住它，否则下一帧会截到镜片本身。
+
+帧由鼠标移动驱动，最多每秒 60 帧；鼠标不动时只按较低的频率截图检查内容是否变化，
+截到的像素与上一帧相同就不重新缩放也不重绘。放大镜关闭时定时器停止，不占用 CPU。
+"""
+import time
+
+from PyQt6.QtCore import QObject, QPoint, QRect, QTimer, Qt
+from PyQt6.QtGui import QColor, QCursor, QImage, QPainter, QPen, QTransform
+
+from .screen_capture import get_backend
+
+# 镜片边长（逻辑像素）
+LENS_SIZE = 240
+# 镜片与源区域之间的距离
+LENS_MARGIN = 16
+DEFAULT_ZOOM = 3
+MIN_ZOOM = 2
+MAX_ZOOM = 8
+# 鼠标移动时的帧间隔，以及鼠标不动时检查屏幕内容的间隔（毫秒）
+FRAME_INTERVAL_MS = 16
+IDLE_INTERVAL_MS = 200
+
+
+class Magnifier(QObject):
+    """跟随鼠标的放大镜，镜片画在鼠标所在屏幕的绘图层上
+    
+    绘图层在 paintEvent 中调用 paint()，在鼠标移动时调用 cursor_moved()。
+    """
+    
+    def __init__(self, app, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.active = False
+        self.zoom = DEFAULT_ZOOM
+        self.cursor = QPoint()        # 鼠标的全局逻辑坐标
+        self.overlay = None           # 镜片所在的绘图层
+        self.lens_rect = QRect()      # 镜片在绘图层中的位置
+        self.source_rect = QRect()    # 上一帧截取的区域（全局逻辑坐标）
+        
+        # 打开时分配、每帧复用的缓冲区：放大后的镜片和上一帧的源像素
+        self.lens = None
+        self.previous = None
+        # 缓存的放大变换，源图像或镜片的尺寸变化时才重新计算
+        self.transform = QTransform()
+        self.transform_key = None
+        
+        self.last_frame = 0.0
+        self.captures = 0   # 截图次数
+        self.renders = 0    # 内容变化、重新缩放的次数
+        
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        
+    def set_active(self, active):
+        """打开或关闭放大镜，关闭时释放缓冲区"""
+        if active == self.active:
+            return
+        self.active = active
+        if active:
+            self.cursor = QCursor.pos()
+            self.source_rect = QRect()
+            self.timer.start(0)
+        else:
+            self.timer.stop()
+            self.hide()
+            self.lens = None
+            self.previous = None
+            self.transform_key = None
+            
+    def set_zoom(self, zoom):
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+        if zoom == self.zoom:
+            return
+        self.zoom = zoom
+        # 源区域大小改变，下一帧必须重新缩放
+        self.source_rect = QRect()
+        if self.active:
+            self.timer.start(0)
+            
+    def cursor_moved(self, position):
+        """鼠标移动：距上一帧不足一个帧间隔时推迟到下一帧，多次移动只截一次图"""
+        self.cursor = position
+        if not self.active:
+            return
+        elapsed_ms = (time.perf_counter() - self.last_frame) * 1000
+        delay = max(0, int(FRAME_INTERVAL_MS - elapsed_ms))
+        if not self.timer.isActive() or self.timer.remainingTime() > delay:
+            self.timer.start(delay)
+            
+    def forget(self, overlay):
+        """屏幕被移除时不再在这个绘图层上绘制"""
+        if self.overlay is overlay:
+            self.overlay = None
+            self.lens_rect = QRect()
+            self.source_rect = QRect()
+            
+    def hide(self):
+        if self.overlay is not None:
+            self.overlay.update(self.lens_rect)
+        self.overlay = None
+        self.lens_rect = QRect()
+        
+    def overlay_at(self, position):
+        for overlay in self.app.overlays:
+            if overlay.screen_ref is not None and overlay.screen_ref.geometry().contains(position):
+                return overlay
+        return None
+        
+    def tick(self):
+        """一帧：截取源区域，像素有变化时重新缩放，然后等待鼠标移动或下一次内容检查"""
+        if not self.active:
+            return
+        self.last_frame = time.perf_counter()
+        overlay = self.overlay_at(self.cursor)
+        if overlay is None:
+            self.hide()
+            return
+        screen = overlay.screen_ref
+        geometry = screen.geometry()
+        side = max(1, round(LENS_SIZE / self.zoom))
+        # 靠近屏幕边缘时平移源区域而不是裁剪，截图尺寸保持不变
+        source = QRect(self.cursor.x() - side // 2, self.cursor.y() - side // 2, side, side)
+        source.moveLeft(min(max(source.left(), geometry.left()), geometry.right() + 1 - side))
+        source.moveTop(min(max(source.top(), geometry.top()), geometry.bottom() + 1 - side))
+        
+        try:
+            # 后端可能复用缓冲区，返回的图像在下一次截图前有效，这里当场用完，不复制
+            image = get_backend().capture_region(source, screen)
+        except Exception as e:
+            print(f"放大镜截图失败: {e}")
+            self.hide()
+            return
+        if image is None:
+            return
+        self.captures += 1
+        
+        moved = source != self.source_rect or overlay is not self.overlay
+        if self.store_pixels(image, same_region=not moved) or moved:
+            self.render(image, screen.devicePixelRatio())
+            self.source_rect = source
+            self.move_lens(overlay, self.lens_position(source, geometry))
+        self.timer.start(IDLE_INTERVAL_MS)
+        
+    def store_pixels(self, image, same_region):
+        """把源像素保存到上一帧的缓冲区，返回与上一帧相比是否有变化"""
+        import numpy as np
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        pixels = np.frombuffer(bits, dtype=np.uint8)
+        if self.previous is None or self.previous.shape != pixels.shape:
+            self.previous = pixels.copy()
+            return True
+        if same_region and np.array_equal(self.previous, pixels):
+            return False
+        np.copyto(self.previous, pixels)
+        return True
+        
+    def render(self, image, device_pixel_ratio):
+        """用缓存的变换把源图像按最近邻放大到镜片中，文字边缘保持清晰"""
+        size = round(LENS_SIZE * device_pixel_ratio)
+        if self.lens is None or self.lens.width() != size:
+            self.lens = QImage(size, size, QImage.Format.Format_ARGB32_Premultiplied)
+        # 镜片按物理像素绘制，源图像也按物理像素计算
+        image.setDevicePixelRatio(1.0)
+        key = (image.width(), image.height(), size)
+        if key != self.transform_key:
+            self.transform = QTransform.fromScale(size / image.width(), size / image.height())
+            self.transform_key = key
+            
+        painter = QPainter(self.lens)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.setTransform(self.transform)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        self.renders += 1
+        
+    def lens_position(self, source, geometry):
+        """镜片在源区域右侧，放不下时放在左侧，垂直方向与源区域居中对齐，返回绘图层坐标"""
+        x = source.right() + 1 + LENS_MARGIN
+        if x + LENS_SIZE > geometry.right() + 1:
+            x = source.left() - LENS_MARGIN - LENS_SIZE
+        y = source.center().y() - LENS_SIZE // 2
+        y = min(max(y, geometry.top()), geometry.bottom() + 1 - LENS_SIZE)
+        return QRect(x, y, LENS_SIZE, LENS_SIZE).translated(-geometry.topLeft())
+        
+    def move_lens(self, overlay, rect):
+        """只重绘镜片的旧位置和新位置"""
+        if self.overlay is not None:
+            self.overlay.update(self.lens_rect)
+        self.overlay = overlay
+        self.lens_rect = rect
+        overlay.update(rect)
+        
+    def paint(self, painter, rect):
+        if self.lens is None or not self.lens_rect.intersects(rect):
+            return
+        painter.save()
+        painter.drawImage(self.lens_rect, self.lens)
+        painter.setPen(QPen(QColor(80, 80, 80), 2))
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRect(self.lens_rect.adjusted(1, 1, -1, -1))
+        painter.restore()
@@ -0,0 +1,398 @@
+import time
+
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QEvent, QPoint, QRect
+from PyQt6.QtGui import QPainter, QColor, QTabletEvent
+
+from .drawing_tools import apply_pen, pressure_width
+from .instrumentation import metrics
+from .laser import LaserLayer
+from .scene import Scene, SceneItem
+from .stroke_accumulator import StrokeAccumulator
+from .tiled_canvas import TiledCanvas
+
+# 逐点记录、按帧批量绘制的自由笔迹工具，其余工具（直线、矩形、椭圆）只有起点和终点
+FREEHAND_TOOLS = ("画笔", "橡皮", "对象橡皮", "教鞭")
+
+
+def set_click_through(window, enabled):
+    """鼠标穿透：窗口不再接收鼠标事件，由窗口系统直接交给下面的应用
+    
+    与把窗口调成几乎透明不同，窗口保持完全不透明，已有的标注在穿透模式下仍然可见，
+    合成器也不需要每帧按窗口透明度混合整个屏幕。
+    修改窗口标志会重建原生窗口，已显示的窗口需要重新显示。
+    """
+    if bool(window.windowFlags() & Qt.WindowType.WindowTransparentForInput) == enabled:
+        return
+    visible = window.isVisible()
+    window.setWindowFlag(Qt.WindowType.WindowTransparentForInput, enabled)
+    window.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents, enabled)
+    if visible:
+        window.show()
+
+
+class ScreenOverlay(QWidget):
+    """单个屏幕上的绘图层
+    
+    每个 QScreen 对应一个绘图层，各自拥有按该屏幕 devicePixelRatio 分配的画布、
+    场景和输入缓冲区，独立重绘。工具、颜色、线宽和历史记录由 ScreenPenApp 统一管理。
+    """
+    
+    def __init__(self, app, screen, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.screen_ref = None
+        
+        self.drawing = False
+        self.last_point = QPoint()
+        self.current_shape = None
+        # 按下时选中的工具，拖动途中切换工具不影响这一笔，松开后才生效
+        self.active_tool = None
+        self.stroke_started = 0.0  # 按下鼠标时的 perf_counter()，点的时间相对于它
+        self.erased_items = []  # 对象橡皮在本次拖动中删除的对象
+        
+        # 画布只是场景的栅格化缓存，所有对象保存在场景中
+        self.canvas = TiledCanvas(0, 0)
+        self.scene = Scene()
+        
+        # 画笔/橡皮的输入点先进入缓冲区，每帧统一绘制一次
+        self.stroke_accumulator = StrokeAccumulator(self.flush_stroke, parent=self)
+        
+        # 教鞭笔迹不进入画布和场景，松开后在这一层上淡出
+        self.laser = LaserLayer(self.update, parent=self)
+        
+        # 重绘统计：最近一帧重绘的像素数和累计值，用于确认局部重绘的效果
+        self.last_paint_pixels = 0
+        self.total_paint_pixels = 0
+        self.paint_count = 0
+        
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground, True)
+        if parent is None:
+            # 独立窗口（副屏），与主窗口使用相同的窗口属性
+            self.setWindowFlags(
+                Qt.WindowType.FramelessWindowHint |
+                Qt.WindowType.WindowStaysOnTopHint |
+                Qt.WindowType.Tool
+            )
+        self.set_screen(screen)
+        
+    def set_screen(self, screen):
+        """绑定到屏幕，并跟随屏幕的几何和缩放变化"""
+        if self.screen_ref is not None:
+            self.screen_ref.geometryChanged.disconnect(self.sync_to_screen)
+            self.screen_ref.logicalDotsPerInchChanged.disconnect(self.sync_to_screen)
+        self.screen_ref = screen
+        screen.geometryChanged.connect(self.sync_to_screen)
+        screen.logicalDotsPerInchChanged.connect(self.sync_to_screen)
+        
+        if self.isWindow():
+            self.setScreen(screen)
+        self.stroke_accumulator.set_frame_rate(screen.refreshRate())
+        self.sync_to_screen()
+        
+    def sync_to_screen(self, *args):
+        """屏幕尺寸或缩放比例变化时，按新的参数重建画布并由场景重新栅格化"""
+        screen = self.screen_ref
+        geometry = screen.geometry()
+        if self.isWindow():
+            self.setGeometry(geometry)
+            
+        dpr = screen.devicePixelRatio()
+        if (self.canvas.size() == geometry.size()
+                and self.canvas.device_pixel_ratio == dpr):
+            return
+            
+        self.canvas = TiledCanvas(geometry.width(), geometry.height(), device_pixel_ratio=dpr)
+        # 旧瓦片的快照与新画布不再对应
+        self.app.history.forget(self)
+        self.rerender_canvas()
+        
+    def has_ink(self):
+        return not self.canvas.is_empty()
+        
+    def detach(self):
+        """屏幕被移除时解除信号连接"""
+        self.stroke_accumulator.discard()
+        self.app.history.forget(self)
+        if self.screen_ref is not None:
+            self.screen_ref.geometryChanged.disconnect(self.sync_to_screen)
+            self.screen_ref.logicalDotsPerInchChanged.disconnect(self.sync_to_screen)
+            self.screen_ref = None
+            
+    def clear_canvas(self):
+        """清屏只需丢弃瓦片表，历史记录保存的是瓦片的共享引用，返回被清除的对象"""
+        self.laser.clear()
+        items = self.scene.clear()
+        self.app.history.touch_allocated(self)
+        for key in self.canvas.tiles:
+            self.update(self.canvas.tile_rect(key))
+        self.canvas.clear()
+        return items
+        
+    def set_page(self, scene, tiles):
+        """换上另一页的场景和瓦片，tiles 为 None 时（画布尺寸或缩放已经改变）由场景重新栅格化"""
+        self.laser.clear()
+        for key in self.canvas.tiles:
+            self.update(self.canvas.tile_rect(key))
+        self.scene = scene
+        if tiles is None:
+            self.canvas.clear()
+            self.rerender_canvas()
+            return
+        self.canvas.tiles = tiles
+        for key in tiles:
+            self.update(self.canvas.tile_rect(key))
+        
+    def add_items(self, items):
+        """批量加入对象（加载会话、重放中恢复对象），合并区域后一次性栅格化"""
+        rect = QRect()
+        for item in items:
+            rect = rect.united(item.rect)
+        self.app.history.touch(self, rect)
+        for item in items:
+            if item.sequence:
+                self.scene.restore(item)
+            else:
+                self.scene.add(item)
+        self.update(self.scene.render_region(self.canvas, rect))
+        
+    def remove_items(self, items):
+        """从场景中删除对象，只重新栅格化它们覆盖的瓦片"""
+        for item in items:
+            self.app.history.touch(self, item.rect)
+            self.scene.remove(item)
+        for item in items:
+            self.update(self.scene.render_region(self.canvas, item.rect))
+            
+    def rerender_canvas(self):
+        """由场景重建整个画布，用于画布尺寸或缩放改变之后"""
+        self.update(self.scene.render_region(self.canvas, self.canvas.rect()))
+        
+    def paintEvent(self, event):
+        measuring = metrics.enabled
+        if measuring:
+            paint_started = time.perf_counter()
+        painter = QPainter(self)
+        
+        # 只重绘脏区域，Qt 会把多次 update(rect) 合并成一个区域
+        region = event.region()
+        dirty = region.boundingRect()
+        painter.setClipRegion(region)
+        
+        self.last_paint_pixels = dirty.width() * dirty.height()
+        self.total_paint_pixels += self.last_paint_pixels
+        self.paint_count += 1
+        
+        if self.app.drawing_mode_active:
+            # 绘图模式下确保整个区域都能接收鼠标事件，即使是透明的部分
+            # 穿透模式不画这层背景，没有墨迹的地方完全透明
+            painter.fillRect(dirty, QColor(0, 0, 0, 1))  # 几乎全透明，但不是完全透明
+        if self.app.spotlight.active:
+            # 暗色层在墨迹下面，标注保持清晰
+            self.app.spotlight.paint(painter, self, region)
+        
+        # 只绘制与脏区域相交的已分配瓦片
+        self.canvas.draw(painter, dirty)
+        if not self.laser.is_empty():
+            self.laser.paint(painter, dirty)
+        if self.app.magnifier.overlay is self:
+            self.app.magnifier.paint(painter, dirty)
+        
+        # 如果正在绘制，绘制临时形状
+        if self.drawing and self.current_shape:
+            apply_pen(painter, self.app.pen_color, self.app.pen_width, self.active_tool == "橡皮")
+            self.current_shape.draw(painter)
+            
+        if measuring:
+            painter.end()
+            metrics.paint_finished(paint_started, self.last_paint_pixels)
+            
+    def mousePressEvent(self, event):
+        if not self.app.drawing_mode_active or self.app.is_replaying():
+            # 如果不是绘图模式，不处理鼠标事件；重放会话时也不能同时绘制
+            event.ignore()
+            return
+            
+        if self.app.current_tool == "放大镜":
+            # 放大镜只跟随鼠标，不绘图
+            return
+            
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drawing = True
+            self.last_point = event.position().toPoint()
+            
+            # 每一笔都创建新的工具对象，笔迹的点保存在它自己的数组中
+            self.active_tool = self.app.current_tool
+            self.current_shape = self.app.tools[self.active_tool]()
+            if self.active_tool in FREEHAND_TOOLS:
+                self.current_shape.start(event.position(), width=self.sample_width(event))
+            else:
+                self.current_shape.start(event.position().toPoint())
+            self.stroke_started = time.perf_counter()
+            if self.active_tool != "教鞭":
+                # 教鞭不改动画布，不产生历史记录
+                self.app.history.begin()
+            
+    def mouseMoveEvent(self, event):
+        if not self.app.drawing_mode_active:
+            # 如果不是绘图模式，不处理鼠标事件
+            event.ignore()
+            return
+            
+        if self.app.magnifier.active:
+            # 放大镜打开时绘图层跟踪鼠标，没有按下按键也会收到移动事件
+            self.app.magnifier.cursor_moved(event.globalPosition().toPoint())
+            
+        if event.buttons() & Qt.MouseButton.LeftButton and self.drawing:
+            if self.active_tool in FREEHAND_TOOLS:
+                # 只记录点，由缓冲区按帧批量绘制
+                self.stroke_accumulator.add_point(self.sample(event))
+                self.last_point = event.position().toPoint()
+                if metrics.enabled:
+                    metrics.input_received()
+            else:
+                # 对于其他形状，更新当前点并重绘
+                self.current_shape.update(self.last_point, event.position().toPoint())
+                if metrics.enabled:
+                    metrics.input_received()
+                    metrics.inputs_drawn()
+                # 只重绘工具本次触及的区域（包含旧预览和新预览）
+                self.update(self.current_shape.damage_rect(self.app.pen_width))
+                
+    def wheelEvent(self, event):
+        """放大镜打开时滚轮调整倍率"""
+        magnifier = self.app.magnifier
+        if not magnifier.active or not event.angleDelta().y():
+            event.ignore()
+            return
+        magnifier.set_zoom(magnifier.zoom + (1 if event.angleDelta().y() > 0 else -1))
+                
+    def tabletEvent(self, event):
+        """数位板事件走与鼠标相同的绘制流程，接受后 Qt 不再合成对应的鼠标事件"""
+        handler = {
+            QEvent.Type.TabletPress: self.mousePressEvent,
+            QEvent.Type.TabletMove: self.mouseMoveEvent,
+            QEvent.Type.TabletRelease: self.mouseReleaseEvent,
+        }.get(event.type())
+        if handler is None:
+            event.ignore()
+            return
+        event.accept()
+        handler(event)
+        
+    def sample(self, event):
+        """自由笔迹的采样点：浮点坐标和相对笔迹开始的秒数，数位板再加上由压力得到的线宽"""
+        position = event.position()
+        t = time.perf_counter() - self.stroke_started
+        if self.current_shape.stroke.widths is not None:
+            width = self.sample_width(event)
+            return (position.x(), position.y(), t, self.app.pen_width if width is None else width)
+        return (position.x(), position.y(), t)
+        
+    def sample_width(self, event):
+        """数位板事件按压力计算线宽；鼠标事件返回 None，笔迹使用固定线宽"""
+        if isinstance(event, QTabletEvent):
+            return pressure_width(self.app.pen_width, event.pressure())
+        return None
+        
+    def flush_stroke(self, points):
+        """把一帧内累积的点作为一条折线绘制到画布上"""
+        if not self.drawing or self.current_shape is None:
+            return
+        tool = self.current_shape
+        
+        pen_width = self.app.pen_width
+        tool.extend(points)
+        if self.active_tool == "对象橡皮":
+            self.erase_objects(tool)
+            return
+        if self.active_tool == "教鞭":
+            # 教鞭只在重绘时叠加绘制，请求重绘新线段即可
+            self.update(tool.damage_rect(pen_width))
+            if metrics.enabled:
+                metrics.inputs_drawn()
+            return
+        rect = tool.bounding_rect(pen_width)
+        self.app.history.touch(self, rect)
+        
+        # 橡皮擦不会在空白瓦片上分配内存
+        eraser = self.active_tool == "橡皮"
+        for painter in self.canvas.painters(rect, allocate=not eraser):
+            apply_pen(painter, self.app.pen_color, pen_width, eraser)
+            tool.draw(painter)
+            
+        self.update(tool.damage_rect(pen_width))
+        if metrics.enabled:
+            metrics.inputs_drawn()
+        
+    def erase_objects(self, tool):
+        """对象橡皮：删除新路径段碰到的整条笔迹，只重新栅格化它们覆盖的区域"""
+        items = self.scene.hit_test(tool.stroke.points(tool.drawn), self.app.pen_width / 2)
+        if items:
+            self.remove_items(items)
+            self.erased_items.extend(items)
+        if metrics.enabled:
+            metrics.inputs_drawn()
+            
+    def mouseReleaseEvent(self, event):
+        if not self.app.drawing_mode_active:
+            # 如果不是绘图模式，不处理鼠标事件
+            event.ignore()
+            return
+            
+        if event.button() == Qt.MouseButton.LeftButton and self.drawing:
+            if self.active_tool in FREEHAND_TOOLS:
+                # 松开前把缓冲区中剩余的点全部画完
+                self.stroke_accumulator.add_point(self.sample(event))
+                self.stroke_accumulator.flush()
+            else:
+                self.current_shape.update(self.last_point, event.position().toPoint())
+                rect = self.current_shape.bounding_rect(self.app.pen_width)
+                self.app.history.touch(self, rect)
+                
+                for painter in self.canvas.painters(rect):
+                    apply_pen(painter, self.app.pen_color, self.app.pen_width)
+                    self.current_shape.draw(painter)
+                    
+            damage = self.current_shape.damage_rect(self.app.pen_width)
+            self.finish_drawing()
+            self.update(damage)
+            
+    def cancel_drawing(self):
+        """退出绘图模式时结束当前笔迹，已经画出的点仍然保留"""
+        if self.drawing and self.active_tool in FREEHAND_TOOLS:
+            self.stroke_accumulator.flush()
+            self.finish_drawing()
+        else:
+            self.drawing = False
+            self.current_shape = None
+            self.active_tool = None
+            
+    def finish_drawing(self):
+        """笔迹已经画在画布上，这里只需把对象记录到场景和历史中"""
+        if self.active_tool == "教鞭":
+            self.laser.add(self.current_shape.finish(), QColor(self.app.pen_color), self.app.pen_width,
+                           self.app.laser_fade_seconds)
+        elif self.active_tool == "对象橡皮":
+            # 一次拖动删除的全部对象作为一步操作，撤销时一起恢复
+            self.app.history.commit(removed=[(self, item) for item in self.erased_items])
+            self.erased_items = []
+            self.app.update_overlay_visibility()
+        else:
+            item = self.scene.add(self.create_scene_item())
+            self.app.history.commit(added=[(self, item)])
+        self.drawing = False
+        self.current_shape = None
+        self.active_tool = None
+        
+    def create_scene_item(self):
+        """用刚完成的笔迹或图形创建场景对象，工具对象随后丢弃"""
+        shape = self.current_shape.finish()
+        if self.active_tool in ["画笔", "橡皮"]:
+            times = shape.times
+        else:
+            times = [0.0, time.perf_counter() - self.stroke_started]
+        return SceneItem(shape, QColor(self.app.pen_color), self.app.pen_width,
+                         eraser=self.active_tool == "橡皮",
+                         times=times, started_at=self.stroke_started)
@@ -0,0 +1,394 @@
+"""白板分页：每一页有自己的场景和画布，不活动的页在后台线程中压缩
+
+活动页就是各绘图层当前的 Scene 和 TiledCanvas，绘制速度与分页无关。
+离开一页时，它的瓦片（QImage 的隐式共享副本）交给后台线程逐个用 zlib 压缩，
+压缩完成后释放原始像素；场景对象保存的是紧凑的坐标数组，原样保留，尺寸变化后用来重新栅格化。
+压缩数据的总量超过上限时，最久没有访问的页写入临时文件。每页在文件中占一段连续的区域，
+页面再次成为活动页后这段区域归还给空闲表，之后写入的页优先复用，文件末尾的空闲区域直接截掉。
+
+切换到某一页时，如果它的瓦片还在内存中（刚离开、尚未压缩完，或已被预取）直接换上，只需交换瓦片表；
+否则当场解压，zlib 解压时释放 GIL，多核机器上分给几个线程同时进行。
+每次翻页后在后台预先解压相邻的两页，顺序翻页时不需要等待解压。
+跳到不相邻的页仍然在 GUI 线程中当场解压，单核机器上 1080p 约 20 ms、4K 约 65 ms（python -m benchmarks --pages），
+超过一帧；时间主要花在 zlib 解压上，换到后台线程也不会更快出现，反而要先显示空白页、解压完再补上墨迹，
+而且解压期间的绘制、撤销都要另外处理，所以保持当场解压，换上的始终是完整的一页。
+
+tempfile 和 concurrent.futures 只在第一次写临时文件、第一次多线程解压时导入，不拖慢启动。
+"""
+import os
+import zlib
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .scene import Scene
+
+# 压缩后的非活动页在内存中的总量上限（MB）
+DEFAULT_MEMORY_MB = 64
+# 墨迹瓦片大部分是透明像素，1 级压缩已经能压到原来的百分之几，并且压缩最快
+COMPRESS_LEVEL = 1
+# 跳到不相邻的页时同时解压的线程数
+RESTORE_THREADS = min(4, os.cpu_count() or 1)
+
+
+def pack_tiles(tiles):
+    """[(瓦片编号, QImage)] -> [(瓦片编号, 宽, 高, 每行字节数, 压缩数据)]"""
+    packed = []
+    for key, image in tiles:
+        data = image.constBits().asstring(image.sizeInBytes())
+        packed.append((key, image.width(), image.height(), image.bytesPerLine(),
+                       zlib.compress(data, COMPRESS_LEVEL)))
+    return packed
+
+
+def unpack_tiles(packed, device_pixel_ratio, spill_fd=None):
+    """pack_tiles 的逆过程，返回 {瓦片编号: QImage}
+    
+    已写入临时文件的页，压缩数据换成了 (偏移, 长度)，用 os.pread 读取，可以在工作线程中调用。
+    """
+    tiles = {}
+    for key, width, height, bytes_per_line, blob in packed:
+        if isinstance(blob, tuple):
+            offset, length = blob
+            blob = os.pread(spill_fd, length, offset)
+        image = QImage(zlib.decompress(blob), width, height, bytes_per_line,
+                       QImage.Format.Format_ARGB32_Premultiplied).copy()
+        image.setDevicePixelRatio(device_pixel_ratio)
+        tiles[key] = image
+    return tiles
+
+
+class PageLayer:
+    """一页在一个绘图层（屏幕）上的内容"""
+    
+    __slots__ = ("scene", "size", "device_pixel_ratio", "tiles", "packed")
+    
+    def __init__(self, scene, size, device_pixel_ratio, tiles):
+        self.scene = scene
+        # 离开这一页时画布的尺寸和缩放，回来时不一致就由场景重新栅格化
+        self.size = size
+        self.device_pixel_ratio = device_pixel_ratio
+        self.tiles = tiles    # {瓦片编号: QImage}，压缩完成后为 None
+        self.packed = None    # pack_tiles 的结果
+        
+    def packed_bytes(self):
+        if not self.packed:
+            return 0
+        return sum(len(blob) for *_, blob in self.packed if not isinstance(blob, tuple))
+
+
+class Page:
+    """一页白板；活动页的内容在绘图层中，layers 为空"""
+    
+    __slots__ = ("layers", "version", "packed_bytes", "spill_extent")
+    
+    def __init__(self):
+        self.layers = {}      # 绘图层 -> PageLayer
+        # 每次离开或进入这一页都加 1，用来丢弃过期的后台任务结果
+        self.version = 0
+        self.packed_bytes = 0  # 内存中的压缩数据量
+        self.spill_extent = None  # 在临时文件中占用的 (偏移, 长度)
+
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object, int, object)
+
+
+class PackTask(QRunnable):
+    """在线程池中压缩一页的瓦片，结果为 {绘图层: 压缩数据}"""
+    
+    def __init__(self, page, tiles):
+        super().__init__()
+        self.page = page
+        self.version = page.version
+        self.tiles = tiles
+        self.signals = TaskSignals()
+        
+    def run(self):
+        try:
+            result = {overlay: pack_tiles(tiles) for overlay, tiles in self.tiles.items()}
+        except Exception as e:
+            print(f"压缩页面失败: {e}")
+            result = None
+        self.signals.finished.emit(self.page, self.version, result)
+
+
+class UnpackTask(QRunnable):
+    """在线程池中预先解压一页，结果为 {绘图层: {瓦片编号: QImage}}"""
+    
+    def __init__(self, page, packed, spill_fd):
+        super().__init__()
+        self.page = page
+        self.version = page.version
+        self.packed = packed
+        self.spill_fd = spill_fd
+        self.signals = TaskSignals()
+        
+    def run(self):
+        try:
+            result = {overlay: unpack_tiles(packed, device_pixel_ratio, self.spill_fd)
+                      for overlay, (packed, device_pixel_ratio) in self.packed.items()}
+        except Exception as e:
+            print(f"预取页面失败: {e}")
+            result = None
+        self.signals.finished.emit(self.page, self.version, result)
+
+
+class PageStore(QObject):
+    """所有页面，以及非活动页的压缩、换出和预取
+    
+    后台任务只读取交给它的数据，结果通过信号回到 GUI 线程，页面状态只在 GUI 线程中修改。
+    """
+    
+    def __init__(self, memory_mb=DEFAULT_MEMORY_MB, parent=None):
+        super().__init__(parent)
+        self.pages = [Page()]
+        self.current = 0
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self.packed_bytes = 0
+        # 压缩数据还在内存中的非活动页，最近离开的在后
+        self.resident = OrderedDict()
+        self.spill_file = None
+        self.spill_size = 0
+        # 临时文件中的空闲区域 [(偏移, 长度)]，按偏移排序，相邻的已合并
+        self.spill_free = []
+        # 已经归还、但可能还有后台任务在读取的区域，没有任务在运行时才并入空闲表
+        self.spill_released = []
+        # 已提交、结果还没有回到 GUI 线程的后台任务数
+        self.in_flight = 0
+        self.restore_executor = None
+        # 翻页后才提交的后台任务
+        self.pending = []
+        
+        # 单个工作线程，压缩和预取按提交顺序执行
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        
+    def __len__(self):
+        return len(self.pages)
+        
+    def new_page(self):
+        """在最后追加一页，返回它的编号"""
+        self.pages.append(Page())
+        return len(self.pages) - 1
+        
+    def switch(self, overlays, index):
+        """把各绘图层的当前内容存入当前页，换上第 index 页"""
+        leaving = self.pages[self.current]
+        leaving.version += 1
+        tiles = {}
+        for overlay in overlays:
+            canvas = overlay.canvas
+            layer = PageLayer(overlay.scene, canvas.size(), canvas.device_pixel_ratio, canvas.tiles)
+            leaving.layers[overlay] = layer
+            tiles[overlay] = list(layer.tiles.items())
+            overlay.set_page(Scene(), {})
+        self.pending.append((PackTask(leaving, tiles), self.on_packed))
+        
+        self.current = index
+        page = self.pages[index]
+        self.release(page)
+        page.version += 1
+        for overlay in overlays:
+            layer = page.layers.get(overlay)
+            if layer is None:
+                continue
+            canvas = overlay.canvas
+            if layer.size != canvas.size() or layer.device_pixel_ratio != canvas.device_pixel_ratio:
+                overlay.set_page(layer.scene, None)
+            elif layer.tiles is not None:
+                overlay.set_page(layer.scene, layer.tiles)
+            else:
+                overlay.set_page(layer.scene, self.restore(layer))
+        page.layers = {}
+        # 压缩、释放瓦片和预取都推迟到这次事件处理之后，单核机器上不与翻页本身争抢 CPU
+        QTimer.singleShot(0, self.after_switch)
+        
+    def after_switch(self):
+        """翻页之后：提交压缩任务，只有相邻的页保留解压后的瓦片，预取相邻的页"""
+        pending, self.pending = self.pending, []
+        for task, slot in pending:
+            self.submit(task, slot)
+        for number, other in enumerate(self.pages):
+            if abs(number - self.current) > 1:
+                self.drop_tiles(other)
+        self.prefetch(self.current - 1)
+        self.prefetch(self.current + 1)
+        
+    def restore(self, layer):
+        """在 GUI 线程中解压一个绘图层的瓦片，瓦片较多时分给几个线程"""
+        packed = layer.packed
+        if RESTORE_THREADS < 2 or len(packed) < 2 * RESTORE_THREADS:
+            return unpack_tiles(packed, layer.device_pixel_ratio, self.spill_fd())
+        if self.restore_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.restore_executor = ThreadPoolExecutor(RESTORE_THREADS, thread_name_prefix="screen-pen-pages")
+        chunks = [packed[i::RESTORE_THREADS] for i in range(RESTORE_THREADS)]
+        tiles = {}
+        for part in self.restore_executor.map(unpack_tiles, chunks, [layer.device_pixel_ratio] * len(chunks),
+                                              [self.spill_fd()] * len(chunks)):
+            tiles.update(part)
+        return tiles
+        
+    def forget(self, overlay):
+        """屏幕被移除时丢弃各页在这个绘图层上的内容"""
+        for page in self.pages:
+            layer = page.layers.pop(overlay, None)
+            if layer is not None and page in self.resident:
+                freed = layer.packed_bytes()
+                page.packed_bytes -= freed
+                self.packed_bytes -= freed
+                
+    def submit(self, task, slot):
+        task.signals.finished.connect(slot)
+        self.in_flight += 1
+        self.pool.start(task)
+        
+    def on_packed(self, page, version, result):
+        """压缩完成：不相邻的页释放原始像素，压缩数据计入内存上限"""
+        self.in_flight -= 1
+        if page.version != version or result is None:
+            return
+        for overlay, packed in result.items():
+            if overlay in page.layers:
+                page.layers[overlay].packed = packed
+        if abs(self.pages.index(page) - self.current) > 1:
+            self.drop_tiles(page)
+        page.packed_bytes = sum(layer.packed_bytes() for layer in page.layers.values())
+        self.packed_bytes += page.packed_bytes
+        self.resident[page] = None
+        self.enforce_memory()
+        
+    def on_unpacked(self, page, version, result):
+        """预取完成：页面仍然相邻时保留解压后的瓦片"""
+        self.in_flight -= 1
+        if page.version != version or result is None:
+            return
+        if abs(self.pages.index(page) - self.current) > 1:
+            return
+        for overlay, tiles in result.items():
+            if overlay in page.layers:
+                page.layers[overlay].tiles = tiles
+                
+    def drop_tiles(self, page):
+        """压缩数据已经就绪时释放解压后的瓦片"""
+        for layer in page.layers.values():
+            if layer.packed is not None:
+                layer.tiles = None
+                
+    def release(self, page):
+        """页面变为活动页，压缩数据不再有效
+        
+        临时文件中的区域要等这次翻页当场解压之后才能被覆盖，写入新页时才会复用，这里只是登记。
+        """
+        if page in self.resident:
+            del self.resident[page]
+            self.packed_bytes -= page.packed_bytes
+        page.packed_bytes = 0
+        if page.spill_extent is not None:
+            self.spill_released.append(page.spill_extent)
+            page.spill_extent = None
+        
+    def enforce_memory(self):
+        """压缩数据超出上限时，把最久没有访问的页写入临时文件"""
+        while self.packed_bytes > self.memory_bytes and self.resident:
+            page, _ = self.resident.popitem(last=False)
+            self.packed_bytes -= page.packed_bytes
+            page.packed_bytes = 0
+            try:
+                self.spill(page)
+            except OSError as e:
+                print(f"页面写入临时文件失败: {e}")
+                
+    def spill(self, page):
+        """把一页的压缩数据写入临时文件中一段连续的区域
+        
+        压缩失败的绘图层没有压缩数据，瓦片仍然留在内存中，跳过。
+        """
+        layers = [layer for layer in page.layers.values() if layer.packed is not None]
+        size = sum(len(blob) for layer in layers for *_, blob in layer.packed if not isinstance(blob, tuple))
+        if not size:
+            return
+        fd = self.spill_fd(create=True)
+        offset = self.allocate(size)
+        page.spill_extent = (offset, size)
+        for layer in layers:
+            spilled = []
+            for key, width, height, bytes_per_line, blob in layer.packed:
+                if not isinstance(blob, tuple):
+                    os.pwrite(fd, blob, offset)
+                    blob = (offset, len(blob))
+                    offset += blob[1]
+                spilled.append((key, width, height, bytes_per_line, blob))
+            layer.packed = spilled
+            
+    def allocate(self, size):
+        """在临时文件中找一段 size 字节的区域：先用空闲表中第一段放得下的，否则追加在末尾"""
+        if self.in_flight == 0:
+            self.reclaim()
+        for index, (offset, length) in enumerate(self.spill_free):
+            if length >= size:
+                if length == size:
+                    del self.spill_free[index]
+                else:
+                    self.spill_free[index] = (offset + size, length - size)
+                return offset
+        offset = self.spill_size
+        self.spill_size += size
+        return offset
+        
+    def reclaim(self):
+        """把已归还的区域并入空闲表，合并相邻的区域，文件末尾的空闲区域截掉"""
+        if not self.spill_released:
+            return
+        extents = sorted(self.spill_free + self.spill_released)
+        self.spill_released = []
+        merged = []
+        for offset, length in extents:
+            if merged and merged[-1][0] + merged[-1][1] == offset:
+                merged[-1] = (merged[-1][0], merged[-1][1] + length)
+            else:
+                merged.append((offset, length))
+        if merged and sum(merged[-1]) == self.spill_size:
+            self.spill_size = merged.pop()[0]
+            try:
+                os.ftruncate(self.spill_fd(), self.spill_size)
+            except OSError as e:
+                print(f"截短临时文件失败: {e}")
+        self.spill_free = merged
+            
+    def spill_fd(self, create=False):
+        if self.spill_file is None:
+            if not create:
+                return None
+            import tempfile
+            self.spill_file = tempfile.TemporaryFile(prefix="screen-pen-pages-")
+        return self.spill_file.fileno()
+        
+    def prefetch(self, index):
+        """在后台解压相邻的页"""
+        if not 0 <= index < len(self.pages) or index == self.current:
+            return
+        page = self.pages[index]
+        packed = {overlay: (layer.packed, layer.device_pixel_ratio)
+                  for overlay, layer in page.layers.items() if layer.tiles is None and layer.packed is not None}
+        if packed:
+            self.submit(UnpackTask(page, packed, self.spill_fd()), self.on_unpacked)
+            
+    def nbytes(self):
+        """非活动页占用的内存：压缩数据加上尚未释放的瓦片"""
+        tiles = sum(image.sizeInBytes() for page in self.pages for layer in page.layers.values()
+                    if layer.tiles is not None for image in layer.tiles.values())
+        return self.packed_bytes + tiles
+        
+    def close(self):
+        """等待后台任务结束并删除临时文件"""
+        self.pending = []
+        self.pool.waitForDone()
+        if self.restore_executor is not None:
+            self.restore_executor.shutdown()
+            self.restore_executor = None
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
@@ -0,0 +1,265 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .compositor import composite_tiles
+
+
+class ImageSequenceEncoder:
+    """把每一帧保存为一张图片：frame_000001.png ..."""
+    
+    def __init__(self, directory, image_format="png", quality=-1):
+        self.directory = directory
+        self.image_format = image_format
+        self.quality = quality
+        self.frame_number = 0
+        
+    def open(self, width, height, fps):
+        os.makedirs(self.directory, exist_ok=True)
+        
+    def write(self, image):
+        self.frame_number += 1
+        path = os.path.join(self.directory, f"frame_{self.frame_number:06d}.{self.image_format}")
+        if not image.save(path, None, self.quality):
+            raise RuntimeError(f"无法写入 {path}")
+        
+    def close(self):
+        pass
+
+
+class FFmpegEncoder:
+    """通过管道把原始 BGRA 帧交给 ffmpeg 编码成视频"""
+    
+    def __init__(self, path, codec="libx264", preset="ultrafast", ffmpeg=None):
+        self.path = path
+        self.codec = codec
+        self.preset = preset
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.process = None
+        self.size = None
+        
+    @staticmethod
+    def available():
+        return shutil.which("ffmpeg") is not None
+    
+    def open(self, width, height, fps):
+        if self.ffmpeg is None:
+            raise RuntimeError("找不到 ffmpeg")
+        # 视频编码要求宽高为偶数
+        self.size = (width - width % 2, height - height % 2)
+        command = [
+            self.ffmpeg, "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgra",
+            "-s", f"{self.size[0]}x{self.size[1]}", "-r", str(fps), "-i", "-",
+            "-c:v", self.codec, "-preset", self.preset, "-pix_fmt", "yuv420p",
+            self.path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        
+    def write(self, image):
+        width, height = self.size
+        if image.width() != width or image.height() != height:
+            image = image.copy(0, 0, width, height)
+        if image.format() not in (QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32,
+                                  QImage.Format.Format_ARGB32_Premultiplied):
+            image = image.convertToFormat(QImage.Format.Format_RGB32)
+        # 小端机器上 (A)RGB32 的内存布局就是 BGRA，逐行去掉对齐填充后写入
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        row_bytes = width * 4
+        stride = image.bytesPerLine()
+        data = memoryview(bits)
+        if stride == row_bytes:
+            self.process.stdin.write(data[:row_bytes * height])
+        else:
+            for y in range(height):
+                self.process.stdin.write(data[y * stride:y * stride + row_bytes])
+                
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class RecordingStats:
+    """录制统计：实际帧率、丢帧数和编码延迟（从截图到写入完成）"""
+    
+    def __init__(self):
+        self.started_at = None
+        self.stopped_at = None
+        # 编码完成的第一帧和最后一帧的截图时间，实际帧率只按这一段计算，不含停止时等待编码器的时间
+        self.first_frame_at = None
+        self.last_frame_at = None
+        self.captured = 0
+        self.encoded = 0
+        self.dropped = 0
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.lock = threading.Lock()
+        
+    def record_encoded(self, captured_at, latency_ms):
+        with self.lock:
+            self.encoded += 1
+            if self.first_frame_at is None:
+                self.first_frame_at = captured_at
+            self.last_frame_at = captured_at
+            self.latency_total_ms += latency_ms
+            self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+            
+    def summary(self):
+        with self.lock:
+            end = self.stopped_at or time.perf_counter()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            span = self.last_frame_at - self.first_frame_at if self.encoded > 1 else 0.0
+            return {
+                "duration_s": round(elapsed, 3),
+                "captured": self.captured,
+                "encoded": self.encoded,
+                "dropped": self.dropped,
+                "achieved_fps": round((self.encoded - 1) / span, 2) if span else 0.0,
+                "encode_latency_mean_ms": round(self.latency_total_ms / self.encoded, 3) if self.encoded else 0.0,
+                "encode_latency_max_ms": round(self.latency_max_ms, 3),
+            }
+
+
+class Recorder(QObject):
+    """带标注的屏幕录制
+    
+    GUI 线程按目标帧率截图（截图后端需要在 GUI 线程调用），连同当时墨迹瓦片的共享副本
+    放进有界缓冲区；后台编码线程取出后合成墨迹并交给编码器。
+    缓冲区满（编码跟不上）时直接丢弃新帧，并且跳过这一帧的截图，内存不会增长。
+    
+    stop() 只停止截图，不等待编码：缓冲区中剩下的帧和编码器的收尾（ffmpeg 写完文件）在编码线程中完成，
+    之后由编码线程发出 finished(统计信息)，GUI 线程应以 QueuedConnection 连接。需要等待时调用 wait()。
+    编码器打开失败时不再重试，其余的帧直接丢弃，统计信息的 error 中给出原因。
+    
+    frame_source() 返回一帧 QImage；annotation_source() 返回 (瓦片列表, devicePixelRatio)，
+    可以为 None（不合成标注）。测试时 frame_source 可以使用 synthetic 截图后端。
+    """
+    
+    finished = pyqtSignal(dict)
+    
+    def __init__(self, frame_source, encoder, fps=15, buffer_size=8, annotation_source=None,
+                 frames_are_transient=True, parent=None):
+        super().__init__(parent)
+        self.frame_source = frame_source
+        self.annotation_source = annotation_source
+        self.encoder = encoder
+        self.fps = fps
+        self.frames_are_transient = frames_are_transient
+        self.buffer_size = buffer_size
+        # 多留一个位置给结束标记，stop() 放入时不会因为缓冲区已满而阻塞
+        self.frames = queue.Queue(maxsize=buffer_size + 1)
+        self.stats = RecordingStats()
+        self.worker = None
+        self.error = None
+        self.encoder_failed = False
+        
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(max(1, round(1000 / fps)))
+        self.timer.timeout.connect(self.capture_frame)
+        
+    def is_recording(self):
+        return self.timer.isActive()
+    
+    def start(self):
+        self.stats = RecordingStats()
+        self.stats.started_at = time.perf_counter()
+        self.error = None
+        self.encoder_failed = False
+        self.worker = threading.Thread(target=self.encode_frames, name="screen-pen-recorder", daemon=True)
+        self.worker.start()
+        self.timer.start()
+        
+    def capture_frame(self):
+        if self.encoder_failed:
+            # 编码器无法打开，继续截图没有意义
+            self.stop()
+            return
+        if self.frames.qsize() >= self.buffer_size:
+            # 编码器落后时丢帧，连截图也省掉
+            self.stats.dropped += 1
+            return
+        
+        captured_at = time.perf_counter()
+        try:
+            image = self.frame_source()
+        except Exception as e:
+            self.error = str(e)
+            print(f"录制截图失败: {e}")
+            return
+        if image is None:
+            return
+        if self.frames_are_transient:
+            # 后端会复用缓冲区，排队前需要一份独立的副本
+            image = image.copy()
+        annotations = self.annotation_source() if self.annotation_source else None
+        self.stats.captured += 1
+        try:
+            self.frames.put_nowait((captured_at, image, annotations))
+        except queue.Full:
+            self.stats.dropped += 1
+            
+    def encode_frames(self):
+        opened = False
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            if self.encoder_failed:
+                continue
+            captured_at, image, annotations = item
+            if not opened:
+                try:
+                    self.encoder.open(image.width(), image.height(), self.fps)
+                except Exception as e:
+                    self.error = str(e)
+                    self.encoder_failed = True
+                    print(f"无法打开录制编码器: {e}")
+                    continue
+                opened = True
+            try:
+                if annotations is not None:
+                    tiles, device_pixel_ratio = annotations
+                    image = composite_tiles(image, tiles, device_pixel_ratio)
+                self.encoder.write(image)
+            except Exception as e:
+                self.error = str(e)
+                print(f"录制编码失败: {e}")
+                continue
+            self.stats.record_encoded(captured_at, (time.perf_counter() - captured_at) * 1000)
+        if opened:
+            try:
+                self.encoder.close()
+            except Exception as e:
+                self.error = str(e)
+                print(f"录制编码失败: {e}")
+        self.finished.emit(self.summary())
+            
+    def stop(self):
+        """停止截图并通知编码线程结束，不等待编码完成"""
+        if not self.timer.isActive():
+            return
+        self.timer.stop()
+        self.stats.stopped_at = time.perf_counter()
+        self.frames.put_nowait(None)
+        
+    def wait(self):
+        """等待编码线程写完剩下的帧并关闭编码器（退出程序时使用），返回统计信息"""
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+        return self.summary()
+        
+    def summary(self):
+        summary = self.stats.summary()
+        summary["error"] = self.error
+        return summary
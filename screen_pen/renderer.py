@@ -0,0 +1,337 @@
+"""离屏渲染：不需要窗口，把笔迹数据栅格化为 QImage，或者导出为 SVG、PDF 矢量文件
+
+栅格和 PDF 与绘图层一样由 SceneItem.paint 绘制，渲染结果与屏幕上看到的一致；SVG 直接按几何数据写出。
+导出矢量文件前，自由笔迹先用 Ramer-Douglas-Peucker 简化，去掉几乎共线的点；直线、矩形、椭圆保持为原生图元。
+只依赖 QtGui，在没有显示器的机器上用 offscreen 平台创建 QGuiApplication 即可使用，也可以在工作进程中调用。
+"""
+import html
+import math
+import os
+
+from PyQt6.QtCore import QMarginsF, QPointF, QRect, QRectF, QSizeF, Qt
+from PyQt6.QtGui import QColor, QImage, QPageLayout, QPageSize, QPainter, QPainterPath, QPainterPathStroker, QPdfWriter
+
+from .journal import load_journal
+from .drawing_tools import Ellipse, Rectangle
+from .scene import SceneItem
+from .stroke import ShapeRecord, Stroke, polygon_from_points, variable_width_outline
+
+# 按内容决定画面大小时，在右下方留出的空白（逻辑像素）
+DEFAULT_MARGIN = 16
+# 矢量导出时自由笔迹的简化容差（逻辑像素），简化后的折线与原来的点相差不超过这个距离；0 表示不简化
+DEFAULT_TOLERANCE = 0.5
+
+# 格式名称 -> 扩展名；svg 和 pdf 是矢量格式，其余栅格化
+FORMATS = {
+    "png": ".png",
+    "jpeg": ".jpg",
+    "svg": ".svg",
+    "pdf": ".pdf",
+}
+
+# 矢量格式在文件对话框中的过滤器
+VECTOR_FILTERS = {
+    "svg": "SVG 矢量图 (*.svg)",
+    "pdf": "PDF 文档 (*.pdf)",
+}
+
+
+def session_layers(journal):
+    """把日志的最终场景按 (页, 屏幕) 分组，每组按绘制顺序排列"""
+    layers = {}
+    for record in journal.final_strokes():
+        layers.setdefault((record.page, record.screen), []).append(record)
+    return layers
+
+
+def content_rect(items, margin=DEFAULT_MARGIN, crop=False):
+    """所有对象覆盖的区域；crop 为 False 时从原点开始，与截图的坐标一致"""
+    bounds = QRect()
+    for item in items:
+        bounds = bounds.united(item.rect)
+    if bounds.isEmpty():
+        return QRect(0, 0, 1, 1)
+    if not crop:
+        return QRect(0, 0, bounds.right() + 1 + margin, bounds.bottom() + 1 + margin)
+    return bounds.adjusted(-margin, -margin, margin, margin)
+
+
+def render_image(items, rect, scale=1.0, background=None, antialias=False):
+    """把 rect（逻辑坐标）内的对象画成 scale 倍分辨率的图像，background 为 None 时背景透明
+    
+    墨迹先画在透明层上，橡皮擦只清除墨迹，然后再叠加到背景上。
+    """
+    image = QImage(math.ceil(rect.width() * scale), math.ceil(rect.height() * scale),
+                   QImage.Format.Format_ARGB32_Premultiplied)
+    # 与画布瓦片相同，用 devicePixelRatio 缩放，线宽和坐标按逻辑像素计算
+    image.setDevicePixelRatio(scale)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing, antialias)
+    painter.translate(-rect.x(), -rect.y())
+    for item in items:
+        item.paint(painter)
+    painter.end()
+    
+    if background is None:
+        return image
+    result = QImage(image.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    result.setDevicePixelRatio(scale)
+    result.fill(background)
+    painter = QPainter(result)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return result
+
+
+def outline_path(item):
+    """对象墨迹覆盖的区域，画笔的端点和连接方式与 apply_pen 相同（方头、斜角）"""
+    shape = item.shape
+    path = QPainterPath()
+    if isinstance(shape, ShapeRecord):
+        rect = QRectF(QRect(shape.start_point, shape.end_point).normalized())
+        if shape.tool is Rectangle:
+            path.addRect(rect)
+        elif shape.tool is Ellipse:
+            path.addEllipse(rect)
+        else:
+            path.moveTo(QPointF(shape.start_point))
+            path.lineTo(QPointF(shape.end_point))
+    else:
+        points = shape.points()
+        if shape.widths is not None:
+            path.setFillRule(Qt.FillRule.WindingFill)
+            path.addPolygon(polygon_from_points(variable_width_outline(points, shape.widths)))
+            return path
+        if len(points) > 2:
+            path.addPolygon(polygon_from_points(points))
+        elif len(points):
+            (x0, y0), (x1, y1) = points[0].tolist(), points[-1].tolist()
+            path.moveTo(x0, y0)
+            path.lineTo(x1, y1)
+    stroker = QPainterPathStroker()
+    stroker.setWidth(item.width)
+    stroker.setCapStyle(Qt.PenCapStyle.SquareCap)
+    stroker.setJoinStyle(Qt.PenJoinStyle.BevelJoin)
+    return stroker.createStroke(path)
+
+
+def simplify_items(items, tolerance=DEFAULT_TOLERANCE):
+    """自由笔迹（包括橡皮擦）用 RDP 简化后的新对象，图形对象原样保留；tolerance 为 0 时不简化"""
+    if tolerance <= 0:
+        return items
+    result = []
+    for item in items:
+        if isinstance(item.shape, Stroke) and len(item.shape) > 2:
+            item = SceneItem(item.shape.simplify(tolerance), item.color, item.width, item.eraser)
+        result.append(item)
+    return result
+
+
+def erased_items(items):
+    """按绘制顺序返回 [(对象, 被擦掉的区域)]，橡皮擦笔迹本身不返回
+    
+    矢量格式不支持清除模式，QSvgGenerator 也不输出裁剪路径，所以被擦过的对象改为填充
+    "墨迹轮廓减去之后所有与它相交的橡皮擦笔迹" 得到的区域；没被擦过的对象区域为空，照常绘制。
+    """
+    erasers = []
+    result = []
+    for item in reversed(items):
+        if item.eraser:
+            erasers.append((item, outline_path(item)))
+            continue
+        erased = QPainterPath()
+        outline = None
+        for eraser, area in erasers:
+            if not eraser.rect.intersects(item.rect):
+                continue
+            # 包围盒相交不一定真的擦到，轮廓不相交的对象仍然按原生图元输出
+            if outline is None:
+                outline = outline_path(item)
+            if area.intersects(outline):
+                erased = erased.united(area)
+        result.append((item, erased))
+    result.reverse()
+    return result
+
+
+def paint_vector(painter, items, rect, background=None):
+    """在矢量设备上绘制对象"""
+    painter.translate(-rect.x(), -rect.y())
+    if background is not None:
+        painter.fillRect(rect, background)
+    for item, erased in erased_items(items):
+        if erased.isEmpty():
+            item.paint(painter)
+        else:
+            painter.fillPath(outline_path(item).subtracted(erased), item.color)
+
+
+def svg_number(value):
+    """坐标保留两位小数，去掉多余的 0"""
+    return f"{round(value, 2):g}"
+
+
+def svg_points(points):
+    import numpy as np
+    return " ".join(f"{x:g},{y:g}" for x, y in np.round(np.asarray(points, dtype=np.float64), 2).tolist())
+
+
+def svg_paint(attribute, color):
+    """fill 或 stroke 的颜色属性，半透明时加上不透明度"""
+    text = f'{attribute}="{color.name()}"'
+    if color.alpha() < 255:
+        text += f' {attribute}-opacity="{svg_number(color.alphaF())}"'
+    return text
+
+
+def svg_path_data(path):
+    """QPainterPath 转为 SVG 的 d 属性，曲线段的两个控制点跟在 C 后面"""
+    commands = {
+        QPainterPath.ElementType.MoveToElement: "M",
+        QPainterPath.ElementType.LineToElement: "L",
+        QPainterPath.ElementType.CurveToElement: "C",
+        QPainterPath.ElementType.CurveToDataElement: "",
+    }
+    parts = []
+    for index in range(path.elementCount()):
+        element = path.elementAt(index)
+        parts.append(f"{commands[element.type]}{svg_number(element.x)},{svg_number(element.y)}")
+    return " ".join(parts)
+
+
+def svg_element(item, erased):
+    """一个对象对应的 SVG 元素；直线、矩形、椭圆写成原生图元，自由笔迹写成折线"""
+    import numpy as np
+    shape = item.shape
+    if not erased.isEmpty():
+        area = outline_path(item).subtracted(erased)
+        rule = "evenodd" if area.fillRule() == Qt.FillRule.OddEvenFill else "nonzero"
+        return f'<path d="{svg_path_data(area)}" fill-rule="{rule}" {svg_paint("fill", item.color)}/>'
+    if isinstance(shape, Stroke) and shape.widths is not None:
+        # 变宽笔迹与屏幕上一样填充轮廓；SVG 默认的 nonzero 规则就是非零环绕
+        outline = variable_width_outline(shape.points(), shape.widths)
+        return f'<polygon points="{svg_points(outline)}" {svg_paint("fill", item.color)}/>'
+        
+    stroke = f'{svg_paint("stroke", item.color)} stroke-width="{svg_number(item.width)}"'
+    if isinstance(shape, ShapeRecord):
+        rect = QRectF(QRect(shape.start_point, shape.end_point).normalized())
+        if shape.tool is Rectangle:
+            return (f'<rect x="{svg_number(rect.x())}" y="{svg_number(rect.y())}" '
+                    f'width="{svg_number(rect.width())}" height="{svg_number(rect.height())}" {stroke}/>')
+        if shape.tool is Ellipse:
+            center = rect.center()
+            return (f'<ellipse cx="{svg_number(center.x())}" cy="{svg_number(center.y())}" '
+                    f'rx="{svg_number(rect.width() / 2)}" ry="{svg_number(rect.height() / 2)}" {stroke}/>')
+        points = shape.points()
+    else:
+        points = shape.points()
+        if len(points) > 2:
+            return f'<polyline points="{svg_points(points)}" {stroke}/>'
+    (x0, y0), (x1, y1) = np.round(points[[0, -1]].astype(np.float64), 2).tolist()
+    return f'<line x1="{x0:g}" y1="{y0:g}" x2="{x1:g}" y2="{y1:g}" {stroke}/>'
+
+
+def write_svg(items, rect, path, scale=1.0, background=None, title=""):
+    """直接按几何数据写 SVG，不经过 QSvgGenerator
+    
+    QSvgGenerator 把直线写成折线、为每个对象重复写一组样式，坐标保留很多位小数，文件大而且不是原生图元。
+    宽高乘以 scale，单位是 CSS 像素；viewBox 使用逻辑坐标。
+    """
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{svg_number(rect.width() * scale)}" '
+        f'height="{svg_number(rect.height() * scale)}" viewBox="{rect.x()} {rect.y()} {rect.width()} {rect.height()}">',
+    ]
+    if title:
+        lines.append(f"<title>{html.escape(title)}</title>")
+    if background is not None:
+        lines.append(f'<rect x="{rect.x()}" y="{rect.y()}" width="{rect.width()}" height="{rect.height()}" '
+                     f'{svg_paint("fill", background)}/>')
+    # 与 apply_pen 的画笔相同：方头端点、斜角连接
+    lines.append('<g fill="none" stroke-linecap="square" stroke-linejoin="bevel">')
+    lines.extend(svg_element(item, erased) for item, erased in erased_items(items))
+    lines.append("</g>")
+    lines.append("</svg>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_pdf(items, rect, path, scale=1.0, background=None, title=""):
+    """一页 PDF，页面大小等于画面大小，1 个逻辑像素乘以 scale 为 1 pt"""
+    writer = QPdfWriter(path)
+    writer.setTitle(title)
+    writer.setResolution(72)
+    writer.setPageLayout(QPageLayout(QPageSize(QSizeF(rect.width() * scale, rect.height() * scale),
+                                               QPageSize.Unit.Point, "", QPageSize.SizeMatchPolicy.ExactMatch),
+                                     QPageLayout.Orientation.Portrait, QMarginsF(0, 0, 0, 0)))
+    painter = QPainter(writer)
+    if not painter.isActive():
+        raise RuntimeError(f"无法写入 {path}")
+    painter.scale(scale, scale)
+    paint_vector(painter, items, rect, background)
+    painter.end()
+
+
+def write_file(items, rect, path, image_format, scale=1.0, background=None, antialias=False, title="",
+               tolerance=DEFAULT_TOLERANCE):
+    """按格式把对象写入文件，矢量格式先简化自由笔迹"""
+    if image_format == "svg":
+        write_svg(simplify_items(items, tolerance), rect, path, scale, background, title)
+    elif image_format == "pdf":
+        write_pdf(simplify_items(items, tolerance), rect, path, scale, background, title)
+    else:
+        if image_format == "jpeg" and background is None:
+            # JPEG 没有透明通道
+            background = QColor(Qt.GlobalColor.white)
+        image = render_image(items, rect, scale, background, antialias)
+        if not image.save(path, image_format.upper()):
+            raise RuntimeError(f"无法写入 {path}")
+
+
+def vector_filters():
+    """导出矢量文件时文件对话框使用的过滤器字符串"""
+    return ";;".join(VECTOR_FILTERS.values())
+
+
+def vector_format(path, selected_filter):
+    """按扩展名决定矢量格式，没有可识别的扩展名时按选中的过滤器，返回 (格式, 补全扩展名后的路径)"""
+    extension = os.path.splitext(path)[1].lower()
+    for name in VECTOR_FILTERS:
+        if FORMATS[name] == extension:
+            return name, path
+    for name, description in VECTOR_FILTERS.items():
+        if description == selected_filter:
+            return name, path + FORMATS[name]
+    return "svg", path + FORMATS["svg"]
+
+
+def render_session(path, output_base, formats, scale=1.0, size=None, crop=False, background=None,
+                   antialias=False, tolerance=DEFAULT_TOLERANCE):
+    """把一个会话文件中每一页、每个屏幕的最终场景写成文件，返回写入的文件列表
+    
+    output_base 是不带扩展名的输出路径；会话有多页或多个屏幕时加上 "-p页码"、"-s屏幕" 后缀。
+    size 为 (宽, 高) 时使用固定的画面大小，否则按内容决定。
+    """
+    journal = load_journal(path)
+    layers = session_layers(journal)
+    pages = {page for page, _ in layers}
+    screens = {screen for _, screen in layers}
+    written = []
+    for (page, screen), records in sorted(layers.items()):
+        items = [record.create_item() for record in records]
+        if size is not None:
+            rect = QRect(0, 0, size[0], size[1])
+        else:
+            rect = content_rect(items, crop=crop)
+        base = output_base
+        if len(pages) > 1:
+            base += f"-p{page + 1}"
+        if len(screens) > 1:
+            base += f"-s{screen}"
+        for image_format in formats:
+            output = base + FORMATS[image_format]
+            write_file(items, rect, output, image_format, scale, background, antialias,
+                       title=os.path.basename(base), tolerance=tolerance)
+            written.append(output)
+    return written
@@ -0,0 +1,158 @@
+import math
+
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QPainter
+
+from .drawing_tools import apply_pen
+from .stroke import points_rect, polylines_hit
+
+# 空间索引的网格单元大小
+GRID_CELL_SIZE = 128
+
+
+class SceneItem:
+    """场景中的一个笔迹或图形对象"""
+    
+    def __init__(self, shape, color, width, eraser=False, times=None, started_at=None):
+        self.shape = shape
+        self.color = color
+        self.width = width
+        self.eraser = eraser
+        self.rect = shape.bounding_rect(width)
+        self.sequence = 0  # 加入场景时分配，决定绘制顺序
+        # 每个点相对笔迹开始的秒数，以及开始时的 perf_counter()，用于日志和重放
+        self.times = times
+        self.started_at = started_at
+        self.journal_id = None
+        
+    def paint(self, painter):
+        apply_pen(painter, self.color, self.width, self.eraser)
+        self.shape.draw(painter)
+
+
+class GridIndex:
+    """均匀网格空间索引，按包围盒查询对象"""
+    
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        
+    def cells_for(self, rect):
+        size = self.cell_size
+        for cy in range(rect.top() // size, rect.bottom() // size + 1):
+            for cx in range(rect.left() // size, rect.right() // size + 1):
+                yield (cx, cy)
+                
+    def insert(self, item):
+        # 每个单元保存对象及其包围盒的边界，查询时用整数比较代替 QRect.intersects
+        rect = item.rect
+        bounds = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        for cell in self.cells_for(rect):
+            self.cells.setdefault(cell, {})[item] = bounds
+            
+    def remove(self, item):
+        for cell in self.cells_for(item.rect):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.pop(item, None)
+                if not bucket:
+                    del self.cells[cell]
+                    
+    def query(self, rect):
+        if rect.isEmpty():
+            return set()
+        left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+        found = set()
+        for cell in self.cells_for(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(item for item, (l, t, r, b) in bucket.items()
+                             if l <= right and r >= left and t <= bottom and b >= top)
+        return found
+    
+    def clear(self):
+        self.cells = {}
+
+
+class Scene:
+    """保留模式的场景：保存所有对象，按需把局部区域重新栅格化到缓存层"""
+    
+    def __init__(self):
+        self.items = {}
+        self.index = GridIndex()
+        self.next_sequence = 0
+        
+    def __len__(self):
+        return len(self.items)
+        
+    def add(self, item):
+        self.next_sequence += 1
+        item.sequence = self.next_sequence
+        self.items[item.sequence] = item
+        self.index.insert(item)
+        return item
+    
+    def restore(self, item):
+        """重新加入之前删除的对象，保留原来的绘制顺序"""
+        if item.sequence not in self.items:
+            self.items[item.sequence] = item
+            self.index.insert(item)
+    
+    def remove(self, item):
+        if self.items.pop(item.sequence, None) is not None:
+            self.index.remove(item)
+            
+    def clear(self):
+        """清空场景，返回被清除的对象"""
+        items = list(self.items.values())
+        self.items = {}
+        self.index.clear()
+        return items
+    
+    def items_in(self, rect):
+        """按绘制顺序返回与 rect 相交的对象"""
+        return sorted(self.index.query(rect), key=lambda item: item.sequence)
+    
+    def hit_test(self, path, radius):
+        """返回被路径碰到的对象（按绘制顺序），path 是 (n, 2) 坐标数组
+        
+        先用网格索引按包围盒筛选候选对象，再对全部候选对象的线段一次向量化计算精确距离，
+        距离不超过 radius 加对象半个线宽即算碰到。橡皮擦笔迹本身看不见，不参与命中测试。
+        """
+        margin = int(math.ceil(radius)) + 1
+        rect = points_rect(path).adjusted(-margin, -margin, margin, margin)
+        candidates = [item for item in self.index.query(rect) if not item.eraser]
+        if not candidates:
+            return []
+        half_width = max(item.width for item in candidates) / 2
+        bounds = (rect.left() - half_width, rect.top() - half_width,
+                  rect.right() + half_width, rect.bottom() + half_width)
+        hits = polylines_hit(path, [item.shape.outline() for item in candidates],
+                             [radius + item.width / 2 for item in candidates], bounds)
+        return sorted((item for item, hit in zip(candidates, hits) if hit), key=lambda item: item.sequence)
+        
+    def paint(self, painter, rect):
+        """在 painter 上绘制与 rect 相交的对象"""
+        for item in self.items_in(rect):
+            item.paint(painter)
+            
+    def render_region(self, canvas, rect):
+        """只重新栅格化 rect 覆盖的瓦片，返回实际更新的区域
+        
+        没有对象的瓦片直接释放，不再占用内存。
+        """
+        updated = QRect()
+        for key in canvas.keys_in(rect):
+            tile = canvas.tile_rect(key)
+            updated = updated.united(tile)
+            items = self.items_in(tile)
+            if not items:
+                canvas.drop_tile(key)
+                continue
+            
+            painter = QPainter(canvas.new_tile(key))
+            painter.translate(-tile.x(), -tile.y())
+            for item in items:
+                item.paint(painter)
+            painter.end()
+        return updated
@@ -1,33 +1,136 @@
-import io
-import time
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QBuffer, QByteArray
-from PyQt6.QtGui import QImage, QPixmap
-from Quartz import (CGWindowListCopyWindowInfo, kCGWindowListOptionOnScreenOnly, kCGNullWindowID,
-                   CGDisplayCreateImage, CGMainDisplayID, CGImageGetWidth, CGImageGetHeight,
-                   CGImageGetBytesPerRow, CGImageGetDataProvider, CGDataProviderCopyData)
-
-def capture_screen():
-    """捕获整个屏幕并返回QImage"""
-    # 使用Quartz直接截取屏幕
+import json
+import os
+import sys
+
+from .capture_backends import create_backend
+
+# 当前使用的截图后端，第一次截图时才创建
+current_backend = None
+
+# 已经获得截屏权限的 Python 解释器，启动时不必再加载 Quartz 检查
+PERMISSION_CACHE = os.path.expanduser("~/.screen_pen/permission.json")
+
+
+def get_backend():
+    """返回当前截图后端，必要时按平台创建"""
+    global current_backend
+    if current_backend is None:
+        current_backend = create_backend()
+    return current_backend
+
+
+def set_backend(backend):
+    """切换截图后端，可以传入后端实例或名称（如 "synthetic"）"""
+    global current_backend
+    if isinstance(backend, str):
+        backend = create_backend(backend)
+    if current_backend is not None and current_backend is not backend:
+        current_backend.close()
+    current_backend = backend
+    return backend
+
+
+def read_permission_cache():
+    try:
+        with open(PERMISSION_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    
+def check_permission(use_cache=True):
+    """检查屏幕录制权限（只有 macOS 需要）
+    
+    只缓存已授权的结果：权限是按可执行文件授予的，授权后通常不会变化；
+    未授权时每次都重新检查，用户在系统设置中授权后重启即可生效。
+    """
+    if sys.platform != "darwin":
+        return True
+    if use_cache and read_permission_cache().get(sys.executable):
+        return True
+    
     try:
-        display_id = CGMainDisplayID()
-        image_ref = CGDisplayCreateImage(display_id)
-        
-        # 转换为QImage - 使用正确的Quartz函数
-        width = CGImageGetWidth(image_ref)
-        height = CGImageGetHeight(image_ref)
-        bytes_per_row = CGImageGetBytesPerRow(image_ref)
-        
-        # 获取像素数据
-        data_provider = CGImageGetDataProvider(image_ref)
-        pixel_data = CGDataProviderCopyData(data_provider)
-        
-        # 将CGImage数据转换为QImage
-        q_image = QImage(pixel_data, width, height, bytes_per_row, QImage.Format.Format_ARGB32)
-        
-        # 适应Qt的BGRA与macOS的ARGB格式转换
-        return q_image.rgbSwapped()
+        granted = get_backend().has_permission()
+    except Exception as e:
+        print(f"权限检查错误: {e}")
+        return False
+    
+    if granted:
+        cache = read_permission_cache()
+        cache[sys.executable] = True
+        try:
+            os.makedirs(os.path.dirname(PERMISSION_CACHE), exist_ok=True)
+            with open(PERMISSION_CACHE, "w") as f:
+                json.dump(cache, f)
+        except OSError as e:
+            print(f"无法保存权限检查结果: {e}")
+    return granted
+
+
+def forget_permission():
+    """截图因为权限失败时清除缓存，下次启动重新检查"""
+    cache = read_permission_cache()
+    if cache.pop(sys.executable, None):
+        try:
+            with open(PERMISSION_CACHE, "w") as f:
+                json.dump(cache, f)
+        except OSError:
+            pass
+
+
+def capture_stats():
+    """返回当前后端的截图耗时统计"""
+    return get_backend().stats.summary()
+
+
+def can_exclude_own_windows():
+    """当前后端能否在截图时直接排除本程序的窗口"""
+    try:
+        return get_backend().can_exclude_own_windows
+    except Exception:
+        return False
+
+
+def capture_screen(screen=None, exclude_own_windows=False):
+    """捕获整个屏幕并返回QImage（screen 为 None 时截取主屏幕）
+    
+    exclude_own_windows 为 True 时不包含本程序的窗口，需要后端支持。
+    """
+    try:
+        backend = get_backend()
+        image = backend.capture(screen, exclude_own_windows)
+        # 复用缓冲区的后端返回的图像会被下一次截图覆盖，这里返回独立的副本
+        if backend.frames_are_transient:
+            image = image.copy()
+        return image
     except Exception as e:
         print(f"截图失败: {e}")
+        # 可能是权限被撤销了，下次启动时重新检查
+        forget_permission()
+        return None
+
+
+def capture_region(rect, screen=None):
+    """只截取全局逻辑坐标 rect 内的区域并返回QImage，比截全屏后裁剪快得多"""
+    try:
+        backend = get_backend()
+        image = backend.capture_region(rect, screen)
+        if image is not None and backend.frames_are_transient:
+            image = image.copy()
+        return image
+    except Exception as e:
+        print(f"区域截图失败: {e}")
+        return None
+
+
+def capture_cursor_region(size=64):
+    """截取鼠标周围 size x size 的区域（取色器、放大镜等高频场景使用）"""
+    try:
+        backend = get_backend()
+        image = backend.capture_cursor_region(size)
+        if image is not None and backend.frames_are_transient:
+            image = image.copy()
+        return image
+    except Exception as e:
+        print(f"区域截图失败: {e}")
         return None
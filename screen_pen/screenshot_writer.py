@@ -0,0 +1,162 @@
+import math
+import os
+import time
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, QImageWriter
+
+from .compositor import composite_tiles
+
+# 格式名称 -> (Qt 格式, 扩展名, 文件对话框中的说明)
+FORMATS = {
+    "png": ("png", ".png", "PNG 图片 (*.png)"),
+    "png-fast": ("png", ".png", "PNG 快速无损 (*.png)"),
+    "jpeg": ("jpeg", ".jpg", "JPEG 图片 (*.jpg *.jpeg)"),
+    "webp": ("webp", ".webp", "WebP 图片 (*.webp)"),
+    "bmp": ("bmp", ".bmp", "BMP 无压缩 (*.bmp)"),
+}
+
+EXTENSIONS = {
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".webp": "webp",
+    ".bmp": "bmp",
+}
+
+
+def file_filters():
+    """文件对话框使用的过滤器字符串"""
+    return ";;".join(description for _, _, description in FORMATS.values())
+
+
+def format_for_filter(selected_filter):
+    for name, (_, _, description) in FORMATS.items():
+        if description == selected_filter:
+            return name
+    return None
+
+
+def format_for_path(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "png")
+
+
+def png_quality(level):
+    """把 zlib 压缩级别 (0-9) 换算成 Qt PNG 写入器使用的 quality 参数"""
+    level = max(0, min(9, level))
+    return 100 - math.ceil(level * 91 / 9)
+
+
+class SaveSignals(QObject):
+    finished = pyqtSignal(str, bool, str, float)
+
+
+class SaveTask(QRunnable):
+    """在线程池中（可选地叠加墨迹后）编码并写入一张图片"""
+    
+    def __init__(self, image, path, qt_format, quality, overlay_tiles=None, device_pixel_ratio=1.0):
+        super().__init__()
+        self.image = image
+        self.path = path
+        self.qt_format = qt_format
+        self.quality = quality
+        self.overlay_tiles = overlay_tiles
+        self.device_pixel_ratio = device_pixel_ratio
+        self.signals = SaveSignals()
+        
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if self.overlay_tiles is not None:
+                self.image = composite_tiles(self.image, self.overlay_tiles, self.device_pixel_ratio)
+            self.encode()
+            ok, message = True, ""
+        except Exception as e:
+            ok, message = False, str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.signals.finished.emit(self.path, ok, message, elapsed_ms)
+        
+    def encode(self):
+        supported = [bytes(name).decode() for name in QImageWriter.supportedImageFormats()]
+        if self.qt_format not in supported and self.qt_format == "webp":
+            # 没有 Qt WebP 插件时使用 Pillow 编码
+            self.encode_with_pillow()
+            return
+        
+        writer = QImageWriter(self.path, self.qt_format.encode())
+        writer.setQuality(self.quality)
+        if not writer.write(self.image):
+            raise RuntimeError(writer.errorString())
+        
+    def encode_with_pillow(self):
+        from PIL import Image
+        image = self.image.convertToFormat(QImage.Format.Format_RGBA8888)
+        data = image.constBits().asstring(image.sizeInBytes())
+        pil_image = Image.frombuffer("RGBA", (image.width(), image.height()), data,
+                                     "raw", "RGBA", image.bytesPerLine(), 1)
+        pil_image.save(self.path, "WEBP", quality=self.quality)
+
+
+class ScreenshotWriter(QObject):
+    """在后台线程池中编码并保存截图
+    
+    排队中的任务数量有上限，连续按截图键时超出的请求会被拒绝，而不是在内存里堆积整屏图像。
+    保存结束后发出 saved(path, ok, message, elapsed_ms) 信号。
+    """
+    
+    saved = pyqtSignal(str, bool, str, float)
+    
+    def __init__(self, max_pending=2, parent=None):
+        super().__init__(parent)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(max_pending, QThreadPool.globalInstance().maxThreadCount())))
+        
+        # 各格式的压缩参数
+        self.png_level = 6  # zlib 压缩级别 0-9
+        self.png_fast_level = 1
+        self.jpeg_quality = 90
+        self.webp_quality = 90
+        
+    def is_busy(self):
+        return self.pending >= self.max_pending
+    
+    def quality_for(self, image_format):
+        if image_format == "png":
+            return png_quality(self.png_level)
+        if image_format == "png-fast":
+            return png_quality(self.png_fast_level)
+        if image_format == "jpeg":
+            return self.jpeg_quality
+        if image_format == "webp":
+            return self.webp_quality
+        return -1
+    
+    def submit(self, image, path, image_format=None, overlay_tiles=None, device_pixel_ratio=1.0):
+        """提交一张图片，队列已满时返回 False
+        
+        image_format 为 None 时按扩展名判断格式。image 在保存完成前不能被修改。
+        overlay_tiles 不为 None 时，先在工作线程中把这些墨迹瓦片叠加到 image 上。
+        """
+        if self.is_busy():
+            return False
+        image_format = image_format or format_for_path(path)
+        if image_format not in FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        
+        qt_format = FORMATS[image_format][0]
+        task = SaveTask(image, path, qt_format, self.quality_for(image_format),
+                        overlay_tiles, device_pixel_ratio)
+        task.signals.finished.connect(self.on_task_finished)
+        self.pending += 1
+        self.pool.start(task)
+        return True
+    
+    def on_task_finished(self, path, ok, message, elapsed_ms):
+        self.pending -= 1
+        self.saved.emit(path, ok, message, elapsed_ms)
+        
+    def wait_for_done(self, timeout_ms=-1):
+        """等待所有任务完成（退出程序前调用）"""
+        return self.pool.waitForDone(timeout_ms)
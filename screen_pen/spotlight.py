@@ -0,0 +1,152 @@
+"""聚光灯：屏幕变暗，只留下鼠标周围的一块圆形或矩形区域
+
+暗色层不是每次移动都整屏重画：聚光灯所在方块的样子（暗色底、中间挖空、边缘柔和）预先画成遮罩图像缓存起来，
+鼠标移动时只请求重绘聚光灯的旧位置和新位置，重绘时在脏区域内用暗色填充聚光灯以外的部分，再贴上遮罩。
+每次移动的重绘面积以及合成器需要更新的面积都只与聚光灯大小有关，与屏幕大小无关。
+
+穿透模式下绘图层收不到鼠标事件，所以按帧查询鼠标位置，位置不变时什么也不做。
+"""
+from PyQt6.QtCore import QObject, QPoint, QPointF, QRect, QRectF, QTimer, Qt
+from PyQt6.QtGui import QColor, QCursor, QImage, QPainter, QRadialGradient, QRegion
+
+# 聚光灯的半径（矩形为高度的一半）和柔和边缘的宽度（逻辑像素）
+DEFAULT_RADIUS = 160
+FEATHER = 24
+# 聚光灯以外的暗色
+DIM_COLOR = QColor(0, 0, 0, 160)
+# 查询鼠标位置的间隔（毫秒）
+FRAME_INTERVAL_MS = 16
+
+CIRCLE = "circle"
+RECTANGLE = "rectangle"
+
+
+def spot_size(radius, shape):
+    """遮罩方块的逻辑尺寸 (宽, 高)，包含柔和边缘；矩形聚光灯宽是高的两倍，适合照亮一行文字"""
+    height = 2 * (radius + FEATHER)
+    return (2 * height if shape == RECTANGLE else height), height
+
+
+def create_mask(radius, shape, device_pixel_ratio, color=DIM_COLOR):
+    """聚光灯所在方块的遮罩：填满暗色，中间按形状挖空"""
+    width, height = spot_size(radius, shape)
+    image = QImage(round(width * device_pixel_ratio), round(height * device_pixel_ratio),
+                   QImage.Format.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(device_pixel_ratio)
+    image.fill(color)
+    
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_DestinationOut)
+    painter.setPen(Qt.PenStyle.NoPen)
+    if shape == CIRCLE:
+        # 半径以内完全透明，向外 FEATHER 的范围内逐渐变暗
+        outer = radius + FEATHER
+        center = QPointF(outer, outer)
+        gradient = QRadialGradient(center, outer)
+        gradient.setColorAt(radius / outer, QColor(0, 0, 0, 255))
+        gradient.setColorAt(1.0, QColor(0, 0, 0, 0))
+        painter.setBrush(gradient)
+        painter.drawEllipse(center, outer, outer)
+    else:
+        painter.setBrush(QColor(0, 0, 0, 255))
+        painter.drawRoundedRect(QRectF(FEATHER, FEATHER, width - 2 * FEATHER, height - 2 * FEATHER),
+                                FEATHER, FEATHER)
+    painter.end()
+    return image
+
+
+class Spotlight(QObject):
+    """跟随鼠标的聚光灯，所有屏幕的绘图层在 paintEvent 中调用 paint()"""
+    
+    def __init__(self, app, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.active = False
+        self.radius = DEFAULT_RADIUS
+        self.shape = CIRCLE
+        self.cursor = QPoint()
+        self.overlay = None       # 鼠标所在的绘图层，其他屏幕整屏变暗
+        self.spot_rect = QRect()  # 遮罩在该绘图层中的位置
+        
+        # (半径, 形状, 缩放比例) -> 遮罩图像
+        self.masks = {}
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self.tick)
+        
+    def set_active(self, active):
+        """打开或关闭聚光灯，这两次需要重绘整个屏幕"""
+        if active == self.active:
+            return
+        self.active = active
+        self.overlay = None
+        self.spot_rect = QRect()
+        if active:
+            self.tick()
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.masks = {}
+        for overlay in self.app.overlays:
+            overlay.update()
+            
+    def set_shape(self, shape):
+        if shape == self.shape:
+            return
+        self.shape = shape
+        if self.active:
+            self.move_to(self.cursor, force=True)
+            
+    def forget(self, overlay):
+        """屏幕被移除时不再在这个绘图层上绘制"""
+        if self.overlay is overlay:
+            self.overlay = None
+            self.spot_rect = QRect()
+            
+    def tick(self):
+        position = QCursor.pos()
+        if position != self.cursor or self.overlay is None:
+            self.move_to(position)
+            
+    def move_to(self, position, force=False):
+        """聚光灯移到全局坐标 position，只重绘旧位置和新位置"""
+        self.cursor = position
+        overlay = None
+        for candidate in self.app.overlays:
+            if candidate.screen_ref is not None and candidate.screen_ref.geometry().contains(position):
+                overlay = candidate
+                break
+        if overlay is None:
+            return
+        width, height = spot_size(self.radius, self.shape)
+        local = position - overlay.screen_ref.geometry().topLeft()
+        rect = QRect(local.x() - width // 2, local.y() - height // 2, width, height)
+        if rect == self.spot_rect and overlay is self.overlay and not force:
+            return
+        if self.overlay is not None:
+            self.overlay.update(self.spot_rect)
+        self.overlay = overlay
+        self.spot_rect = rect
+        overlay.update(rect)
+        
+    def mask(self, device_pixel_ratio):
+        key = (self.radius, self.shape, device_pixel_ratio)
+        image = self.masks.get(key)
+        if image is None:
+            image = self.masks[key] = create_mask(self.radius, self.shape, device_pixel_ratio)
+        return image
+        
+    def paint(self, painter, overlay, region):
+        """在脏区域内绘制暗色层：聚光灯以外直接填充暗色，聚光灯方块贴上缓存的遮罩"""
+        dirty = region.boundingRect()
+        painter.save()
+        if overlay is self.overlay and self.spot_rect.intersects(dirty):
+            painter.setClipRegion(region.subtracted(QRegion(self.spot_rect)))
+            painter.fillRect(dirty, DIM_COLOR)
+            painter.setClipRegion(region)
+            painter.drawImage(self.spot_rect.topLeft(), self.mask(overlay.canvas.device_pixel_ratio))
+        else:
+            painter.fillRect(dirty, DIM_COLOR)
+        painter.restore()
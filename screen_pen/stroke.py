@@ -0,0 +1,354 @@
+"""笔迹的数据模型
+
+自由笔迹保存在 Stroke 中：坐标和时间放在可增长的 float32 数组里，每个点 8 字节坐标加 4 字节时间，
+不再为每个点创建一个 QPoint；数位板笔迹再为每个点保存 4 字节线宽。
+直线、矩形和椭圆完成后保存为不可变的 ShapeRecord。
+包围盒、命中测试、简化和转换为 QPolygonF 都通过 NumPy 对整段数组一次完成。
+NumPy 在第一次用到时才导入（导入要 100 多毫秒），启动时只需要 array。
+"""
+import math
+from array import array
+from collections import namedtuple
+
+from PyQt6.QtCore import Qt, QPoint, QPointF, QRect, QRectF
+from PyQt6.QtGui import QPolygonF
+
+# 变宽笔迹中每个圆角连接的边数，以及单位圆上对应的点（首尾相同）
+ROUND_JOIN_SEGMENTS = 12
+UNIT_CIRCLE = [(math.cos(2 * math.pi * i / ROUND_JOIN_SEGMENTS), math.sin(2 * math.pi * i / ROUND_JOIN_SEGMENTS))
+               for i in range(ROUND_JOIN_SEGMENTS + 1)]
+
+
+def inflate_rect(rect, pen_width):
+    """按线宽外扩矩形，多留出 1 像素给抗锯齿边缘"""
+    margin = int(pen_width) // 2 + 2
+    return rect.adjusted(-margin, -margin, margin, margin)
+
+
+def points_rect(points):
+    """(n, 2) 坐标数组的包围盒，取整为覆盖全部点的 QRect"""
+    if not len(points):
+        return QRect()
+    left, top = points.min(axis=0).tolist()
+    right, bottom = points.max(axis=0).tolist()
+    return QRectF(left, top, right - left, bottom - top).toAlignedRect()
+
+
+def polygon_from_points(points):
+    """把 (n, 2) 坐标数组直接复制进 QPolygonF 的内存，不逐个创建 QPointF"""
+    import numpy as np
+    count = len(points)
+    polygon = QPolygonF()
+    polygon.resize(count)
+    if count:
+        buffer = polygon.data()
+        buffer.setsize(count * 16)  # QPointF 是两个 double
+        np.frombuffer(buffer, dtype=np.float64)[:] = points.reshape(-1)
+    return polygon
+
+
+def variable_width_outline(points, widths):
+    """变宽折线的填充轮廓，返回一个可以用非零环绕规则一次填充的多边形 (m, 2)
+    
+    每一段是一个两端宽度不同的梯形，每个点是一个圆（圆角连接和端点），全部由 NumPy 一次生成。
+    每个小环从自己的第一个点出发再回到这里，环与环之间的连接边最后原路返回，面积为 0；
+    所有小环方向相同，重叠的部分不会互相抵消。
+    """
+    import numpy as np
+    points = np.asarray(points, dtype=np.float64)
+    radii = np.asarray(widths, dtype=np.float64)[:, None, None] / 2
+    loops = [points[:, None, :] + radii * np.array(UNIT_CIRCLE)]
+    if len(points) > 1:
+        start, end = points[:-1], points[1:]
+        direction = end - start
+        length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        # 与圆同向的法线；零长度的线段法线为 0，梯形退化为一个点
+        normal = np.column_stack((-direction[:, 1], direction[:, 0])) / np.where(length > 0, length, 1.0)
+        r0, r1 = radii[:-1, 0], radii[1:, 0]
+        loops.append(np.stack((start - normal * r0, end - normal * r1, end + normal * r1,
+                               start + normal * r0, start - normal * r0), axis=1))
+    rings = np.concatenate([loop.reshape(-1, 2) for loop in loops])
+    anchors = np.concatenate([loop[:, 0] for loop in loops])
+    return np.concatenate((rings, anchors[-2::-1]))
+
+
+def fill_outline(painter, outline):
+    """用画笔的颜色（橡皮擦是透明色）填充轮廓，不描边"""
+    brush = painter.pen().brush()
+    painter.save()
+    painter.setPen(Qt.PenStyle.NoPen)
+    painter.setBrush(brush)
+    painter.drawPolygon(polygon_from_points(outline), Qt.FillRule.WindingFill)
+    painter.restore()
+
+
+def point_segment_distance(px, py, x0, y0, x1, y1):
+    """点到线段的距离，参数可以是任意可广播的数组"""
+    return point_segment_geometry(px, py, x0, y0, x1, y1)[0]
+
+
+def point_segment_geometry(px, py, x0, y0, x1, y1):
+    """点到线段的距离，以及点在线段所在直线哪一侧（叉积的符号）"""
+    import numpy as np
+    dx = x1 - x0
+    dy = y1 - y0
+    ux = px - x0
+    uy = py - y0
+    length2 = dx * dx + dy * dy
+    # 投影到线段上并截断到端点，零长度线段按起点计算
+    t = (ux * dx + uy * dy) / np.where(length2 > 0, length2, 1.0)
+    np.clip(t, 0.0, 1.0, out=t)
+    return np.hypot(t * dx - ux, t * dy - uy), dx * uy - dy * ux
+
+
+def segment_distances(points, x, y):
+    """点 (x, y) 到折线每一段的距离；只有一个点时返回到该点的距离"""
+    import numpy as np
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 1:
+        return np.hypot(points[:, 0] - x, points[:, 1] - y)
+    start = points[:-1]
+    end = points[1:]
+    return point_segment_distance(x, y, start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+
+
+def segment_pair_distances(a0, a1, b0, b1):
+    """m 条线段 a0-a1 与 k 条线段 b0-b1 两两之间的最短距离，返回 (m, k)
+    
+    两条线段相交时距离为 0，否则是四个端点到另一条线段距离的最小值。
+    a 的两个端点到 b、b 的两个端点到 a 这四组计算放进同一个 (4, m, k) 数组，一次完成。
+    """
+    import numpy as np
+    ax0, ay0 = a0[:, 0, None], a0[:, 1, None]
+    ax1, ay1 = a1[:, 0, None], a1[:, 1, None]
+    bx0, by0, bx1, by1 = b0[:, 0], b0[:, 1], b1[:, 0], b1[:, 1]
+    px, py, x0, y0, x1, y1 = np.empty((6, 4, len(a0), len(b0)))
+    px[0], px[1], px[2], px[3] = ax0, ax1, bx0, bx1
+    py[0], py[1], py[2], py[3] = ay0, ay1, by0, by1
+    x0[:2], y0[:2], x1[:2], y1[:2] = bx0, by0, bx1, by1
+    x0[2:], y0[2:], x1[2:], y1[2:] = ax0, ay0, ax1, ay1
+    distances, sides = point_segment_geometry(px, py, x0, y0, x1, y1)
+    distances = distances.min(axis=0)
+    # 两个端点分别位于另一条线段的两侧时相交
+    distances[(sides[0] * sides[1] < 0) & (sides[2] * sides[3] < 0)] = 0.0
+    return distances
+
+
+def polyline_segments(points):
+    """折线的线段起点和终点；只有一个点时返回一条零长度线段"""
+    if len(points) == 1:
+        return points, points
+    return points[:-1], points[1:]
+
+
+def polylines_hit(path, polylines, thresholds, bounds=None):
+    """path 与每条折线的最短距离是否不超过对应的阈值，返回布尔数组
+    
+    polylines 是 x, y 交错的 array('f')，先按字节拼接成一个数组（不为每条折线创建 NumPy 视图），
+    再一次算出 path 的每一段与全部线段的距离；
+    bounds (left, top, right, bottom) 用于先丢掉包围盒不与 path 附近相交的线段。
+    """
+    import numpy as np
+    lengths = np.fromiter((len(polyline) // 2 for polyline in polylines), dtype=np.intp, count=len(polylines))
+    points = np.frombuffer(b"".join(polylines), dtype=np.float32).reshape(-1, 2).astype(np.float64)
+    owners = np.repeat(np.arange(len(polylines)), lengths)
+    
+    # 第 i 条线段连接第 i 和 i+1 个点；每条折线的最后一个点不再连接下一条折线，
+    # 只有一个点的折线保留一条零长度线段
+    ends = np.empty_like(points)
+    ends[:-1] = points[1:]
+    last = np.cumsum(lengths) - 1
+    ends[last] = points[last]
+    valid = np.ones(len(points), dtype=bool)
+    valid[last[lengths > 1]] = False
+    if bounds is not None:
+        left, top, right, bottom = bounds
+        valid &= ((np.maximum(points[:, 0], ends[:, 0]) >= left) & (np.minimum(points[:, 0], ends[:, 0]) <= right)
+                  & (np.maximum(points[:, 1], ends[:, 1]) >= top) & (np.minimum(points[:, 1], ends[:, 1]) <= bottom))
+    starts, ends, owners = points[valid], ends[valid], owners[valid]
+    
+    hits = np.zeros(len(polylines), dtype=bool)
+    if not len(owners):
+        return hits
+    path = np.asarray(path, dtype=np.float64)
+    path_starts, path_ends = polyline_segments(path)
+    distances = segment_pair_distances(path_starts, path_ends, starts, ends).min(axis=0)
+    hits[owners[distances <= np.asarray(thresholds, dtype=np.float64)[owners]]] = True
+    return hits
+
+
+def simplify_indices(points, tolerance):
+    """Ramer-Douglas-Peucker 简化，返回保留下来的点的下标
+    
+    用显式栈代替递归，每一段内到弦的距离用 NumPy 一次算完。
+    """
+    import numpy as np
+    count = len(points)
+    if count < 3:
+        return np.arange(count)
+    points = np.asarray(points, dtype=np.float64)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inner = points[first + 1:last]
+        start = points[first]
+        dx, dy = points[last] - start
+        norm = np.hypot(dx, dy)
+        if norm > 0:
+            distances = np.abs(dx * (inner[:, 1] - start[1]) - dy * (inner[:, 0] - start[0])) / norm
+        else:
+            distances = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            middle = first + 1 + index
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return np.flatnonzero(keep)
+
+
+def float_array(values):
+    """把任意数值序列转换为 array('f')"""
+    import numpy as np
+    result = array("f")
+    result.frombytes(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+    return result
+
+
+class Stroke:
+    """一条自由笔迹（画笔或橡皮）
+    
+    xy 是 x, y 交错的 array('f')，times 是每个点相对笔迹开始的秒数。
+    widths 是数位板笔迹每个点的线宽（像素，不超过对象的线宽）；鼠标笔迹为 None，按对象的线宽描边。
+    NumPy 视图只在单次调用内使用，不能保存下来，否则数组无法继续增长。
+    """
+    
+    __slots__ = ("tool", "xy", "times", "widths", "bounds")
+    
+    def __init__(self, tool, xy=None, times=None, widths=None):
+        self.tool = tool      # 工具类，决定日志中的工具编号
+        self.xy = xy if xy is not None else array("f")
+        self.times = times if times is not None else array("f")
+        self.widths = widths
+        self.bounds = None    # 缓存的包围盒
+        
+    @classmethod
+    def from_arrays(cls, tool, xy, times, widths=None):
+        """用任意数值数组（例如日志中的 int16 坐标）创建笔迹"""
+        return cls(tool, float_array(xy), float_array(times), None if widths is None else float_array(widths))
+        
+    def __len__(self):
+        return len(self.xy) // 2
+        
+    def append(self, x, y, t=0.0, width=None):
+        self.xy.append(x)
+        self.xy.append(y)
+        self.times.append(t)
+        if self.widths is not None:
+            self.widths.append(width)
+        self.bounds = None
+        
+    def extend(self, samples):
+        """追加一批 (x, y, t) 采样点，数位板笔迹的采样点是 (x, y, t, 线宽)"""
+        self.xy.extend([value for sample in samples for value in sample[:2]])
+        self.times.extend([sample[2] for sample in samples])
+        if self.widths is not None:
+            self.widths.extend([sample[3] for sample in samples])
+        self.bounds = None
+        
+    def points(self, first=0, last=None):
+        """[first, last) 之间的点，形状为 (n, 2) 的 float32 视图"""
+        import numpy as np
+        return np.frombuffer(self.xy, dtype=np.float32).reshape(-1, 2)[first:last]
+        
+    @property
+    def duration(self):
+        return self.times[-1] if self.times else 0.0
+        
+    def points_rect(self, first=0):
+        """从 first 开始的点的包围盒（不含线宽），整条笔迹的结果会被缓存"""
+        if first:
+            return points_rect(self.points(first))
+        if self.bounds is None:
+            self.bounds = points_rect(self.points())
+        return self.bounds
+        
+    def bounding_rect(self, pen_width, first=0):
+        """笔迹（或从 first 开始的一段）覆盖的区域，按线宽向外扩展"""
+        return inflate_rect(self.points_rect(first), pen_width)
+        
+    def polygon(self, first=0, last=None):
+        return polygon_from_points(self.points(first, last))
+        
+    def draw(self, painter, first=0):
+        """画出从 first 开始的折线；只有一两个点时画一条线段
+        
+        变宽笔迹不逐段描边，而是生成整段的填充轮廓，一次 drawPolygon 画完。
+        """
+        import numpy as np
+        points = self.points(first)
+        count = len(points)
+        if self.widths is not None:
+            if count:
+                widths = np.frombuffer(self.widths, dtype=np.float32)[first:]
+                fill_outline(painter, variable_width_outline(points, widths))
+        elif count > 2:
+            painter.drawPolyline(polygon_from_points(points))
+        elif count:
+            (x0, y0), (x1, y1) = points[0].tolist(), points[-1].tolist()
+            painter.drawLine(QPointF(x0, y0), QPointF(x1, y1))
+            
+    def outline(self):
+        """命中测试用的折线：x, y 交错的 array('f')，就是笔迹本身"""
+        return self.xy
+        
+    def hit_test(self, x, y, radius):
+        """点 (x, y) 是否在笔迹的 radius 范围内"""
+        points = self.points()
+        if not len(points):
+            return False
+        return bool(segment_distances(points, x, y).min() <= radius)
+        
+    def simplify(self, tolerance):
+        """返回简化后的新笔迹，保留首尾点和对应的时间、线宽"""
+        import numpy as np
+        keep = simplify_indices(self.points(), tolerance)
+        times = np.frombuffer(self.times, dtype=np.float32)
+        widths = None if self.widths is None else np.frombuffer(self.widths, dtype=np.float32)[keep]
+        return Stroke.from_arrays(self.tool, self.points()[keep], times[keep], widths)
+
+
+class ShapeRecord(namedtuple("ShapeRecord", ["tool", "x0", "y0", "x1", "y1"])):
+    """完成后的直线、矩形或椭圆：工具类和两个端点，创建后不再修改"""
+    
+    __slots__ = ()
+    
+    @property
+    def start_point(self):
+        return QPoint(self.x0, self.y0)
+        
+    @property
+    def end_point(self):
+        return QPoint(self.x1, self.y1)
+        
+    def points(self):
+        import numpy as np
+        return np.array([[self.x0, self.y0], [self.x1, self.y1]], dtype=np.float32)
+        
+    def bounding_rect(self, pen_width):
+        return inflate_rect(QRect(self.start_point, self.end_point).normalized(), pen_width)
+        
+    def draw(self, painter):
+        self.tool.draw_shape(painter, self.start_point, self.end_point)
+        
+    def outline(self):
+        """图形轮廓的折线，x, y 交错的 array('f')，用于命中测试"""
+        return float_array(self.tool.outline(self.x0, self.y0, self.x1, self.y1))
+        
+    def hit_test(self, x, y, radius):
+        outline = self.tool.outline(self.x0, self.y0, self.x1, self.y1)
+        return bool(segment_distances(outline, x, y).min() <= radius)
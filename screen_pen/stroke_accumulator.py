@@ -0,0 +1,58 @@
+from PyQt6.QtCore import QObject, QTimer, Qt
+
+
+class StrokeAccumulator(QObject):
+    """收集高频输入点，每个显示帧把整批点一次性交给回调绘制
+    
+    鼠标和数位板的事件频率可达 500~1000 Hz，逐点创建 QPainter 会占满 GUI 线程。
+    这里把点先放进缓冲区，定时器按刷新率触发，一帧只绘制一次。
+    """
+    
+    def __init__(self, flush_callback, frame_rate=60, max_latency_ms=16, parent=None):
+        super().__init__(parent)
+        self.flush_callback = flush_callback
+        self.points = []
+        
+        self.frame_rate = frame_rate
+        self.max_latency_ms = max_latency_ms
+        
+        # 单次定时器：缓冲区从空变为非空时启动，空闲时不占用 CPU
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+        self.update_interval()
+        
+    def set_frame_rate(self, frame_rate):
+        """设置刷新率（通常取屏幕刷新率，如 60 或 120）"""
+        self.frame_rate = frame_rate
+        self.update_interval()
+        
+    def set_max_latency(self, max_latency_ms):
+        """设置输入点在缓冲区中允许停留的最长时间（毫秒）"""
+        self.max_latency_ms = max_latency_ms
+        self.update_interval()
+        
+    def update_interval(self):
+        frame_interval = 1000.0 / self.frame_rate if self.frame_rate > 0 else 16.0
+        interval = min(frame_interval, self.max_latency_ms)
+        self.timer.setInterval(max(1, int(interval)))
+        
+    def add_point(self, point):
+        self.points.append(point)
+        if not self.timer.isActive():
+            self.timer.start()
+            
+    def flush(self):
+        """立即把缓冲区中的点交给回调，松开鼠标时调用以免丢点"""
+        self.timer.stop()
+        if not self.points:
+            return
+        points = self.points
+        self.points = []
+        self.flush_callback(points)
+        
+    def discard(self):
+        """丢弃未绘制的点（例如绘图被中断时）"""
+        self.timer.stop()
+        self.points = []
@@ -0,0 +1,144 @@
+import math
+
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QImage, QPainter
+
+# 画布瓦片大小（逻辑像素）
+TILE_SIZE = 256
+
+
+def tile_rects(rect, tile_size=TILE_SIZE):
+    """返回覆盖 rect 的所有瓦片矩形"""
+    if rect.isEmpty():
+        return []
+    return [tile_rect(key, tile_size) for key in tile_keys(rect, tile_size)]
+
+
+def tile_keys(rect, tile_size=TILE_SIZE):
+    """返回覆盖 rect 的所有瓦片编号 (tx, ty)"""
+    if rect.isEmpty():
+        return []
+    return [(tx, ty)
+            for ty in range(rect.top() // tile_size, rect.bottom() // tile_size + 1)
+            for tx in range(rect.left() // tile_size, rect.right() // tile_size + 1)]
+
+
+def tile_rect(key, tile_size=TILE_SIZE):
+    return QRect(key[0] * tile_size, key[1] * tile_size, tile_size, tile_size)
+
+
+class TiledCanvas:
+    """稀疏的瓦片画布：瓦片在第一次被绘制时才分配
+    
+    大多数标注只覆盖屏幕的一小部分，没有墨迹的区域不占内存，
+    绘制到窗口和清屏的开销也只与已分配的瓦片数量有关。
+    
+    坐标使用逻辑像素，瓦片按 device_pixel_ratio 以物理像素分配，
+    在 HiDPI 屏幕上绘制时不需要缩放。
+    """
+    
+    def __init__(self, width, height, tile_size=TILE_SIZE, device_pixel_ratio=1.0):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.device_pixel_ratio = device_pixel_ratio
+        self.tiles = {}
+        
+    def rect(self):
+        return QRect(0, 0, self.width, self.height)
+    
+    def size(self):
+        return self.rect().size()
+    
+    def is_empty(self):
+        return not self.tiles
+    
+    def nbytes(self):
+        return sum(image.sizeInBytes() for image in self.tiles.values())
+    
+    def keys_in(self, rect):
+        """返回 rect 覆盖的、位于画布范围内的瓦片编号"""
+        return tile_keys(rect.intersected(self.rect()), self.tile_size)
+    
+    def tile_rect(self, key):
+        return tile_rect(key, self.tile_size)
+    
+    def new_tile(self, key):
+        """分配（或重置为透明）一个瓦片"""
+        pixels = math.ceil(self.tile_size * self.device_pixel_ratio)
+        image = QImage(pixels, pixels, QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(self.device_pixel_ratio)
+        image.fill(Qt.GlobalColor.transparent)
+        self.tiles[key] = image
+        return image
+    
+    def tile(self, key):
+        return self.tiles.get(key)
+    
+    def set_tile(self, key, image):
+        """替换瓦片内容，image 为 None 表示该瓦片为空"""
+        if image is None:
+            self.tiles.pop(key, None)
+        else:
+            self.tiles[key] = image
+            
+    def drop_tile(self, key):
+        self.tiles.pop(key, None)
+        
+    def painters(self, rect, allocate=True):
+        """依次为 rect 覆盖的每个瓦片生成一个使用画布坐标的 QPainter
+        
+        allocate 为 False 时跳过未分配的瓦片（例如橡皮擦不需要在空白处分配瓦片）。
+        """
+        for key in self.keys_in(rect):
+            image = self.tiles.get(key)
+            if image is None:
+                if not allocate:
+                    continue
+                image = self.new_tile(key)
+            painter = QPainter(image)
+            painter.translate(-key[0] * self.tile_size, -key[1] * self.tile_size)
+            yield painter
+            painter.end()
+            
+    def draw(self, painter, rect):
+        """把与 rect 相交的已分配瓦片绘制到 painter 上"""
+        for key in self.keys_in(rect):
+            image = self.tiles.get(key)
+            if image is not None:
+                painter.drawImage(self.tile_rect(key).topLeft(), image)
+                
+    def clear(self):
+        self.tiles = {}
+        
+    def clear_rect(self, rect):
+        """清除 rect 内的像素，完全被覆盖的瓦片直接释放"""
+        for key in self.keys_in(rect):
+            image = self.tiles.get(key)
+            if image is None:
+                continue
+            tile = self.tile_rect(key)
+            if rect.contains(tile):
+                del self.tiles[key]
+                continue
+            painter = QPainter(image)
+            painter.translate(-tile.x(), -tile.y())
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
+            painter.fillRect(rect, Qt.GlobalColor.transparent)
+            painter.end()
+            
+    def snapshot(self):
+        """返回已分配瓦片的隐式共享副本 [(左上角, QImage)]，可以交给工作线程使用"""
+        return [(self.tile_rect(key).topLeft(), QImage(image)) for key, image in self.tiles.items()]
+    
+    def to_image(self):
+        """合成为一张完整的 QImage（物理像素分辨率）"""
+        image = QImage(math.ceil(self.width * self.device_pixel_ratio),
+                       math.ceil(self.height * self.device_pixel_ratio),
+                       QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(self.device_pixel_ratio)
+        image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(image)
+        self.draw(painter, self.rect())
+        painter.end()
+        return image
@@ -7,11 +7,13 @@ setup(
     install_requires=[
         "PyQt6>=6.5.0",
         "Pillow>=9.5.0",
-        "pyobjc-framework-Quartz>=9.0.1",
+        "numpy>=1.24",
+        "pyobjc-framework-Quartz>=9.0.1; sys_platform == 'darwin'",
     ],
     entry_points={
         'console_scripts': [
             'screen-pen=main:main',
+            'screen-pen-render=screen_pen.batch:main',
         ],
     },
     author="Your Name",
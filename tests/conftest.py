@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+# 测试不需要显示器
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qt_app():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(["screen-pen-tests"])
+
+
+@pytest.fixture
+def pen_app(qt_app, tmp_path, monkeypatch):
+    """处于绘图模式的 ScreenPenApp，会话日志写入临时目录"""
+    monkeypatch.setenv("SCREEN_PEN_JOURNAL_DIR", str(tmp_path))
+    from screen_pen.app import ScreenPenApp
+    window = ScreenPenApp()
+    window.show()
+    window.toggle_drawing_mode(True)
+    yield window
+    window.close_app()
+
+
+def send_mouse(widget, kind, x, y):
+    from PyQt6.QtCore import QEvent, QPointF, Qt
+    from PyQt6.QtGui import QMouseEvent
+    from PyQt6.QtWidgets import QApplication
+    event_type = {
+        "press": QEvent.Type.MouseButtonPress,
+        "move": QEvent.Type.MouseMove,
+        "release": QEvent.Type.MouseButtonRelease,
+    }[kind]
+    buttons = Qt.MouseButton.NoButton if kind == "release" else Qt.MouseButton.LeftButton
+    position = QPointF(x, y)
+    QApplication.sendEvent(widget, QMouseEvent(event_type, position, position, Qt.MouseButton.LeftButton,
+                                               buttons, Qt.KeyboardModifier.NoModifier))
+
+
+@pytest.fixture
+def drag(pen_app, qt_app):
+    """在主屏幕的绘图层上用 tool 拖过 points
+    
+    switch_to 不为 None 时在拖动途中切换工具；during 不为 None 时在拖动途中调用它。
+    """
+    def drag(tool, points, switch_to=None, during=None):
+        overlay = pen_app.overlay
+        pen_app.quick_change_tool(tool)
+        send_mouse(overlay, "press", *points[0])
+        for index, point in enumerate(points[1:-1]):
+            if index == len(points) // 2:
+                if switch_to is not None:
+                    pen_app.quick_change_tool(switch_to)
+                if during is not None:
+                    during()
+            send_mouse(overlay, "move", *point)
+        send_mouse(overlay, "release", *points[-1])
+        qt_app.processEvents()
+    return drag
@@ -0,0 +1,68 @@
+"""撤销/重做：内存预算和绘制途中的操作"""
+import random
+
+from PyQt6.QtGui import QImage, QPainter
+
+BUDGET_MB = 4
+STROKES = 10000
+
+
+def canvas_image(overlay):
+    """把绘图层的画布合成为一张图像，用于比较撤销前后的像素"""
+    image = QImage(overlay.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(0)
+    painter = QPainter(image)
+    overlay.canvas.draw(painter, image.rect())
+    painter.end()
+    return image
+
+
+def saved_tile_bytes(history):
+    """历史步骤中实际保存的瓦片字节数，用来核对 History.nbytes 的记账"""
+    steps = list(history.undo_steps) + history.redo_steps
+    return sum(image.sizeInBytes() for step in steps for image in step.tiles.values() if image is not None)
+
+
+def test_history_stays_within_budget(pen_app, drag):
+    """一万笔短笔迹之后，历史记录占用的内存不超过预算，淘汰旧记录后撤销、重做仍然正确"""
+    history = pen_app.history
+    history.set_budget(BUDGET_MB)
+    overlay = pen_app.overlay
+    rng = random.Random(4)
+    width, height = overlay.width(), overlay.height()
+    for index in range(STROKES):
+        x, y = rng.uniform(0, width - 40), rng.uniform(0, height - 40)
+        drag("画笔", [(x + i * 4, y + (i % 3) * 4) for i in range(8)])
+        if index % 100 == 0:
+            assert history.nbytes <= history.budget_bytes
+    assert history.nbytes <= history.budget_bytes
+    assert history.nbytes == saved_tile_bytes(history)
+    # 确实发生了淘汰，否则这个测试没有意义
+    assert 1 < len(history.undo_steps) < STROKES
+    
+    before = canvas_image(overlay)
+    count = len(overlay.scene)
+    drag("画笔", [(30, 30), (200, 120), (400, 90)])
+    after = canvas_image(overlay)
+    assert after != before
+    
+    pen_app.undo()
+    assert len(overlay.scene) == count
+    assert canvas_image(overlay) == before
+    pen_app.redo()
+    assert len(overlay.scene) == count + 1
+    assert canvas_image(overlay) == after
+    assert history.nbytes <= history.budget_bytes
+
+
+def test_clear_is_ignored_while_drawing(pen_app, drag):
+    """绘制途中清屏会替换掉这一笔的历史步骤，所以和翻页、撤销一样，绘制时不响应"""
+    drag("画笔", [(20, 20), (60, 40), (100, 60)])
+    drag("画笔", [(20, 80), (40, 90), (60, 100), (80, 110), (100, 120)], during=pen_app.clear_canvas)
+    
+    history = pen_app.history
+    assert history.current is None
+    assert len(pen_app.overlay.scene) == 2
+    assert len(history.undo_steps) == 2
+    pen_app.undo()
+    assert len(pen_app.overlay.scene) == 1
@@ -0,0 +1,62 @@
+"""笔迹日志：不经过 close_app 退出时记录不丢失，没有画任何东西时不留下文件"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from screen_pen.journal import load_journal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STROKES = 3
+
+# 画几笔之后用 how 指定的方式退出：quit 相当于 Cmd+Q、注销，exit 相当于进程被直接结束
+SCRIPT = """
+import os, sys, time
+sys.path.insert(0, "tests")
+from conftest import send_mouse
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+app = QApplication([])
+from screen_pen.app import ScreenPenApp
+window = ScreenPenApp()
+window.show()
+window.toggle_drawing_mode(True)
+window.quick_change_tool("画笔")
+for index in range({strokes}):
+    y = 40 + index * 60
+    send_mouse(window.overlay, "press", 40, y)
+    for x in range(60, 300, 20):
+        send_mouse(window.overlay, "move", x, y + x % 30)
+    send_mouse(window.overlay, "release", 300, y)
+app.processEvents()
+if "{how}" == "exit":
+    time.sleep(0.3)
+    os._exit(0)
+QTimer.singleShot(300, QApplication.quit)
+app.exec()
+"""
+
+
+def run_session(tmp_path, how, strokes=STROKES):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", SCREEN_PEN_JOURNAL_DIR=str(tmp_path))
+    subprocess.run([sys.executable, "-c", SCRIPT.format(strokes=strokes, how=how)], cwd=ROOT, env=env,
+                   check=True, capture_output=True, timeout=60)
+    return sorted(tmp_path.glob("*.spj"))
+
+
+@pytest.mark.parametrize("how", ["quit", "exit"])
+def test_session_survives_quit_without_close_app(tmp_path, how):
+    paths = run_session(tmp_path, how)
+    assert len(paths) == 1
+    journal = load_journal(str(paths[0]))
+    assert len(journal.final_strokes()) == STROKES
+
+
+def test_empty_session_leaves_no_file(tmp_path):
+    assert run_session(tmp_path, "quit", strokes=0) == []
+
+
+def test_empty_session_removed_by_close_app(pen_app, tmp_path):
+    pen_app.close_app()
+    assert list(tmp_path.glob("*.spj")) == []
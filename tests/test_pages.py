@@ -0,0 +1,81 @@
+"""白板分页：临时文件的空间复用和压缩失败的页"""
+from screen_pen import pages
+
+from test_history import canvas_image
+
+PAGES = 4
+
+
+def settle(pen_app, qt_app):
+    """等翻页之后提交的压缩和预取完成，结果回到 GUI 线程"""
+    qt_app.processEvents()
+    pen_app.pages.pool.waitForDone()
+    qt_app.processEvents()
+
+
+def draw_pages(pen_app, qt_app, drag):
+    """每页画几笔，返回各页的画面"""
+    images = []
+    for index in range(PAGES):
+        if index:
+            pen_app.new_page()
+        for row in range(index + 2):
+            y = 40 + row * 60
+            drag("画笔", [(40 + i * 30, y + (i % 2) * 20) for i in range(12)])
+        images.append(canvas_image(pen_app.overlay))
+        settle(pen_app, qt_app)
+    return images
+
+
+def test_spill_file_reuses_space(pen_app, qt_app, drag):
+    """反复在写入临时文件的页之间跳转，文件不会越来越大，换回来的页内容不变"""
+    images = draw_pages(pen_app, qt_app, drag)
+    store = pen_app.pages
+    store.memory_bytes = 1
+    
+    order = [0, PAGES - 1, 1, PAGES - 1, 0, 2]
+    for index in order:
+        pen_app.show_page(index)
+        assert canvas_image(pen_app.overlay) == images[index]
+        settle(pen_app, qt_app)
+    peak = store.spill_size
+    assert peak > 0
+    
+    for _ in range(10):
+        for index in order:
+            pen_app.show_page(index)
+            assert canvas_image(pen_app.overlay) == images[index]
+            settle(pen_app, qt_app)
+        assert store.spill_size <= peak
+    # 活动页和写入文件的页的区域不重叠
+    extents = sorted(page.spill_extent for page in store.pages if page.spill_extent is not None)
+    extents += sorted(store.spill_free)
+    extents.sort()
+    for (offset, length), (next_offset, _) in zip(extents, extents[1:]):
+        assert offset + length <= next_offset
+
+
+def test_failed_pack_keeps_tiles(pen_app, qt_app, drag, monkeypatch):
+    """压缩失败的页保留原始瓦片，不会被写入临时文件，换回来时内容不变"""
+    drag("画笔", [(40 + i * 30, 80 + (i % 2) * 20) for i in range(12)])
+    image = canvas_image(pen_app.overlay)
+    
+    def fail(tiles):
+        raise MemoryError("测试")
+    monkeypatch.setattr(pages, "pack_tiles", fail)
+    pen_app.new_page()
+    settle(pen_app, qt_app)
+    monkeypatch.undo()
+    
+    store = pen_app.pages
+    store.memory_bytes = 1
+    page = store.pages[0]
+    assert all(layer.packed is None and layer.tiles for layer in page.layers.values())
+    store.spill(page)
+    assert page.spill_extent is None
+    
+    pen_app.new_page()
+    drag("画笔", [(40, 40), (200, 200)])
+    pen_app.show_page(0)
+    settle(pen_app, qt_app)
+    assert canvas_image(pen_app.overlay) == image
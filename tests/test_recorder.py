@@ -0,0 +1,112 @@
+"""录屏：实际帧率的统计、停止时不阻塞界面、编码器打开失败和标注合成"""
+import time
+
+import pytest
+
+from screen_pen import screen_capture
+from screen_pen.capture_backends.synthetic import SyntheticBackend
+from screen_pen.recorder import FFmpegEncoder, ImageSequenceEncoder, Recorder
+
+FPS = 10
+
+
+class SlowCloseEncoder(ImageSequenceEncoder):
+    """写入很快、结束时要等一会儿的编码器，就像 ffmpeg 收尾写 MP4 索引"""
+    
+    def write(self, image):
+        self.frame_number += 1
+        
+    def close(self):
+        time.sleep(1.0)
+
+
+class BrokenEncoder(ImageSequenceEncoder):
+    """打不开的编码器，记录尝试打开的次数"""
+    
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.open_count = 0
+        
+    def open(self, width, height, fps):
+        self.open_count += 1
+        raise RuntimeError("找不到 ffmpeg")
+
+
+def run_events(qt_app, seconds, until=None):
+    """处理事件 seconds 秒，until() 为真时提前结束"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline and not (until and until()):
+        qt_app.processEvents()
+        time.sleep(0.002)
+
+
+@pytest.fixture
+def synthetic_backend():
+    backend = screen_capture.set_backend(SyntheticBackend(320, 180))
+    yield backend
+    screen_capture.set_backend(None)
+
+
+def test_achieved_fps_excludes_encoder_drain(qt_app, synthetic_backend, tmp_path):
+    """实际帧率只按第一帧到最后一帧的截图时间计算，停止时等待编码器收尾不算在内"""
+    recorder = Recorder(lambda: synthetic_backend.capture(None), SlowCloseEncoder(str(tmp_path)), fps=FPS)
+    results = []
+    recorder.finished.connect(results.append)
+    recorder.start()
+    run_events(qt_app, 1.0)
+    # 停止只是通知编码线程，编码器收尾的 1 秒不能卡住 GUI 线程
+    started = time.perf_counter()
+    recorder.stop()
+    assert time.perf_counter() - started < 0.2
+    run_events(qt_app, 5.0, until=lambda: results)
+    assert len(results) == 1
+    assert time.perf_counter() - started > 0.9
+    stats = results[0]
+    
+    assert stats["error"] is None
+    assert stats["encoded"] > 2
+    assert FPS * 0.7 <= stats["achieved_fps"] <= FPS * 1.3
+
+
+def test_encoder_open_failure_stops_once(qt_app, synthetic_backend, tmp_path):
+    """编码器打开失败时只尝试一次，录制自行停止，结果中给出原因"""
+    encoder = BrokenEncoder(str(tmp_path))
+    recorder = Recorder(lambda: synthetic_backend.capture(None), encoder, fps=FPS)
+    results = []
+    recorder.finished.connect(results.append)
+    recorder.start()
+    run_events(qt_app, 2.0, until=lambda: results)
+    
+    assert encoder.open_count == 1
+    assert not recorder.is_recording()
+    assert len(results) == 1
+    assert results[0]["error"] == "找不到 ffmpeg"
+    assert results[0]["encoded"] == 0
+    recorder.wait()
+
+
+@pytest.mark.parametrize("can_exclude", [True, False])
+def test_annotations_composited_only_when_excluded(pen_app, synthetic_backend, tmp_path, monkeypatch, can_exclude):
+    """后端不能排除本程序的窗口时，截图里已经有墨迹，不能再合成一次"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(FFmpegEncoder, "available", staticmethod(lambda: False))
+    synthetic_backend.can_exclude_own_windows = can_exclude
+    pen_app.start_recording()
+    try:
+        assert (pen_app.recorder.annotation_source is not None) == can_exclude
+    finally:
+        pen_app.stop_recording()
+    assert pen_app.recorder is None
+
+
+def test_app_reports_recording_after_encoding(pen_app, qt_app, synthetic_backend, tmp_path, monkeypatch):
+    """停止录制后界面立即恢复，编码完成后状态栏显示统计结果"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(FFmpegEncoder, "available", staticmethod(lambda: False))
+    pen_app.start_recording()
+    run_events(qt_app, 0.5)
+    pen_app.stop_recording()
+    assert not pen_app.control_panel.record_btn.isChecked()
+    run_events(qt_app, 10.0, until=lambda: not pen_app.finishing_recorders)
+    assert pen_app.finishing_recorders == []
+    assert pen_app.status_bar.currentMessage().startswith("录制结束")
@@ -0,0 +1,17 @@
+"""启动路径：导入主窗口时不加载只在绘图、导出、录屏时才用到的重量级模块"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 这些模块各要几十到一百多毫秒，只能在第一次用到时导入
+DEFERRED = ["numpy", "xml.sax", "tempfile", "concurrent.futures", "subprocess"]
+
+
+def test_app_import_defers_heavy_modules():
+    code = "import sys, json; import screen_pen.app; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True,
+                            env=dict(os.environ, QT_QPA_PLATFORM="offscreen")).stdout
+    loaded = set(json.loads(output.splitlines()[-1]))
+    assert [name for name in DEFERRED if name in loaded] == []
@@ -0,0 +1,48 @@
+"""拖动途中切换工具：这一笔仍按按下时的工具完成，新工具从下一笔开始生效"""
+import pytest
+
+POINTS = [(20, 20), (40, 30), (60, 45), (80, 60), (100, 75), (120, 90)]
+
+
+@pytest.mark.parametrize("tool, switch_to", [
+    ("直线", "画笔"),
+    ("矩形", "橡皮"),
+    ("椭圆", "教鞭"),
+    ("画笔", "直线"),
+    ("橡皮", "矩形"),
+])
+def test_switch_tool_mid_drag_keeps_pressed_tool(pen_app, drag, tool, switch_to):
+    drag(tool, POINTS, switch_to=switch_to)
+    
+    overlay = pen_app.overlay
+    assert not overlay.drawing
+    assert pen_app.current_tool == switch_to
+    (item,) = overlay.scene.items.values()
+    assert item.shape.tool is pen_app.tools[tool]
+    assert item.eraser == (tool == "橡皮")
+
+
+def test_new_tool_applies_to_next_stroke(pen_app, drag):
+    drag("直线", POINTS, switch_to="画笔")
+    drag("画笔", POINTS)
+    
+    tools = [item.shape.tool for item in pen_app.overlay.scene.items.values()]
+    assert tools == [pen_app.tools["直线"], pen_app.tools["画笔"]]
+
+
+TOOLS = ["画笔", "直线", "矩形", "椭圆", "橡皮", "对象橡皮", "教鞭"]
+
+
+@pytest.mark.parametrize("switch_to", TOOLS)
+@pytest.mark.parametrize("tool", TOOLS)
+def test_release_closes_history_step(pen_app, drag, tool, switch_to):
+    """无论拖动途中切换到什么工具，松开后都不能留下未提交的历史步骤，撤销恢复到这一笔之前"""
+    drag("画笔", POINTS)
+    (first,) = pen_app.overlay.scene.items.values()
+    
+    drag(tool, POINTS, switch_to=switch_to)
+    assert pen_app.history.current is None
+    
+    if tool != "教鞭":
+        pen_app.undo()
+        assert list(pen_app.overlay.scene.items.values()) == [first]